@@ -23,13 +23,9 @@ def load_environment():
         logger.info(f"Cargando variables de entorno desde {dotenv_path}")
         load_dotenv(dotenv_path)
     
-    # Registrar variables encontradas (sin mostrar valores sensibles)
-    logger.info("Variables de entorno cargadas:")
-    for key in os.environ:
-        if any(secret in key.lower() for secret in ['key', 'password', 'secret', 'token']):
-            logger.info(f"{key}=***[HIDDEN]***")
-        else:
-            logger.info(f"{key}={os.environ[key]}")
+    # No registrar el entorno completo: es ruido en cada arranque y puede
+    # exponer valores sensibles que no siguen la convención de nombres
+    logger.debug(f"Variables de entorno disponibles: {len(os.environ)}")
 
 # Cargar variables de entorno
 load_environment()
@@ -44,18 +40,101 @@ class Settings:
     # Otras configuraciones
     PORT: int = int(os.getenv("PORT", "8000"))
     
+    # Lighthouse: nodo de subida y gateway (se pueden apuntar al stub local de benchmarks/),
+    # archivos por petición multipart, peticiones de subida simultáneas por worker, timeouts
+    # de conexión y de lectura (segundos) y reintentos tras un timeout, error de red o 5xx
+    LIGHTHOUSE_UPLOAD_URL: str = os.getenv("LIGHTHOUSE_UPLOAD_URL", "https://node.lighthouse.storage/api/v0/add")
+    LIGHTHOUSE_GATEWAY_URL: str = os.getenv("LIGHTHOUSE_GATEWAY_URL", "https://gateway.lighthouse.storage/ipfs")
+    LIGHTHOUSE_BATCH_FILES: int = int(os.getenv("LIGHTHOUSE_BATCH_FILES", "4"))
+    LIGHTHOUSE_UPLOAD_CONCURRENCY: int = int(os.getenv("LIGHTHOUSE_UPLOAD_CONCURRENCY", "4"))
+    LIGHTHOUSE_CONNECT_TIMEOUT: float = float(os.getenv("LIGHTHOUSE_CONNECT_TIMEOUT", "10"))
+    LIGHTHOUSE_READ_TIMEOUT: float = float(os.getenv("LIGHTHOUSE_READ_TIMEOUT", "60"))
+    LIGHTHOUSE_UPLOAD_RETRIES: int = int(os.getenv("LIGHTHOUSE_UPLOAD_RETRIES", "2"))
+    
+    # Proveedores de imágenes habilitados, separados por coma: stability, openai, local
+    # ("local" solo, sin servicios externos, sirve para modo offline, pruebas de carga y CI)
+    IMAGE_PROVIDERS: str = os.getenv("IMAGE_PROVIDERS", "stability,openai")
+    # Proveedor preferido por estilo, por ejemplo "pixel_art=stability,realistic=openai"
+    IMAGE_PROVIDER_PREFERENCES: str = os.getenv("IMAGE_PROVIDER_PREFERENCES", "")
+    
+    # Usar el generador local de sprites cuando todos los proveedores fallan
+    LOCAL_FALLBACK: bool = os.getenv("LOCAL_FALLBACK", "false").lower() in ("1", "true", "yes")
+    
+    # Prompts creativos: "local" (listas predefinidas) o "llm" (OpenAI, en caché)
+    CREATIVE_PROMPT_MODE: str = os.getenv("CREATIVE_PROMPT_MODE", "local")
+    CREATIVE_PROMPT_MODEL: str = os.getenv("CREATIVE_PROMPT_MODEL", "gpt-4o-mini")
+    
+    # Segundos entre revisiones de assets/ para recargar referencias (0 desactiva)
+    ASSETS_WATCH_INTERVAL: float = float(os.getenv("ASSETS_WATCH_INTERVAL", "30"))
+    
+    # Workers async de gunicorn; cada uno carga su propio modelo rembg
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "2"))
+    # Hilos por worker para remoción de fondo y codificación (por defecto, los núcleos repartidos entre workers)
+    CPU_WORKERS: int = int(os.getenv("CPU_WORKERS") or max(1, (os.cpu_count() or 1) // max(1, WEB_CONCURRENCY)))
+    
+    # Remoción de fondo: modelo por defecto y por estilo, por ejemplo "pixel_art=u2netp"
+    MATTING_MODEL: str = os.getenv("MATTING_MODEL", "u2net")
+    MATTING_MODEL_BY_STYLE: str = os.getenv("MATTING_MODEL_BY_STYLE", "")
+    # "full": rembg sobre la imagen completa; "fast": inferencia reducida y máscara reescalada por bordes
+    MATTING_MODE: str = os.getenv("MATTING_MODE", "full")
+    # Usar el modelo cuantizado a int8 si existe (python -m app.services.matting quantize <modelo>)
+    MATTING_INT8: bool = os.getenv("MATTING_INT8", "false").lower() in ("1", "true", "yes")
+    
+    # Opciones de las sesiones de onnxruntime (0 = automático según CPU_WORKERS)
+    ONNX_INTRA_OP_THREADS: int = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+    ONNX_INTER_OP_THREADS: int = int(os.getenv("ONNX_INTER_OP_THREADS", "1"))
+    # disable, basic, extended o all
+    ONNX_GRAPH_OPTIMIZATION: str = os.getenv("ONNX_GRAPH_OPTIMIZATION", "all")
+    ONNX_CPU_MEM_ARENA: bool = os.getenv("ONNX_CPU_MEM_ARENA", "true").lower() in ("1", "true", "yes")
+    
+    # Atlas de sprites por generación: "off", "extra" (atlas además de las cuatro imágenes)
+    # u "only" (solo el atlas; carImageURI e imageURI apuntan a él y se usa el mapa de cuadros)
+    SPRITE_ATLAS: str = os.getenv("SPRITE_ATLAS", "off")
+    
+    # Pool de respuestas pre-generadas: segundos que una entrada puede servirse (0 = sin vencimiento),
+    # segundos entre verificaciones de sus URIs en el gateway (0 desactiva), antigüedad máxima de
+    # una verificación, HEADs simultáneos, entradas por tanda y timeout de cada HEAD
+    POOL_ENTRY_TTL: float = float(os.getenv("POOL_ENTRY_TTL", str(7 * 24 * 3600)))
+    POOL_VERIFY_INTERVAL: float = float(os.getenv("POOL_VERIFY_INTERVAL", "300"))
+    POOL_VERIFY_MAX_AGE: float = float(os.getenv("POOL_VERIFY_MAX_AGE", "3600"))
+    POOL_VERIFY_CONCURRENCY: int = int(os.getenv("POOL_VERIFY_CONCURRENCY", "8"))
+    POOL_VERIFY_BATCH: int = int(os.getenv("POOL_VERIFY_BATCH", "50"))
+    POOL_VERIFY_TIMEOUT: float = float(os.getenv("POOL_VERIFY_TIMEOUT", "10"))
+    
+    # Control de admisión por worker: generaciones simultáneas en total y, para /generate,
+    # en espera y segundos máximos en cola antes de responder 503
+    MAX_ACTIVE_GENERATIONS: int = int(os.getenv("MAX_ACTIVE_GENERATIONS", "4"))
+    MAX_QUEUED_GENERATIONS: int = int(os.getenv("MAX_QUEUED_GENERATIONS", "8"))
+    GENERATION_QUEUE_BUDGET: float = float(os.getenv("GENERATION_QUEUE_BUDGET", "30"))
+    # Lo mismo para la pregeneración; su tope de activas deja lugares libres para /generate
+    PREGENERATION_MAX_ACTIVE: int = int(os.getenv("PREGENERATION_MAX_ACTIVE", "2"))
+    PREGENERATION_MAX_QUEUED: int = int(os.getenv("PREGENERATION_MAX_QUEUED", "32"))
+    PREGENERATION_QUEUE_BUDGET: float = float(os.getenv("PREGENERATION_QUEUE_BUDGET", "600"))
+    
     def validate(self):
         """Validar que todas las configuraciones requeridas estén presentes."""
         missing_vars = []
         
-        # Verificar API keys requeridas
-        if not self.OPENAI_API_KEY:
+        # Verificar las API keys de los servicios habilitados: con IMAGE_PROVIDERS=local
+        # y prompts locales no hace falta ninguna clave de OpenAI ni de Stability
+        providers = {name.strip() for name in self.IMAGE_PROVIDERS.split(",") if name.strip()}
+        if not self.OPENAI_API_KEY and ("openai" in providers or self.CREATIVE_PROMPT_MODE.lower() == "llm"):
             missing_vars.append("OPENAI_API_KEY")
-        if not self.STABILITY_API_KEY:
+        if not self.STABILITY_API_KEY and "stability" in providers:
             missing_vars.append("STABILITY_API_KEY")
         if not self.LIGHTHOUSE_API_KEY:
             missing_vars.append("LIGHTHOUSE_API_KEY")
         
+        # Con un tope de 0 generaciones activas ninguna petición podría empezar nunca
+        invalid_limits = [
+            name for name in ("MAX_ACTIVE_GENERATIONS", "PREGENERATION_MAX_ACTIVE")
+            if getattr(self, name) < 1
+        ]
+        if invalid_limits:
+            error_msg = f"Deben ser al menos 1: {', '.join(f'{name}={getattr(self, name)}' for name in invalid_limits)}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        
         if missing_vars:
             error_msg = (
                 f"Faltan las siguientes variables de entorno requeridas: {', '.join(missing_vars)}\n"
@@ -65,13 +144,6 @@ class Settings:
             logger.error(error_msg)
             raise ValueError(error_msg)
 
-# Crear instancia de configuración
+# Crear instancia de configuración; el servidor la valida al iniciar (app/main.py),
+# así los scripts que solo importan módulos sueltos no necesitan las claves
 settings = Settings()
-
-# Validar configuración
-try:
-    settings.validate()
-    logger.info("Configuración validada exitosamente")
-except ValueError as e:
-    logger.error(f"Error de configuración: {str(e)}")
-    raise
@@ -0,0 +1,117 @@
+"""
+Configuración de logging de la aplicación.
+
+Los handlers del proceso solo encolan registros (``QueueHandler``); el
+formateo y la escritura ocurren en el hilo de un ``QueueListener``, fuera
+del camino de las peticiones. Cada registro lleva los ids de correlación de
+la petición y de la generación en curso, y los registros marcados como de
+camino caliente (``extra=HOT_PATH``) se muestrean con ``LOG_SAMPLE_RATE``.
+
+Variables de entorno:
+- LOG_LEVEL: nivel del logger raíz (por defecto INFO)
+- LOG_FORMAT: "text" o "json" (por defecto text)
+- LOG_SAMPLE_RATE: fracción de registros de camino caliente que se conservan (por defecto 0.1)
+"""
+import atexit
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+import orjson
+
+# Ids de correlación de la petición y de la generación en curso
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+generation_id_var: ContextVar[str] = ContextVar("generation_id", default="-")
+
+# Marca para registros frecuentes que se pueden muestrear
+HOT_PATH = {"sampled": True}
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s/%(generation_id)s] %(message)s"
+
+_listener: Optional[QueueListener] = None
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copia los ids de correlación al registro y aplica el muestreo. Corre en el
+    hilo que registra, porque las ContextVar no existen en el hilo del listener.
+    """
+
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (
+            getattr(record, "sampled", False)
+            and record.levelno < logging.WARNING
+            and random.random() >= self.sample_rate
+        ):
+            return False
+        record.request_id = request_id_var.get()
+        record.generation_id = generation_id_var.get()
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler que no formatea el mensaje antes de encolarlo. La cola es del
+    mismo proceso, así que los argumentos se pueden pasar tal cual y el
+    formateo queda a cargo del listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatea cada registro como una línea JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+            "generation_id": getattr(record, "generation_id", "-"),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry).decode("utf-8")
+
+
+def setup_logging():
+    """Configura el logger raíz con un handler de cola. Es idempotente."""
+    global _listener
+    if _listener is not None:
+        return
+
+    level = os.getenv("LOG_LEVEL", "INFO").upper()
+    log_format = os.getenv("LOG_FORMAT", "text").lower()
+    sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -1,38 +1,37 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 import logging
-import sys
+from .logging_config import setup_logging, request_id_var, new_correlation_id
+from .tracing import KIND_SERVER, setup_tracing, span
+
+from .config import settings
+
+# Configurar logging y trazas antes de importar los servicios, que registran al cargarse
+setup_logging()
+setup_tracing()
+
+# Validar configuración antes de crear los clientes de los proveedores
+try:
+    settings.validate()
+    logging.getLogger(__name__).info("Configuración validada exitosamente")
+except ValueError as e:
+    logging.getLogger(__name__).error(f"Error de configuración: {str(e)}")
+    raise
+
 from .routes import car_generation
+from .responses import etag_json_response
 import os
 import gc
-from rembg import new_session
+import time
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.DEBUG,  # Cambiar a DEBUG para más información
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stdout
-)
 logger = logging.getLogger(__name__)
 
 # Registrar información del entorno
 logger.info(f"Iniciando aplicación en el entorno: {os.getenv('RAILWAY_ENVIRONMENT', 'local')}")
 logger.info(f"Puerto configurado: {os.getenv('PORT', '8080')}")
-logger.info(f"Python path: {os.getenv('PYTHONPATH')}")
-
-try:
-    # Forzar recolección de basura
-    gc.collect()
-
-    # Pre-cargar modelo rembg con configuración de memoria limitada
-    logger.info("Pre-cargando modelo rembg...")
-    os.environ['ONNXRUNTIME_MEMORY_LIMIT'] = '256'  # Limitar memoria de ONNX a 256MB
-    rembg_session = new_session()
-    logger.info("Modelo rembg pre-cargado exitosamente")
-except Exception as e:
-    logger.error(f"Error pre-cargando modelo rembg: {str(e)}")
-    rembg_session = None
+logger.debug("Python path: %s", os.getenv("PYTHONPATH"))
 
 # Crear aplicación FastAPI
 app = FastAPI(
@@ -40,9 +39,13 @@ app = FastAPI(
     description="API para generar sprites de carros 2D usando IA",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
+# Comprimir respuestas grandes (lotes, estado del pool); las de un solo carro no lo necesitan
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -55,18 +58,20 @@ app.add_middleware(
 # Incluir rutas
 app.include_router(car_generation.router, prefix="/api/cars", tags=["cars"])
 
+# Información estática de la API, calculada una sola vez
+ROOT_INFO = {
+    "message": "Bienvenido a Speed Rush 2D Car Generator API",
+    "version": "1.0.0",
+    "docs": "/docs",
+    "health": "/health",
+    "environment": os.getenv("RAILWAY_ENVIRONMENT", "local"),
+    "port": os.getenv("PORT", "8080")
+}
+
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Endpoint raíz que muestra información básica de la API."""
-    logger.info("Endpoint raíz accedido")
-    return {
-        "message": "Bienvenido a Speed Rush 2D Car Generator API",
-        "version": "1.0.0",
-        "docs": "/docs",
-        "health": "/health",
-        "environment": os.getenv("RAILWAY_ENVIRONMENT", "local"),
-        "port": os.getenv("PORT", "8080")
-    }
+    return etag_json_response(request, ROOT_INFO, max_age=3600)
 
 @app.get("/health")
 async def health_check():
@@ -82,12 +87,12 @@ async def health_check():
         "status": "healthy",
         "config_status": config_status,
         "memory_usage": f"{gc.get_count()} objetos rastreados",
-        "rembg_model": "Cargado" if rembg_session else "No cargado",
+        "rembg_model": ", ".join(car_generation.image_service.matting.loaded()) or "No cargado",
         "environment": os.getenv("RAILWAY_ENVIRONMENT_NAME", "local"),
         "port": os.getenv("PORT", "8080")
     }
     
-    logger.info(f"Health check realizado: {health_info}")
+    logger.debug("Health check realizado: %s", health_info)
     return health_info
 
 # Manejador global de excepciones
@@ -108,14 +113,52 @@ async def global_exception_handler(request: Request, exc: Exception):
         }
     )
 
+# Segundos mínimos entre recolecciones de basura forzadas
+GC_INTERVAL = 30.0
+_last_gc = time.monotonic()
+
 # Limpiar memoria periódicamente
 @app.middleware("http")
 async def cleanup_memory(request: Request, call_next):
-    """Middleware para limpiar la memoria después de cada petición."""
+    """
+    Middleware para limpiar la memoria periódicamente. Un gc.collect() completo
+    después de cada petición cuesta más que servir un carro del caché, así que
+    se hace como máximo una vez cada GC_INTERVAL segundos.
+    """
+    global _last_gc
     try:
         response = await call_next(request)
-        gc.collect()
+        now = time.monotonic()
+        if now - _last_gc >= GC_INTERVAL:
+            _last_gc = now
+            gc.collect()
         return response
     except Exception as e:
         logger.error(f"Error en middleware: {str(e)}", exc_info=True)
         raise
+
+# Id de correlación de cada petición
+@app.middleware("http")
+async def correlation_id(request: Request, call_next):
+    """
+    Asigna a la petición el id recibido en X-Request-ID (o uno nuevo) para que
+    todos sus registros lo incluyan, y lo devuelve en la respuesta. Con las
+    trazas habilitadas también devuelve X-Trace-ID.
+    """
+    request_id = request.headers.get("x-request-id") or new_correlation_id()
+    token = request_id_var.set(request_id)
+    try:
+        # Span raíz de la petición; las etapas de la generación cuelgan de él
+        with span(
+            f"{request.method} {request.url.path}",
+            kind=KIND_SERVER,
+            **{"http.method": request.method, "http.target": request.url.path, "request_id": request_id}
+        ) as current:
+            response = await call_next(request)
+            current.set_attribute("http.status_code", response.status_code)
+        response.headers["X-Request-ID"] = request_id
+        if current.trace_id:
+            response.headers["X-Trace-ID"] = current.trace_id
+        return response
+    finally:
+        request_id_var.reset(token)
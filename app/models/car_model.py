@@ -1,6 +1,6 @@
 from enum import Enum
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 
 class CarStyle(str, Enum):
     PIXEL_ART = "pixel_art"
@@ -28,13 +28,36 @@ class CarConfig(BaseModel):
     engineType: str = "standard"
     transmissionType: str = "manual"
     wheelsType: str = "sport"
+    # Semilla opcional para que las estadísticas sean reproducibles (numpy exige que no sea negativa)
+    seed: Optional[int] = Field(None, ge=0)
 
     class Config:
         use_enum_values = True
 
+class AtlasFrame(BaseModel):
+    # Rectángulo del sprite recortado dentro del atlas
+    x: int
+    y: int
+    w: int
+    h: int
+    # Tamaño del sprite original y posición del recorte dentro de él
+    sourceW: int
+    sourceH: int
+    offsetX: int
+    offsetY: int
+
+class SpriteAtlas(BaseModel):
+    imageURI: str
+    width: int
+    height: int
+    # Cuadros por imagen: car, engine, transmission, wheels
+    frames: Dict[str, AtlasFrame]
+
 class CarGenerationResponse(BaseModel):
     carImageURI: str
     parts: List[CarPart]
+    # Solo con SPRITE_ATLAS habilitado
+    atlas: Optional[SpriteAtlas] = None
 
     class Config:
         use_enum_values = True
@@ -0,0 +1,32 @@
+import hashlib
+from typing import Any
+
+import orjson
+from fastapi import Request, Response
+
+# Tipo de contenido de las respuestas JSON
+JSON_MEDIA_TYPE = "application/json"
+
+
+def json_bytes_response(content: bytes, status_code: int = 200) -> Response:
+    """Respuesta con JSON ya serializado, sin volver a parsearlo ni codificarlo."""
+    return Response(content=content, status_code=status_code, media_type=JSON_MEDIA_TYPE)
+
+
+def etag_json_response(request: Request, payload: Any, max_age: int = 60) -> Response:
+    """
+    Serializa con orjson y agrega ETag y Cache-Control. Si el cliente envía
+    el mismo ETag en If-None-Match, responde 304 sin cuerpo.
+    """
+    content = orjson.dumps(payload)
+    etag = f'"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}"
+    }
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=content, media_type=JSON_MEDIA_TYPE, headers=headers)
@@ -1,8 +1,19 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
 from ..services.image_generation_service import ImageGenerationService
 from ..services.cache_service import CacheService
+from ..services.pool_verifier import PoolVerifier
+from ..services.stats_engine import apply_stats
+from ..services.openai_client import close_openai_client
+from ..services.admission import AdmissionController, Overloaded, INTERACTIVE, BACKGROUND
+from ..services.cpu_pool import shutdown_cpu_executor
 from ..models.car_model import CarConfig
+from ..config import settings
+from ..responses import json_bytes_response, etag_json_response
+from ..logging_config import HOT_PATH
+from typing import List
+import asyncio
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -10,6 +21,61 @@ router = APIRouter()
 # Instanciar servicios
 image_service = ImageGenerationService()
 cache_service = CacheService()
+pool_verifier = PoolVerifier(cache_service)
+admission = AdmissionController()
+
+# Tareas en segundo plano (se guardan para que no sean recolectadas)
+background_tasks = set()
+
+def _run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def _generate(config: CarConfig, stats=None, priority: str = INTERACTIVE) -> dict:
+    """
+    Genera un carro cuando el control de admisión da lugar. La pregeneración
+    usa la clase BACKGROUND para no competir con los usuarios.
+    """
+    async with admission.slot(priority):
+        return await image_service.generate_car_assets(config, stats)
+
+def _overloaded(e: Overloaded) -> HTTPException:
+    logger.warning(f"Generación rechazada: {e} (reintentar en {e.retry_after}s)")
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+@router.on_event("startup")
+async def start_assets_watcher():
+    """Inicia la vigilancia de assets/ para recargar referencias sin reiniciar."""
+    if settings.ASSETS_WATCH_INTERVAL > 0:
+        _run_in_background(image_service.watch_assets(settings.ASSETS_WATCH_INTERVAL))
+
+@router.on_event("startup")
+async def warm_reference_cache():
+    """Redimensiona las referencias en el pool de CPU para que la primera generación no lo haga."""
+    _run_in_background(image_service.warm_references())
+
+@router.on_event("startup")
+async def start_pool_verifier():
+    """Inicia la verificación periódica de las URIs del pool pre-generado."""
+    if settings.POOL_VERIFY_INTERVAL > 0:
+        _run_in_background(pool_verifier.run(settings.POOL_VERIFY_INTERVAL))
+
+@router.on_event("startup")
+async def prefetch_creative_prompts():
+    """Pide el primer lote de prompts creativos si el modo LLM está activo."""
+    image_service.prompt_service.prefetch()
+
+@router.on_event("shutdown")
+async def close_clients():
+    """Cierra el pool de conexiones de OpenAI y el pool de CPU."""
+    await close_openai_client()
+    shutdown_cpu_executor()
 
 @router.post("/generate")
 async def generate_car(config: CarConfig):
@@ -19,17 +85,27 @@ async def generate_car(config: CarConfig):
     Si no hay caché, genera una nueva respuesta.
     """
     try:
-        # Intentar obtener una respuesta pre-generada
-        cached_response = cache_service.get_cached_response()
+        # Las estadísticas de la semilla se calculan antes de tocar el pool o los
+        # proveedores, para que un error aquí no consuma una entrada ni cuota
+        seeded_stats = image_service.stats_engine.generate(config) if config.seed is not None else None
+
+        # Intentar obtener una respuesta pre-generada, ya serializada
+        cached_response = cache_service.get_cached_response_bytes(config)
         if cached_response:
-            logger.info("Retornando respuesta pre-generada del caché")
-            return cached_response
+            logger.info("Retornando respuesta pre-generada del caché", extra=HOT_PATH)
+            if seeded_stats is not None:
+                # Las imágenes vienen del pool, pero las estadísticas deben
+                # ser las de la semilla para que sean reproducibles
+                cached_response = orjson.dumps(apply_stats(orjson.loads(cached_response), seeded_stats))
+            return json_bytes_response(cached_response)
             
         # Si no hay caché, generar nueva respuesta
         logger.info("No hay caché disponible, generando nueva respuesta")
-        response = await image_service.generate_car_assets(config)
+        response = await _generate(config, seeded_stats)
         return response
         
+    except Overloaded as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.error(f"Error en generate_car: {str(e)}")
         raise HTTPException(
@@ -44,19 +120,167 @@ async def pregenerate_car(config: CarConfig):
     """
     try:
         # Generar nueva respuesta
-        response = await image_service.generate_car_assets(config)
+        response = await _generate(config, priority=BACKGROUND)
         
         # Guardar en caché
-        cache_id = cache_service.save_response(response)
+        cache_id = cache_service.save_response(response, config)
         
         return {
             "message": "Respuesta pre-generada y almacenada exitosamente",
             "cache_id": cache_id
         }
         
+    except Overloaded as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.error(f"Error en pregenerate_car: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Error pre-generando carro: {str(e)}"
         )
+
+# Cada respuesta del lote son varias llamadas a los proveedores de imágenes
+MAX_PREGENERATE_BATCH = 20
+
+@router.post("/pregenerate/batch")
+async def pregenerate_batch(config: CarConfig, count: int = Query(1, ge=1, le=MAX_PREGENERATE_BATCH)):
+    """
+    Endpoint administrativo para pre-generar varias respuestas de una misma
+    configuración. Las estadísticas de todo el lote se generan en una sola llamada.
+    """
+    try:
+        batch_stats = image_service.stats_engine.to_part_stats(
+            image_service.stats_engine.generate_batch([config] * count)
+        )
+
+        cache_ids = []
+        for stats in batch_stats:
+            response = await _generate(config, stats, BACKGROUND)
+            cache_ids.append(cache_service.save_response(response, config))
+
+        return {
+            "message": f"Se pre-generaron {len(cache_ids)} respuestas",
+            "cache_ids": cache_ids
+        }
+
+    except Overloaded as e:
+        raise _overloaded(e)
+    except Exception as e:
+        logger.error(f"Error en pregenerate_batch: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error pre-generando lote: {str(e)}"
+        )
+
+@router.get("/pool")
+async def pool_status():
+    """
+    Endpoint administrativo que reporta la profundidad de cada partición del
+    pool y su frescura (antigüedad y verificación de las URIs).
+    """
+    depths = await asyncio.to_thread(cache_service.get_partition_depths)
+    return {
+        "total": sum(depths.values()),
+        "partitions": depths,
+        "freshness": pool_verifier.get_metrics()
+    }
+
+@router.post("/pool/verify", status_code=202)
+async def verify_pool():
+    """
+    Endpoint administrativo que vence y verifica las entradas del pool en
+    segundo plano, sin esperar al próximo ciclo del verificador. Solo
+    verifica el worker con el lock; los demás responden 409.
+    """
+    if not pool_verifier.try_lead():
+        raise HTTPException(
+            status_code=409,
+            detail="Otro worker verifica el pool; reintenta la petición"
+        )
+    _run_in_background(pool_verifier.sweep())
+    return {"message": "Verificación del pool iniciada"}
+
+@router.post("/pool/refill")
+async def refill_pool(configs: List[CarConfig], min_depth: int = Query(1, ge=1, le=MAX_PREGENERATE_BATCH)):
+    """
+    Endpoint administrativo que pre-genera respuestas solo para las
+    configuraciones cuya partición tiene menos de min_depth entradas. Genera
+    a lo sumo MAX_PREGENERATE_BATCH respuestas por llamada e informa cuántas
+    quedaron pendientes para una llamada siguiente.
+    """
+    try:
+        # Expandir las particiones con faltantes y generar todas las estadísticas de una vez
+        pending = [
+            config
+            for config, missing in await asyncio.to_thread(cache_service.get_low_partitions, configs, min_depth)
+            for _ in range(missing)
+        ]
+        remaining = max(0, len(pending) - MAX_PREGENERATE_BATCH)
+        if remaining:
+            logger.info(f"Relleno limitado a {MAX_PREGENERATE_BATCH} respuestas; quedan {remaining} pendientes")
+            pending = pending[:MAX_PREGENERATE_BATCH]
+        batch_stats = image_service.stats_engine.to_part_stats(
+            image_service.stats_engine.generate_batch(pending)
+        )
+
+        generated = []
+        for config, stats in zip(pending, batch_stats):
+            response = await _generate(config, stats, BACKGROUND)
+            generated.append(cache_service.save_response(response, config))
+
+        return {
+            "message": f"Se pre-generaron {len(generated)} respuestas",
+            "cache_ids": generated,
+            "remaining": remaining,
+            "partitions": await asyncio.to_thread(cache_service.get_partition_depths)
+        }
+
+    except Overloaded as e:
+        raise _overloaded(e)
+    except Exception as e:
+        logger.error(f"Error en refill_pool: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error rellenando el pool: {str(e)}"
+        )
+
+@router.post("/assets/reload", status_code=202)
+async def reload_assets():
+    """
+    Endpoint administrativo que recarga las imágenes de referencia en segundo
+    plano. Las generaciones en curso no se interrumpen.
+    """
+    _run_in_background(image_service.reload_assets())
+    return {"message": "Recarga de imágenes de referencia iniciada"}
+
+@router.get("/assets")
+async def assets_status(request: Request):
+    """
+    Endpoint administrativo que reporta las imágenes de referencia activas.
+    Solo cambia al recargar los assets, así que se sirve con ETag.
+    """
+    return etag_json_response(request, {
+        "last_reload": image_service.last_assets_reload,
+        "references": {
+            category: len(entries)
+            for category, entries in image_service.asset_index.entries.items()
+        }
+    }, max_age=30)
+
+@router.get("/providers")
+async def providers_status():
+    """
+    Endpoint administrativo que reporta la latencia y errores medidos de cada proveedor de imágenes.
+    """
+    return {
+        "preferences": image_service.image_router.style_preferences,
+        "providers": image_service.image_router.get_stats()
+    }
+
+@router.get("/admission")
+async def admission_status():
+    """
+    Endpoint administrativo que reporta las generaciones activas, en espera y rechazadas
+    de este worker, por clase de prioridad.
+    """
+    return admission.get_stats()
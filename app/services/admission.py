@@ -0,0 +1,215 @@
+"""
+Control de admisión de generaciones con clases de prioridad.
+
+Cada worker limita las generaciones simultáneas (``MAX_ACTIVE_GENERATIONS``)
+y las reparte entre dos clases:
+
+- ``interactive``: /generate, un usuario esperando la respuesta
+- ``background``: /pregenerate y el relleno del pool, tareas administrativas
+
+Cada clase tiene su propio tope de generaciones activas, de peticiones en
+espera y de tiempo máximo en cola. Cuando se libera un lugar se atiende
+primero a ``interactive``; como ``background`` tiene un tope menor que el
+total, un lote de pregeneración nunca ocupa todos los lugares. Si la cola
+de la clase está llena, o la espera estimada supera su presupuesto, la
+petición se rechaza de inmediato con ``Overloaded`` en lugar de acumular
+trabajo que terminaría por timeout. Las respuestas del caché no pasan por
+aquí, así que nunca esperan detrás de una generación.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, List, Optional
+
+from ..config import settings
+
+# Peso de la muestra más reciente en la duración promedio de una generación
+EWMA_ALPHA = 0.2
+
+# Duración supuesta de una generación antes de tener mediciones (segundos)
+DEFAULT_DURATION = 30.0
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+
+class Overloaded(Exception):
+    """No hay lugar para la generación dentro del presupuesto de su clase."""
+
+    def __init__(self, retry_after: int, reason: str = "Servidor ocupado, reintenta más tarde"):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class PriorityClass:
+    """Topes y contadores de una clase de prioridad."""
+
+    def __init__(self, name: str, max_active: int, max_queued: int, queue_budget: float):
+        if max_active < 1:
+            raise ValueError(f"La clase {name} necesita al menos una generación activa (max_active={max_active})")
+        self.name = name
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.queue_budget = queue_budget
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.queue_time = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "active": self.active,
+            "waiting": len(self.waiters),
+            "max_active": self.max_active,
+            "max_queued": self.max_queued,
+            "queue_budget": self.queue_budget,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "queue_time_ewma": round(self.queue_time, 3),
+        }
+
+
+def default_classes() -> List[PriorityClass]:
+    """Clases configuradas, de mayor a menor prioridad."""
+    return [
+        PriorityClass(
+            INTERACTIVE,
+            settings.MAX_ACTIVE_GENERATIONS,
+            settings.MAX_QUEUED_GENERATIONS,
+            settings.GENERATION_QUEUE_BUDGET
+        ),
+        PriorityClass(
+            BACKGROUND,
+            min(settings.PREGENERATION_MAX_ACTIVE, settings.MAX_ACTIVE_GENERATIONS),
+            settings.PREGENERATION_MAX_QUEUED,
+            settings.PREGENERATION_QUEUE_BUDGET
+        ),
+    ]
+
+
+class AdmissionController:
+    """Lugares de generación compartidos entre clases, con prioridad estricta."""
+
+    def __init__(self, max_active: Optional[int] = None, classes: Optional[List[PriorityClass]] = None):
+        self.max_active = settings.MAX_ACTIVE_GENERATIONS if max_active is None else max_active
+        if self.max_active < 1:
+            raise ValueError(f"Se requiere al menos una generación activa (max_active={self.max_active})")
+        # El orden de la lista es el orden de prioridad
+        self.classes: Dict[str, PriorityClass] = {
+            priority_class.name: priority_class for priority_class in (classes or default_classes())
+        }
+        self.active = 0
+        self.duration = DEFAULT_DURATION
+
+    def _can_start(self, priority_class: PriorityClass) -> bool:
+        return self.active < self.max_active and priority_class.active < priority_class.max_active
+
+    def _grant(self, priority_class: PriorityClass):
+        priority_class.active += 1
+        priority_class.admitted += 1
+        self.active += 1
+
+    def _wake(self):
+        """Entrega los lugares libres a los que esperan, por orden de prioridad."""
+        for priority_class in self.classes.values():
+            while priority_class.waiters and self._can_start(priority_class):
+                waiter = priority_class.waiters.popleft()
+                if waiter.done():
+                    continue
+                self._grant(priority_class)
+                waiter.set_result(True)
+
+    def _release(self, priority_class: PriorityClass):
+        priority_class.active -= 1
+        self.active -= 1
+        self._wake()
+
+    def estimated_wait(self, priority: str) -> float:
+        """Segundos estimados hasta que una nueva petición de la clase empiece a generar."""
+        ahead = 0
+        for priority_class in self.classes.values():
+            ahead += len(priority_class.waiters)
+            if priority_class.name == priority:
+                capacity = min(self.max_active, priority_class.max_active)
+                return self.duration * (ahead + 1) / capacity
+        raise ValueError(f"Clase de prioridad desconocida: {priority}")
+
+    def retry_after(self, priority: str = INTERACTIVE) -> int:
+        return max(1, math.ceil(self.estimated_wait(priority)))
+
+    @asynccontextmanager
+    async def slot(self, priority: str = INTERACTIVE):
+        """
+        Espera un lugar para generar dentro del presupuesto de la clase, o
+        lanza Overloaded si la cola está llena o la espera lo excedería.
+        """
+        priority_class = self.classes[priority]
+
+        if not priority_class.waiters and self._can_start(priority_class):
+            self._grant(priority_class)
+        else:
+            # Rechazo rápido: sin esperar a que venza el presupuesto
+            if len(priority_class.waiters) >= priority_class.max_queued:
+                priority_class.rejected += 1
+                raise Overloaded(self.retry_after(priority))
+            if self.estimated_wait(priority) > priority_class.queue_budget:
+                priority_class.rejected += 1
+                raise Overloaded(self.retry_after(priority), "La espera estimada supera el presupuesto de la cola")
+            await self._wait_turn(priority_class)
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.duration = EWMA_ALPHA * (time.monotonic() - start) + (1 - EWMA_ALPHA) * self.duration
+            self._release(priority_class)
+
+    async def _wait_turn(self, priority_class: PriorityClass):
+        waiter = asyncio.get_running_loop().create_future()
+        priority_class.waiters.append(waiter)
+        queued_at = time.monotonic()
+        try:
+            # shield: al vencer el plazo el futuro no se cancela y se puede
+            # distinguir si el lugar llegó a entregarse justo a tiempo
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=priority_class.queue_budget)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                waiter.cancel()
+                priority_class.waiters.remove(waiter)
+                priority_class.expired += 1
+                raise Overloaded(
+                    self.retry_after(priority_class.name),
+                    "Tiempo de espera en cola agotado"
+                )
+        except asyncio.CancelledError:
+            # El cliente se fue: devolver el lugar si ya se había entregado
+            if waiter.done() and not waiter.cancelled():
+                self._release(priority_class)
+            else:
+                waiter.cancel()
+                if waiter in priority_class.waiters:
+                    priority_class.waiters.remove(waiter)
+            raise
+        finally:
+            waited = time.monotonic() - queued_at
+            priority_class.queue_time = EWMA_ALPHA * waited + (1 - EWMA_ALPHA) * priority_class.queue_time
+
+        if asyncio.current_task().cancelling():
+            # Si el lugar se entregó en la misma vuelta del event loop en que se
+            # canceló la tarea, wait_for retorna el resultado y descarta la
+            # cancelación: devolver el lugar y propagarla
+            self._release(priority_class)
+            raise asyncio.CancelledError()
+
+    def get_stats(self) -> Dict:
+        return {
+            "active": self.active,
+            "max_active": self.max_active,
+            "duration_ewma": round(self.duration, 3),
+            "classes": {name: priority_class.to_dict() for name, priority_class in self.classes.items()},
+        }
@@ -0,0 +1,315 @@
+"""
+Índice precalculado de imágenes de referencia.
+
+El manifiesto ``assets/manifest.json`` guarda, para cada archivo, su
+categoría, dimensiones, un hash perceptual (dHash) y, si fue descartado,
+el motivo. El servicio lo carga al iniciar en lugar de recorrer el
+directorio. Para regenerarlo después de agregar o quitar imágenes:
+
+    python -m app.services.asset_index
+"""
+import json
+import logging
+import os
+import random
+import re
+import threading
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+# Subdirectorio de cada categoría; los carros están en la raíz de assets/
+CATEGORY_DIRS = {
+    "car": "",
+    "motor": "motor",
+    "transmission": "transmission",
+    "wheels": "wheels",
+}
+
+# Categoría a usar cuando una categoría no tiene imágenes válidas
+CATEGORY_FALLBACKS = {
+    "motor": "car",
+    "transmission": "car",
+    "wheels": "car",
+}
+
+# Archivos sobrantes de procesos anteriores que no son referencias
+STRAY_PATTERN = re.compile(r"^(temp|tmp)[_-]|^\.|~$", re.IGNORECASE)
+
+# Lado mínimo aceptado
+MIN_SIDE = 512
+
+# Tamaño del dHash: HASH_SIZE x HASH_SIZE bits
+HASH_SIZE = 16
+
+# Distancia de Hamming máxima para considerar dos imágenes casi duplicadas
+DUPLICATE_DISTANCE = 24
+
+# Tamaño con el que Stability recibe las referencias
+REFERENCE_SIZE = (1024, 1024)
+
+
+def perceptual_hash(image: Image.Image, hash_size: int = HASH_SIZE) -> str:
+    """
+    Calcula el dHash de una imagen como texto hexadecimal.
+    Las imágenes con transparencia se componen sobre blanco, igual que las
+    referencias que recibe Stability.
+    """
+    if image.mode in ("RGBA", "LA", "P"):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+        background.alpha_composite(rgba)
+        image = background
+
+    gray = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{value:0{hash_size * hash_size // 4}x}"
+
+
+def hash_distance(first: str, second: str) -> int:
+    """Distancia de Hamming entre dos hashes hexadecimales."""
+    return bin(int(first, 16) ^ int(second, 16)).count("1")
+
+
+def _iter_image_files(base_dir: str):
+    """Recorre los directorios de categorías y produce (categoría, nombre, ruta)."""
+    for category, subdir in CATEGORY_DIRS.items():
+        directory = os.path.join(base_dir, subdir)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path) and name.lower().endswith(IMAGE_EXTENSIONS):
+                yield category, name, path
+
+
+def assets_signature(base_dir: str) -> Tuple[Tuple[str, int], ...]:
+    """
+    Firma barata del contenido de assets/: ruta relativa y tamaño de cada
+    imagen. Solo lista directorios, no abre ninguna imagen.
+    """
+    return tuple(sorted(
+        (os.path.relpath(path, base_dir).replace(os.sep, "/"), os.path.getsize(path))
+        for _, _, path in _iter_image_files(base_dir)
+    ))
+
+
+def _previous_weights(base_dir: str) -> Dict[str, float]:
+    """Pesos del manifiesto actual por ruta, editados a mano para ajustar la selección."""
+    path = os.path.join(base_dir, MANIFEST_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            assets = json.load(f).get("assets", [])
+        return {entry["path"]: float(entry["weight"]) for entry in assets if "weight" in entry}
+    except FileNotFoundError:
+        return {}
+    except (json.JSONDecodeError, AttributeError, KeyError, TypeError, ValueError) as e:
+        logger.warning(f"No se pudieron leer los pesos de {path}, se usará 1.0: {str(e)}")
+        return {}
+
+
+def build_manifest(base_dir: str) -> Dict:
+    """
+    Recorre assets/, describe cada imagen y marca las que no deben usarse.
+    Conserva el peso que cada ruta tenía en el manifiesto anterior; las
+    imágenes nuevas empiezan con 1.0.
+    """
+    weights = _previous_weights(base_dir)
+    for category, subdir in CATEGORY_DIRS.items():
+        if not os.path.isdir(os.path.join(base_dir, subdir)):
+            logger.warning(f"No existe el directorio de referencias para {category}: {subdir or '.'}")
+
+    entries = []
+    candidates: Dict[str, List[Dict]] = {category: [] for category in CATEGORY_DIRS}
+    for category, name, path in _iter_image_files(base_dir):
+        relative_path = os.path.relpath(path, base_dir).replace(os.sep, "/")
+        entry = {
+            "path": relative_path,
+            "category": category,
+            "weight": weights.get(relative_path, 1.0),
+            "size": os.path.getsize(path),
+        }
+        try:
+            with Image.open(path) as img:
+                entry["width"], entry["height"] = img.size
+                entry["phash"] = perceptual_hash(img)
+        except Exception as e:
+            entry["excluded"] = f"no se pudo leer: {str(e)}"
+            entries.append(entry)
+            continue
+
+        if STRAY_PATTERN.search(name):
+            entry["excluded"] = "archivo temporal"
+        elif min(entry["width"], entry["height"]) < MIN_SIDE:
+            entry["excluded"] = f"resolución menor a {MIN_SIDE}px"
+        else:
+            candidates[category].append(entry)
+        entries.append(entry)
+
+    # Conservar la versión de mayor resolución de cada grupo de casi duplicados
+    for category_candidates in candidates.values():
+        kept: List[Dict] = []
+        for entry in sorted(category_candidates, key=lambda e: e["width"] * e["height"], reverse=True):
+            duplicate_of = next(
+                (k for k in kept if hash_distance(k["phash"], entry["phash"]) <= DUPLICATE_DISTANCE),
+                None
+            )
+            if duplicate_of:
+                entry["excluded"] = f"casi duplicado de {duplicate_of['path']}"
+            else:
+                kept.append(entry)
+
+    return {"version": MANIFEST_VERSION, "assets": entries}
+
+
+def write_manifest(base_dir: str, manifest: Dict) -> str:
+    """Guarda el manifiesto en assets/manifest.json."""
+    path = os.path.join(base_dir, MANIFEST_NAME)
+    # Nombre temporal por proceso: varios workers pueden reconstruirlo a la vez
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(temp_path, path)
+    return path
+
+
+class AssetIndex:
+    """
+    Referencias válidas por categoría, cargadas desde el manifiesto.
+
+    La selección está balanceada: el peso de cada imagen se divide por las
+    veces que ya fue usada, así que todas las referencias se reparten de
+    forma pareja en lugar de depender solo del azar.
+
+    Una instancia no cambia después de construirse (salvo contadores y la
+    caché de referencias redimensionadas), así que recargar los assets
+    consiste en construir un índice nuevo y reemplazar la referencia.
+    """
+
+    def __init__(self, base_dir: str, manifest: Dict):
+        self.base_dir = base_dir
+        self._lock = threading.Lock()
+        self._uses: Dict[str, int] = {}
+        self._preprocessed: Dict[str, bytes] = {}
+        self.entries: Dict[str, List[Dict]] = {category: [] for category in CATEGORY_DIRS}
+        # Firma de los archivos descritos por el manifiesto, comparable con assets_signature
+        self.signature = tuple(sorted(
+            (entry["path"], entry.get("size", -1)) for entry in manifest.get("assets", [])
+        ))
+
+        for entry in manifest.get("assets", []):
+            if entry.get("excluded"):
+                continue
+            self.entries.setdefault(entry["category"], []).append(entry)
+
+        for category, fallback in CATEGORY_FALLBACKS.items():
+            if not self.entries.get(category):
+                logger.warning(f"No hay imágenes de referencia para {category}, se usarán las de {fallback}")
+
+    @classmethod
+    def rebuild(cls, base_dir: str) -> "AssetIndex":
+        """Reconstruye el manifiesto desde el disco, lo guarda y retorna un índice nuevo."""
+        manifest = build_manifest(base_dir)
+        try:
+            write_manifest(base_dir, manifest)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el manifiesto: {str(e)}")
+        return cls(base_dir, manifest)
+
+    @classmethod
+    def load(cls, base_dir: str) -> "AssetIndex":
+        """Carga el índice desde el manifiesto; si no existe, lo construye y lo guarda."""
+        path = os.path.join(base_dir, MANIFEST_NAME)
+        manifest: Optional[Dict] = None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") != MANIFEST_VERSION:
+                logger.warning(f"Versión de manifiesto no soportada en {path}, reconstruyendo")
+                manifest = None
+        except FileNotFoundError:
+            logger.warning(f"No se encontró {path}, construyendo el índice de referencias")
+        except json.JSONDecodeError as je:
+            logger.error(f"Manifiesto de referencias corrupto: {str(je)}")
+
+        index = cls.rebuild(base_dir) if manifest is None else cls(base_dir, manifest)
+        logger.info("Imágenes de referencia: " + ", ".join(
+            f"{category}={len(entries)}" for category, entries in index.entries.items()
+        ))
+        return index
+
+    def _resolve_category(self, category: str) -> str:
+        while not self.entries.get(category) and category in CATEGORY_FALLBACKS:
+            category = CATEGORY_FALLBACKS[category]
+        return category
+
+    def choose(self, category: str) -> str:
+        """Elige una referencia de la categoría y retorna su ruta absoluta."""
+        entries = self.entries.get(self._resolve_category(category))
+        if not entries:
+            raise Exception(f"No hay imágenes de referencia para {category}")
+
+        with self._lock:
+            weights = [entry["weight"] / (1 + self._uses.get(entry["path"], 0)) for entry in entries]
+            selected = random.choices(entries, weights=weights)[0]
+            self._uses[selected["path"]] = self._uses.get(selected["path"], 0) + 1
+
+        logger.debug(f"Usando imagen de referencia para {category}: {selected['path']}")
+        return os.path.join(self.base_dir, selected["path"])
+
+    def preprocessed(self, path: str) -> bytes:
+        """
+        Retorna la referencia redimensionada a REFERENCE_SIZE como PNG.
+        Se calcula la primera vez que se usa y queda en memoria.
+        """
+        cached = self._preprocessed.get(path)
+        if cached is None:
+            with Image.open(path) as img:
+                resized = img.resize(REFERENCE_SIZE, Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            resized.save(buffer, format="PNG")
+            cached = buffer.getvalue()
+            self._preprocessed[path] = cached
+        return cached
+
+    def cached(self, path: str) -> Optional[bytes]:
+        """La referencia redimensionada si ya se calculó, sin calcularla."""
+        return self._preprocessed.get(path)
+
+    def warm(self):
+        """Precalcula todas las referencias redimensionadas."""
+        for path in self.paths():
+            self.preprocessed(path)
+
+    def paths(self) -> List[str]:
+        """Rutas absolutas de todas las referencias válidas."""
+        return [
+            os.path.join(self.base_dir, entry["path"])
+            for entries in self.entries.values()
+            for entry in entries
+        ]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    assets_dir = os.path.join(os.path.dirname(__file__), "..", "..", "assets")
+    manifest = build_manifest(os.path.abspath(assets_dir))
+    manifest_path = write_manifest(os.path.abspath(assets_dir), manifest)
+    excluded = [entry for entry in manifest["assets"] if entry.get("excluded")]
+    print(f"Manifiesto guardado en {manifest_path}: {len(manifest['assets'])} imágenes, {len(excluded)} descartadas")
+    for entry in excluded:
+        print(f"- {entry['path']}: {entry['excluded']}")
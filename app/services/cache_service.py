@@ -1,9 +1,14 @@
-import json
 import os
+import re
 import time
 import logging
-from typing import Optional, Dict, List
-from ..models.car_model import CarPart, PartType
+import threading
+from collections import deque
+from typing import Optional, Dict, List, Tuple, Deque
+import orjson
+from ..models.car_model import CarPart, PartType, CarConfig
+from ..config import settings
+from ..logging_config import HOT_PATH
 
 logger = logging.getLogger(__name__)
 
@@ -14,15 +19,68 @@ PART_TYPE_TO_NUMBER = {
     PartType.WHEELS: 2
 }
 
+# Clave de partición: (style, engineType, transmissionType, wheelsType)
+PartitionKey = Tuple[str, str, str, str]
+
+# Partición para archivos antiguos guardados sin configuración
+LEGACY_PARTITION: PartitionKey = ("legacy", "*", "*", "*")
+
+# Separador entre los tipos de parte en el nombre del directorio de la partición
+PARTS_SEPARATOR = "__"
+
+_UNSAFE_CHARS = re.compile(r"[^a-z0-9_-]+")
+
+
+def _sanitize(value: str) -> str:
+    """Normaliza un valor de configuración para usarlo como nombre de directorio."""
+    cleaned = _UNSAFE_CHARS.sub("-", str(value).strip().lower()).strip("-")
+    # Evitar colisiones con el separador de tipos de parte
+    return cleaned.replace(PARTS_SEPARATOR, "_") or "default"
+
+
+def entry_created(cache_file: str) -> float:
+    """Momento en que se guardó una entrada: su ID es el timestamp en milisegundos."""
+    name = os.path.basename(cache_file)[:-len(".json")]
+    if name.isdigit():
+        return int(name) / 1000
+    return os.path.getmtime(cache_file)
+
+
+def partition_key(config: CarConfig) -> PartitionKey:
+    """Obtiene la clave de partición del pool para una configuración."""
+    style = config.style.value if hasattr(config.style, "value") else config.style
+    return (
+        _sanitize(style),
+        _sanitize(config.engineType),
+        _sanitize(config.transmissionType),
+        _sanitize(config.wheelsType)
+    )
+
+
 class CacheService:
+    """
+    Pool de respuestas pre-generadas particionado por configuración.
+
+    Cada partición vive en ``cache/<style>/<engine>__<transmission>__<wheels>/``
+    y se indexa en memoria con una cola por partición, de modo que obtener
+    una respuesta para una configuración es O(1). Los archivos antiguos en la
+    raíz de ``cache/`` no tienen estilo conocido: se agrupan en la partición
+    ``legacy`` solo para reportarlos y nunca se sirven.
+    """
+
     def __init__(self):
         # Obtener la ruta absoluta del directorio raíz del proyecto
         current_dir = os.path.dirname(os.path.abspath(__file__))
         project_root = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
         self.cache_dir = os.path.join(project_root, "cache")
         logger.info(f"Directorio de caché configurado en: {self.cache_dir}")
+        self._lock = threading.Lock()
+        self._index: Dict[PartitionKey, Deque[str]] = {}
+        # Segundos que una entrada puede servirse desde que se guardó (0 = sin vencimiento)
+        self.entry_ttl = settings.POOL_ENTRY_TTL
         self._ensure_cache_dir()
-        
+        self._build_index()
+
     def _ensure_cache_dir(self):
         """Asegura que el directorio de caché exista."""
         try:
@@ -31,15 +89,74 @@ class CacheService:
                 logger.info(f"Directorio de caché creado en: {self.cache_dir}")
             else:
                 logger.info(f"Usando directorio de caché existente: {self.cache_dir}")
-                # Listar archivos existentes
-                cache_files = [f for f in os.listdir(self.cache_dir) if f.endswith('.json')]
-                logger.info(f"Archivos en caché encontrados: {len(cache_files)}")
-                for file in cache_files:
-                    logger.debug(f"Archivo en caché: {file}")
         except Exception as e:
             logger.error(f"Error creando directorio de caché: {str(e)}")
             raise
-    
+
+    def _partition_dir(self, key: PartitionKey) -> str:
+        """Ruta del directorio de una partición."""
+        if key == LEGACY_PARTITION:
+            return self.cache_dir
+        style, engine, transmission, wheels = key
+        return os.path.join(
+            self.cache_dir,
+            style,
+            PARTS_SEPARATOR.join((engine, transmission, wheels))
+        )
+
+    def _list_partition_files(self, key: PartitionKey) -> List[str]:
+        """Lista los archivos de una partición ordenados del más antiguo al más nuevo."""
+        directory = self._partition_dir(key)
+        try:
+            names = [f for f in os.listdir(directory) if f.endswith('.json')]
+        except FileNotFoundError:
+            return []
+        return [os.path.join(directory, name) for name in sorted(names)]
+
+    def _build_index(self):
+        """Recorre el directorio de caché una sola vez y construye el índice por partición."""
+        index: Dict[PartitionKey, Deque[str]] = {}
+
+        legacy_files = self._list_partition_files(LEGACY_PARTITION)
+        if legacy_files:
+            index[LEGACY_PARTITION] = deque(legacy_files)
+
+        for style in sorted(os.listdir(self.cache_dir)):
+            style_dir = os.path.join(self.cache_dir, style)
+            if not os.path.isdir(style_dir):
+                continue
+            for parts in sorted(os.listdir(style_dir)):
+                pieces = parts.split(PARTS_SEPARATOR)
+                if len(pieces) != 3 or not os.path.isdir(os.path.join(style_dir, parts)):
+                    logger.warning(f"Directorio de partición inválido ignorado: {style}/{parts}")
+                    continue
+                key = (style, *pieces)
+                files = self._list_partition_files(key)
+                if files:
+                    index[key] = deque(files)
+
+        with self._lock:
+            self._index = index
+
+        total = sum(len(files) for files in index.values())
+        logger.info(f"Respuestas en caché encontradas: {total} en {len(index)} particiones")
+
+    def rebuild_index(self):
+        """Vuelve a recorrer todo el caché, incluidas las entradas guardadas por otros workers."""
+        self._build_index()
+
+    def _refresh_partition(self, key: PartitionKey):
+        """
+        Vuelve a leer del disco una partición vacía. Permite ver entradas
+        guardadas por otros workers sin recorrer todo el caché.
+        """
+        files = self._list_partition_files(key)
+        with self._lock:
+            if files:
+                self._index[key] = deque(files)
+            else:
+                self._index.pop(key, None)
+
     def _convert_part_to_dict(self, part: CarPart) -> Dict:
         """Convierte un objeto CarPart a diccionario."""
         return {
@@ -49,70 +166,194 @@ class CacheService:
             "stat3": part.stat3,
             "imageURI": part.imageURI
         }
-    
-    def save_response(self, response_data: Dict) -> str:
-        """Guarda una respuesta pre-generada y retorna su ID."""
+
+    def save_response(self, response_data: Dict, config: CarConfig) -> str:
+        """Guarda una respuesta pre-generada en la partición de su configuración y retorna su ID."""
         try:
             # Convertir la respuesta a un formato serializable
             serializable_response = {
                 "carImageURI": response_data["carImageURI"],
                 "parts": [self._convert_part_to_dict(part) for part in response_data["parts"]]
             }
-            
+            if response_data.get("atlas") is not None:
+                atlas = response_data["atlas"]
+                serializable_response["atlas"] = atlas.model_dump() if hasattr(atlas, "model_dump") else atlas
+
+            key = partition_key(config)
+            partition_dir = self._partition_dir(key)
+            os.makedirs(partition_dir, exist_ok=True)
+
             # Generar un ID único basado en el timestamp
-            cache_id = str(int(time.time() * 1000))
-            
-            # Crear archivo de caché
-            cache_file = os.path.join(self.cache_dir, f"{cache_id}.json")
-            logger.info(f"Guardando respuesta en: {cache_file}")
-            
-            # Guardar con formato pretty para mejor legibilidad
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(serializable_response, f, indent=2, ensure_ascii=False)
-                
-            logger.info(f"Respuesta guardada en caché con ID: {cache_id}")
-            logger.debug(f"Contenido guardado: {json.dumps(serializable_response, indent=2)}")
+            timestamp = int(time.time() * 1000)
+            cache_id = str(timestamp)
+            cache_file = os.path.join(partition_dir, f"{cache_id}.json")
+            while os.path.exists(cache_file):
+                timestamp += 1
+                cache_id = str(timestamp)
+                cache_file = os.path.join(partition_dir, f"{cache_id}.json")
+
+            # Escribir en un archivo temporal y renombrar para que otros
+            # workers nunca lean una entrada a medio escribir
+            # El contenido se guarda compacto para servirlo tal cual, sin re-serializar
+            temp_file = f"{cache_file}.tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(orjson.dumps(serializable_response))
+            os.replace(temp_file, cache_file)
+
+            with self._lock:
+                self._index.setdefault(key, deque()).append(cache_file)
+
+            logger.info(f"Respuesta guardada en caché con ID: {cache_id} (partición {key})")
             return cache_id
-            
+
         except Exception as e:
             logger.error(f"Error guardando respuesta en caché: {str(e)}")
             raise
-    
-    def get_cached_response(self) -> Optional[Dict]:
-        """Obtiene y elimina una respuesta pre-generada si está disponible."""
-        try:
-            # Buscar archivos de caché disponibles
-            cache_files = [f for f in os.listdir(self.cache_dir) if f.endswith('.json')]
-            
-            if not cache_files:
-                logger.info("No hay respuestas pre-generadas disponibles")
-                return None
-                
-            # Tomar el primer archivo disponible
-            cache_file = os.path.join(self.cache_dir, cache_files[0])
-            logger.info(f"Intentando leer archivo de caché: {cache_file}")
-            
+
+    def _candidate_partitions(self, key: PartitionKey) -> List[PartitionKey]:
+        """
+        Orden de búsqueda para una configuración:
+        1. La partición exacta.
+        2. Cualquier partición del mismo estilo, la más llena primero.
+        Nunca se sirve un carro de otro estilo ni de estilo desconocido.
+        """
+        with self._lock:
+            same_style = [
+                other for other, files in self._index.items()
+                if other != key and other != LEGACY_PARTITION and other[0] == key[0] and files
+            ]
+            same_style.sort(key=lambda other: len(self._index[other]), reverse=True)
+        return [key, *same_style]
+
+    def _pop_from_partition(self, key: PartitionKey) -> Optional[bytes]:
+        """Extrae y elimina la entrada más antigua disponible de una partición."""
+        while True:
+            with self._lock:
+                files = self._index.get(key)
+                if not files:
+                    return None
+                cache_file = files.popleft()
+
+            if self.is_expired(cache_file):
+                self._delete(cache_file, "vencida")
+                continue
+
             try:
-                # Leer la respuesta
-                with open(cache_file, 'r', encoding='utf-8') as f:
+                with open(cache_file, 'rb') as f:
                     content = f.read()
-                    logger.debug(f"Contenido leído del caché: {content}")
-                    response_data = json.loads(content)
-                
-                # Eliminar el archivo usado
                 os.remove(cache_file)
-                logger.info(f"Respuesta de caché utilizada y eliminada: {cache_files[0]}")
-                
-                return response_data
-                
-            except json.JSONDecodeError as je:
-                logger.error(f"Error decodificando JSON del caché: {str(je)}")
-                # Si hay error en el JSON, eliminar el archivo corrupto
-                if os.path.exists(cache_file):
-                    os.remove(cache_file)
-                    logger.info(f"Archivo de caché corrupto eliminado: {cache_file}")
-                return None
-                
+            except FileNotFoundError:
+                # Otro worker ya consumió esta entrada
+                continue
+
+            # Las entradas se escriben con un rename atómico; un archivo que no
+            # termina en "}" quedó truncado por otro medio y se descarta
+            if not content.rstrip().endswith(b"}"):
+                logger.error(f"Archivo de caché corrupto eliminado: {cache_file}")
+                continue
+
+            logger.info("Respuesta de caché utilizada y eliminada: %s", os.path.basename(cache_file), extra=HOT_PATH)
+            return content
+
+    def is_expired(self, cache_file: str, now: Optional[float] = None) -> bool:
+        if not self.entry_ttl:
+            return False
+        try:
+            return (now or time.time()) - entry_created(cache_file) > self.entry_ttl
+        except FileNotFoundError:
+            return False
+
+    def _delete(self, cache_file: str, reason: str) -> bool:
+        """Borra el archivo de una entrada; False si otro worker ya lo había consumido."""
+        try:
+            os.remove(cache_file)
+        except FileNotFoundError:
+            return False
+        logger.info(f"Entrada del pool eliminada ({reason}): {os.path.basename(cache_file)}")
+        return True
+
+    def list_entries(self) -> List[Tuple[PartitionKey, str]]:
+        """Entradas servibles del índice (sin la partición legacy), de la más antigua a la más nueva."""
+        with self._lock:
+            return [
+                (key, cache_file)
+                for key, files in self._index.items()
+                if key != LEGACY_PARTITION
+                for cache_file in files
+            ]
+
+    def evict(self, key: PartitionKey, cache_file: str, reason: str) -> bool:
+        """Quita una entrada del índice y del disco para que no se sirva."""
+        with self._lock:
+            files = self._index.get(key)
+            if files is not None and cache_file in files:
+                files.remove(cache_file)
+        return self._delete(cache_file, reason)
+
+    def get_cached_response_bytes(self, config: CarConfig) -> Optional[bytes]:
+        """
+        Obtiene y elimina una respuesta pre-generada compatible con la
+        configuración, como el JSON ya serializado que se guardó en disco.
+        """
+        try:
+            key = partition_key(config)
+
+            # Si la partición exacta está vacía en memoria, verificar el disco
+            if not self._index.get(key):
+                self._refresh_partition(key)
+
+            for candidate in self._candidate_partitions(key):
+                content = self._pop_from_partition(candidate)
+                if content is not None:
+                    if candidate != key:
+                        logger.info("Partición %s vacía, usando respuesta de %s", key, candidate, extra=HOT_PATH)
+                    return content
+
+            logger.info("No hay respuestas pre-generadas disponibles para %s", key, extra=HOT_PATH)
+            return None
+
         except Exception as e:
             logger.error(f"Error obteniendo respuesta de caché: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
+
+    def get_cached_response(self, config: CarConfig) -> Optional[Dict]:
+        """Obtiene y elimina una respuesta pre-generada compatible con la configuración."""
+        content = self.get_cached_response_bytes(config)
+        if content is None:
+            return None
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError as je:
+            logger.error(f"Error decodificando JSON del caché: {str(je)}")
+            return None
+
+    def get_partition_depths(self) -> Dict[str, int]:
+        """
+        Retorna la cantidad de respuestas disponibles en cada partición. Vuelve
+        a recorrer el disco: el índice de este worker no ve lo que guardaron o
+        sirvieron los demás.
+        """
+        self._build_index()
+        with self._lock:
+            return {
+                "/".join(key): len(files)
+                for key, files in sorted(self._index.items())
+                if files
+            }
+
+    def get_low_partitions(self, configs: List[CarConfig], min_depth: int) -> List[Tuple[CarConfig, int]]:
+        """
+        Indica qué configuraciones tienen menos de ``min_depth`` respuestas
+        disponibles y cuántas faltan para cada una, para dirigir el rellenado.
+        Cada partición se vuelve a leer del disco para no rellenar de más lo
+        que otro worker ya guardó.
+        """
+        low = []
+        for key in dict.fromkeys(partition_key(config) for config in configs):
+            self._refresh_partition(key)
+        with self._lock:
+            for config in configs:
+                depth = len(self._index.get(partition_key(config), ()))
+                if depth < min_depth:
+                    low.append((config, min_depth - depth))
+        return low
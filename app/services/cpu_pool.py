@@ -0,0 +1,48 @@
+"""
+Pool de hilos para el trabajo de CPU de cada worker (remoción de fondo,
+codificación PNG, sprites locales).
+
+onnxruntime y Pillow liberan el GIL durante la inferencia y la codificación,
+así que un pool de hilos dimensionado con ``CPU_WORKERS`` aprovecha los
+núcleos compartiendo un solo modelo rembg por proceso, en lugar de cargar
+uno por proceso. El event loop queda libre para servir el caché y esperar a
+las APIs externas mientras tanto.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from ..config import settings
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_cpu_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.CPU_WORKERS, thread_name_prefix="cpu")
+    return _executor
+
+
+async def run_cpu(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Ejecuta una función de CPU en el pool sin bloquear el event loop. Copia el
+    contexto (ids de correlación, span activo) como hace asyncio.to_thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_cpu_executor(),
+        functools.partial(context.run, func, *args, **kwargs)
+    )
+
+
+def shutdown_cpu_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,252 +1,312 @@
-from .stability_service import StabilityService
+from .image_providers import ImageProviderRouter
 from .lighthouse_service import LighthouseService
-import requests
 from io import BytesIO
-from rembg import remove, new_session
 from PIL import Image
 import os
-import random
-from ..models.car_model import CarPart, PartType, CarConfig
+from ..models.car_model import CarPart, PartType, CarConfig, SpriteAtlas
 import logging
-import glob
 import asyncio
-from typing import Dict, List, Tuple
-from openai import OpenAI
+import time
+from typing import Dict, List, Optional, Tuple
 from ..config import settings
+from .multipart_stream import encode_png
+from .cpu_pool import run_cpu
+from .matting import MattingSessions
+from .sprite_atlas import build_atlas
+from .stats_engine import StatsEngine, PartStats
+from .asset_index import AssetIndex, assets_signature
+from .prompt_service import PromptService, DEFAULT_COLOR_BASE
+from ..logging_config import generation_id_var, new_correlation_id
+from ..tracing import span, traced
 
 logger = logging.getLogger(__name__)
 
+# Orden de las imágenes de una generación
+PART_NAMES = ['car', 'engine', 'transmission', 'wheels']
+
 class ImageGenerationService:
     def __init__(self):
-        self.stability_service = StabilityService()
+        self.image_router = ImageProviderRouter()
         self.lighthouse_service = LighthouseService()
-        self.openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.prompt_service = PromptService()
+        self.stats_engine = StatsEngine()
+        # Sesiones de remoción de fondo por estilo; el modelo por defecto se carga al iniciar
+        self.matting = MattingSessions()
         logger.info("Iniciando carga del modelo rembg...")
         try:
-            self.rembg_session = new_session()
+            self.matting.get()
             logger.info("Modelo rembg cargado exitosamente")
         except Exception as e:
             logger.error(f"Error cargando modelo rembg: {str(e)}")
-            self.rembg_session = None
-        
-        # Obtener todas las imágenes de referencia
-        self.base_dir = os.path.join(os.path.dirname(__file__), "..", "..", "assets")
         
-        # Cargar imágenes de referencia por tipo
-        self.reference_images = {
-            'car': self._load_references('*.png'),
-            'motor': self._load_references('motor/*.{png,jpg,jpeg,webp}'),
-            'transmission': self._load_references('transmission/*.{png,jpg,jpeg,webp}'),
-            'wheels': self._load_references('wheels/*.{png,jpg,jpeg,webp}')
-        }
-        
-        logger.info(f"Imágenes de referencia encontradas:")
-        for key, images in self.reference_images.items():
-            logger.info(f"- {key}: {len(images)} imágenes")
-
-    def _load_references(self, pattern: str) -> List[str]:
-        """Cargar imágenes de referencia según un patrón."""
-        path = os.path.join(self.base_dir, pattern)
-        # Usar glob.glob con múltiples patrones
-        if '{' in pattern:
-            # Si el patrón tiene llaves, expandir para cada extensión
-            images = []
-            for ext in ['png', 'jpg', 'jpeg', 'webp']:
-                expanded_path = path.replace('{png,jpg,jpeg,webp}', ext)
-                images.extend(glob.glob(expanded_path))
-        else:
-            # Si es un patrón simple, usarlo directamente
-            images = glob.glob(path)
-            
-        if not images:
-            logger.warning(f"No se encontraron imágenes para el patrón: {pattern}")
-        return images
+        # Cargar el índice de imágenes de referencia desde el manifiesto
+        self.base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "assets"))
+        self.asset_index = AssetIndex.load(self.base_dir)
+        self._reload_lock = asyncio.Lock()
+        self.last_assets_reload: Optional[float] = None
 
-    def _get_random_reference(self, part_type: str) -> str:
-        """Obtener una imagen de referencia aleatoria según el tipo."""
-        images = self.reference_images.get(part_type, [])
-        if not images:
-            logger.warning(f"No hay imágenes de referencia para {part_type}, usando imágenes de carro")
-            images = self.reference_images['car']
-        
-        selected = random.choice(images)
-        logger.info(f"Usando imagen de referencia para {part_type}: {os.path.basename(selected)}")
-        return selected
+    async def _get_random_reference(self, part_type: str, assets: Optional[AssetIndex] = None) -> Tuple[str, bytes]:
+        """
+        Obtener una imagen de referencia balanceada según el tipo, junto con
+        su versión redimensionada. Una generación debe pasar siempre el mismo
+        índice para no mezclar referencias si ocurre una recarga.
+        """
+        assets = assets or self.asset_index
+        path = assets.choose(part_type)
+        reference_bytes = assets.cached(path)
+        if reference_bytes is None:
+            # Primera vez que se usa: el redimensionado LANCZOS no debe bloquear el event loop
+            reference_bytes = await run_cpu(assets.preprocessed, path)
+        return path, reference_bytes
 
-    async def _generate_and_upload(self, 
-        part_type: str, 
-        prompt: str, 
-        reference_type: str
-    ) -> Tuple[bytes, str]:
-        """Generar y subir una imagen."""
+    async def warm_references(self):
+        """Precalcula las referencias redimensionadas en el pool de CPU."""
+        assets = self.asset_index
+        start = time.perf_counter()
         try:
-            # Generar imagen
-            image_bytes = await self.stability_service.generate_car_variation(
-                self._get_random_reference(reference_type),
-                prompt
-            )
-            
-            # Remover fondo
-            img = Image.open(BytesIO(image_bytes))
-            if self.rembg_session is None:
-                self.rembg_session = new_session()
-            output = remove(img, session=self.rembg_session)
-            
-            # Convertir a bytes
-            img_byte_arr = BytesIO()
-            output.save(img_byte_arr, format='PNG', optimize=True)
-            processed_bytes = img_byte_arr.getvalue()
-            
-            # Subir a Lighthouse
-            uri = await self.lighthouse_service.upload_image(
-                processed_bytes,
-                f"{part_type}.png"
-            )
-            
-            return processed_bytes, uri
+            await run_cpu(assets.warm)
         except Exception as e:
-            logger.error(f"Error generando {part_type}: {str(e)}")
-            raise
+            # No es fatal: las que falten se redimensionan al usarlas, también en el pool
+            logger.error(f"Error precalculando referencias: {str(e)}")
+            return
+        logger.info(f"Referencias redimensionadas en caché: {len(assets.paths())} en {time.perf_counter() - start:.1f}s")
+
+    async def reload_assets(self) -> bool:
+        """
+        Reconstruye el índice de referencias y su caché de imágenes
+        redimensionadas en un hilo aparte y lo reemplaza de forma atómica.
+        Las generaciones en curso conservan el índice con el que empezaron.
+        Retorna False si ya había una recarga en curso.
+        """
+        if self._reload_lock.locked():
+            logger.info("Ya hay una recarga de referencias en curso")
+            return False
+
+        async with self._reload_lock:
+            def build() -> AssetIndex:
+                index = AssetIndex.rebuild(self.base_dir)
+                index.warm()
+                return index
+
+            self.asset_index = await asyncio.get_running_loop().run_in_executor(None, build)
+            self.last_assets_reload = time.time()
+            logger.info("Imágenes de referencia recargadas: " + ", ".join(
+                f"{category}={len(entries)}" for category, entries in self.asset_index.entries.items()
+            ))
+            return True
+
+    async def watch_assets(self, interval: float):
+        """Revisa periódicamente assets/ y recarga las referencias si cambiaron."""
+        logger.info(f"Vigilando cambios en referencias cada {interval}s")
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                signature = await loop.run_in_executor(None, assets_signature, self.base_dir)
+                if signature != self.asset_index.signature:
+                    logger.info("Cambios detectados en assets/, recargando referencias")
+                    await self.reload_assets()
+            except Exception as e:
+                logger.error(f"Error recargando referencias: {str(e)}")
+
+    def _cutout(self, image_bytes: bytes, style=None) -> Image.Image:
+        """Remueve el fondo de una imagen con el modelo que corresponde al estilo."""
+        img = Image.open(BytesIO(image_bytes))
+        if img.mode == "RGBA" and img.getextrema()[3][0] < 255:
+            # La imagen ya tiene fondo transparente (por ejemplo, del generador local)
+            return img
+        with span("matting.remove", model=self.matting.model_for(style), mode=self.matting.mode):
+            output = self.matting.remove(img, style)
+        img.close()
+        return output
+
+    def _encode(self, image: Image.Image, name: str = "encode_png") -> Tuple[BytesIO, memoryview]:
+        """
+        Codifica como PNG. Retorna el buffer y una vista sin copia de su
+        contenido; el buffer debe mantenerse vivo hasta terminar la subida.
+        """
+        # En modo rápido se prioriza CPU sobre unos KB de PNG
+        optimize = not self.matting.fast
+        with span(name, optimize=optimize) as current:
+            buffer, view = encode_png(image, optimize=optimize)
+            current.set_attribute("bytes_out", len(view))
+        return buffer, view
+
+    def _remove_background(self, image_bytes: bytes, style=None) -> Tuple[BytesIO, memoryview]:
+        """Remueve el fondo de una imagen y la codifica como PNG."""
+        return self._encode(self._cutout(image_bytes, style))
+
+    def _build_atlas(self, cutouts: List[Image.Image]) -> Tuple[BytesIO, memoryview, Dict]:
+        """Empaqueta las imágenes sin fondo en un atlas PNG y retorna su mapa de cuadros."""
+        with span("build_atlas"):
+            atlas, frame_map = build_atlas(dict(zip(PART_NAMES, cutouts)))
+        buffer, view = self._encode(atlas, "encode_atlas_png")
+        return buffer, view, frame_map
 
     async def _generate_creative_prompt(self) -> tuple[str, str]:
-        """Genera un prompt creativo para el carro usando generación local."""
+        """
+        Genera un prompt creativo para el carro. Según CREATIVE_PROMPT_MODE
+        usa generación local o prompts de OpenAI pre-generados en caché.
+        """
         try:
-            # Listas de elementos para generar descripciones
-            colors = ["rojo", "azul", "verde", "negro", "blanco", "amarillo", "plateado", "dorado", "naranja", "púrpura"]
-            styles = ["futurista", "clásico", "moderno", "retro", "elegante", "agresivo", "deportivo", "luxury"]
-            details = ["con detalles cromados", "con líneas aerodinámicas", "con alerones deportivos", "con diseño minimalista"]
-            features = [
-                "con faros LED integrados",
-                "con tomas de aire laterales",
-                "con parrilla frontal distintiva",
-                "con perfil bajo y estilizado",
-                "con curvas suaves y elegantes",
-                "con diseño angular y agresivo",
-                "con acabados metálicos premium",
-                "con líneas deportivas fluidas"
-            ]
-            
-            # Generar descripción aleatoria más detallada
-            selected_color = random.choice(colors)
-            selected_style = random.choice(styles)
-            selected_details = random.choice(details)
-            selected_features = random.choice(features)
-            
-            creative_prompt = f"carro {selected_style} {selected_color} {selected_details} {selected_features}"
-            
-            # Mapear colores a inglés para las partes
-            color_mapping = {
-                "rojo": "red colored, crimson accents",
-                "azul": "blue colored, metallic blue accents",
-                "verde": "green colored, emerald accents",
-                "negro": "black colored, dark chrome accents",
-                "blanco": "white colored, pearl accents",
-                "amarillo": "yellow colored, gold accents",
-                "plateado": "silver colored, chrome accents",
-                "dorado": "gold colored, bronze accents",
-                "naranja": "orange colored, copper accents",
-                "púrpura": "purple colored, metallic accents"
-            }
-            
-            color_base = color_mapping.get(selected_color, "metallic colored, chrome accents")
-            
-            logger.info(f"Prompt generado: {creative_prompt}")
+            creative_prompt, color_base = self.prompt_service.get_prompt()
+            logger.debug("Prompt generado: %s", creative_prompt)
             return creative_prompt, color_base
             
         except Exception as e:
             logger.error(f"Error generando prompt creativo: {str(e)}")
-            return "modern sports car with aerodynamic design", "metallic colored, chrome accents"
+            return "modern sports car with aerodynamic design", DEFAULT_COLOR_BASE
+
+    async def generate_car_assets(
+        self,
+        config: CarConfig,
+        stats: Optional[Dict[PartType, PartStats]] = None
+    ) -> dict:
+        """
+        Genera todos los assets del carro y sus estadísticas.
+        Las estadísticas pueden venir ya calculadas, por ejemplo de un lote.
+        """
+        # Id de correlación de esta generación en todos sus registros
+        generation_id_var.set(new_correlation_id())
+        with span(
+            "generate_car_assets",
+            style=config.style,
+            engine_type=config.engineType,
+            transmission_type=config.transmissionType,
+            wheels_type=config.wheelsType,
+            precomputed_stats=stats is not None
+        ):
+            return await self._generate_car_assets(config, stats)
 
-    async def generate_car_assets(self, config: CarConfig) -> dict:
-        """Genera todos los assets del carro y sus estadísticas."""
+    async def _generate_car_assets(
+        self,
+        config: CarConfig,
+        stats: Optional[Dict[PartType, PartStats]]
+    ) -> dict:
         try:
             logger.info("Iniciando generación paralela de imágenes...")
             
             # Generar prompt creativo
             creative_prompt, base_colors = await self._generate_creative_prompt()
             
-            # Preparar todas las referencias y prompts primero
-            car_ref = self._get_random_reference('car')
-            engine_ref = self._get_random_reference('motor')
-            transmission_ref = self._get_random_reference('transmission')
-            wheels_ref = self._get_random_reference('wheels')
+            # Preparar todas las referencias y prompts primero, todas del mismo índice
+            assets = self.asset_index
+            (
+                (car_ref, car_ref_bytes),
+                (engine_ref, engine_ref_bytes),
+                (transmission_ref, transmission_ref_bytes),
+                (wheels_ref, wheels_ref_bytes)
+            ) = await asyncio.gather(*(
+                self._get_random_reference(part_type, assets)
+                for part_type in ('car', 'motor', 'transmission', 'wheels')
+            ))
             
             # Crear todas las tareas de generación al mismo tiempo
             tasks = []
             
             # Carro principal - usar el prompt creativo
             car_prompt = f"{creative_prompt}, perfect top-down view, centered, high quality, detailed design"
-            tasks.append(self.stability_service.generate_car_variation(
+            tasks.append(traced("generate_image", self.image_router.generate(
                 car_ref,
                 car_prompt,
-                config.style
-            ))
+                config.style,
+                car_ref_bytes
+            ), part_type="car"))
             
             # Motor - prompt específico para motor
             engine_prompt = f"detailed {config.engineType} car engine, {base_colors}, technical diagram style, mechanical parts visible, pistons, cylinders, valves, highly detailed engine block, {config.style} style, centered on pure white background"
-            tasks.append(self.stability_service.generate_car_variation(
+            tasks.append(traced("generate_image", self.image_router.generate(
                 engine_ref,
                 engine_prompt,
-                config.style
-            ))
+                config.style,
+                engine_ref_bytes
+            ), part_type="engine"))
             
             # Transmisión - prompt específico para transmisión
             transmission_prompt = f"detailed automotive {config.transmissionType} transmission gearbox mechanism, {base_colors}, technical diagram style, car transmission parts visible, automotive gearbox, mechanical transmission system, drivetrain components, vehicle transmission, {config.style} style, centered on pure white background"
-            tasks.append(self.stability_service.generate_car_variation(
+            tasks.append(traced("generate_image", self.image_router.generate(
                 transmission_ref,
                 transmission_prompt,
-                config.style
-            ))
+                config.style,
+                transmission_ref_bytes
+            ), part_type="transmission"))
             
             # Ruedas - prompt específico para ruedas
             wheels_prompt = f"detailed automotive {config.wheelsType} car wheel and tire assembly, {base_colors}, automotive wheel design, car rim details, vehicle tire tread pattern, automotive brake system, car wheel components, vehicle wheel, {config.style} style, centered on pure white background"
-            tasks.append(self.stability_service.generate_car_variation(
+            tasks.append(traced("generate_image", self.image_router.generate(
                 wheels_ref,
                 wheels_prompt,
-                config.style
-            ))
+                config.style,
+                wheels_ref_bytes
+            ), part_type="wheels"))
             
             # Ejecutar todas las generaciones en paralelo
-            logger.info("Ejecutando generación de imágenes en paralelo...")
-            logger.info(f"Prompts utilizados:")
-            logger.info(f"Carro: {car_prompt}")
-            logger.info(f"Motor: {engine_prompt}")
-            logger.info(f"Transmisión: {transmission_prompt}")
-            logger.info(f"Ruedas: {wheels_prompt}")
+            logger.debug("Ejecutando generación de imágenes en paralelo...")
+            logger.debug(
+                "Prompts utilizados: carro=%s | motor=%s | transmisión=%s | ruedas=%s",
+                car_prompt, engine_prompt, transmission_prompt, wheels_prompt
+            )
             
             image_results = await asyncio.gather(*tasks)
             logger.info("Generación de imágenes completada")
             
             # Procesar y subir las imágenes generadas
-            upload_tasks = []
-            for idx, (part_type, image_bytes) in enumerate([
-                ('car', image_results[0]),
-                ('engine', image_results[1]),
-                ('transmission', image_results[2]),
-                ('wheels', image_results[3])
-            ]):
-                # Remover fondo
-                img = Image.open(BytesIO(image_bytes))
-                if self.rembg_session is None:
-                    self.rembg_session = new_session()
-                output = remove(img, session=self.rembg_session)
-                
-                # Convertir a bytes
-                img_byte_arr = BytesIO()
-                output.save(img_byte_arr, format='PNG', optimize=True)
-                processed_bytes = img_byte_arr.getvalue()
-                
-                # Agregar tarea de subida
-                upload_tasks.append(self.lighthouse_service.upload_image(
-                    processed_bytes,
-                    f"{part_type}.png"
+            upload_files = []
+            buffers = []
+            atlas_mode = settings.SPRITE_ATLAS.lower()
+            frame_map = None
+            if atlas_mode in ("extra", "only"):
+                # Remover fondos en el pool de CPU y empaquetar los cuatro sprites en un atlas
+                cutouts = await asyncio.gather(*(
+                    traced(
+                        "remove_background",
+                        run_cpu(self._cutout, image_bytes, config.style),
+                        part_type=part_type,
+                        bytes_in=len(image_bytes)
+                    )
+                    for part_type, image_bytes in zip(PART_NAMES, image_results)
                 ))
+                image_results = None
+                buffer, atlas_bytes, frame_map = await run_cpu(self._build_atlas, cutouts)
+                buffers.append(buffer)
+                upload_files.append(("atlas.png", atlas_bytes))
+                if atlas_mode == "extra":
+                    processed = await asyncio.gather(*(run_cpu(self._encode, cutout) for cutout in cutouts))
+                else:
+                    processed = []
+                cutouts = None
+            else:
+                # Remover fondos en el pool de CPU, las cuatro imágenes a la vez
+                processed = await asyncio.gather(*(
+                    traced(
+                        "remove_background",
+                        run_cpu(self._remove_background, image_bytes, config.style),
+                        part_type=part_type,
+                        bytes_in=len(image_bytes)
+                    )
+                    for part_type, image_bytes in zip(PART_NAMES, image_results)
+                ))
+                # Liberar los bytes originales en cuanto se procesan
+                image_results = None
+            for part_type, (buffer, processed_bytes) in zip(PART_NAMES, processed):
+                # Mantener vivo el buffer hasta que termine su subida
+                buffers.append(buffer)
+                
+                upload_files.append((f"{part_type}.png", processed_bytes))
             
-            # Subir todas las imágenes en paralelo
-            logger.info("Subiendo imágenes en paralelo...")
-            uris = await asyncio.gather(*upload_tasks)
+            # Subir todas las imágenes juntas, en una sola petición multipart
+            logger.debug("Subiendo imágenes en lote...")
+            uris = await self.lighthouse_service.upload_batch(upload_files)
             logger.info("Subida de imágenes completada")
             
+            atlas = None
+            if frame_map is not None:
+                atlas_uri, uris = uris[0], uris[1:]
+                atlas = SpriteAtlas(imageURI=atlas_uri, **frame_map)
+                if not uris:
+                    # Solo atlas: todas las imágenes son cuadros de la misma textura
+                    uris = [atlas_uri] * len(PART_NAMES)
+            
             # Extraer URIs
             car_uri = uris[0]
             engine_uri = uris[1]
@@ -254,77 +314,33 @@ class ImageGenerationService:
             wheels_uri = uris[3]
             
             # Generar estadísticas
-            parts_data = []
-            
-            # Motor
-            stat1, stat2, stat3 = self._calculate_engine_stats(config)
-            parts_data.append(CarPart(
-                partType=PartType.ENGINE,
-                stat1=stat1,
-                stat2=stat2,
-                stat3=stat3,
-                imageURI=engine_uri
-            ))
+            if stats is None:
+                stats = self.stats_engine.generate(config)
             
-            # Transmisión
-            stat1, stat2, stat3 = self._calculate_transmission_stats(config)
-            parts_data.append(CarPart(
-                partType=PartType.TRANSMISSION,
-                stat1=stat1,
-                stat2=stat2,
-                stat3=stat3,
-                imageURI=transmission_uri
-            ))
-            
-            # Ruedas
-            stat1, stat2, stat3 = self._calculate_wheels_stats(config)
-            parts_data.append(CarPart(
-                partType=PartType.WHEELS,
-                stat1=stat1,
-                stat2=stat2,
-                stat3=stat3,
-                imageURI=wheels_uri
-            ))
+            parts_data = []
+            for part_type, uri in [
+                (PartType.ENGINE, engine_uri),
+                (PartType.TRANSMISSION, transmission_uri),
+                (PartType.WHEELS, wheels_uri)
+            ]:
+                stat1, stat2, stat3 = stats[part_type]
+                parts_data.append(CarPart(
+                    partType=part_type,
+                    stat1=stat1,
+                    stat2=stat2,
+                    stat3=stat3,
+                    imageURI=uri
+                ))
             
             # Construir respuesta final
-            return {
+            response = {
                 'carImageURI': car_uri,
                 'parts': parts_data
             }
+            if atlas is not None:
+                response['atlas'] = atlas
+            return response
             
         except Exception as e:
             logger.error(f"Error generating car assets: {repr(e)}")
             raise Exception(f"Failed to generate car assets: {str(e)}")
-
-    def _generate_weighted_stat(self) -> int:
-        """
-        Genera un número entre 1 y 10 donde 9 y 10 tienen 30% menos probabilidad
-        """
-        numbers = list(range(1, 11))
-        # Los números 1-8 tienen peso 1.0, mientras que 9 y 10 tienen peso 0.7
-        weights = [1.0] * 8 + [0.7] * 2
-        return random.choices(numbers, weights=weights)[0]
-
-    def _calculate_engine_stats(self, config: CarConfig) -> tuple[int, int, int]:
-        """Calculate engine statistics based on configuration."""
-        return (
-            self._generate_weighted_stat(),  # Potencia
-            self._generate_weighted_stat(),  # Eficiencia
-            self._generate_weighted_stat()   # Durabilidad
-        )
-
-    def _calculate_transmission_stats(self, config: CarConfig) -> tuple[int, int, int]:
-        """Calculate transmission statistics based on configuration."""
-        return (
-            self._generate_weighted_stat(),  # Velocidad de cambio
-            self._generate_weighted_stat(),  # Eficiencia
-            self._generate_weighted_stat()   # Control
-        )
-
-    def _calculate_wheels_stats(self, config: CarConfig) -> tuple[int, int, int]:
-        """Calculate wheels statistics based on configuration."""
-        return (
-            self._generate_weighted_stat(),  # Tracción
-            self._generate_weighted_stat(),  # Manejo
-            self._generate_weighted_stat()   # Agarre
-        )
@@ -0,0 +1,271 @@
+"""
+Proveedores de generación de imágenes y enrutamiento entre ellos.
+
+Cada proveedor implementa ``ImageProvider.generate``. ``ImageProviderRouter``
+mide la latencia (EWMA) y la tasa de error de cada uno, elige el de mejor
+puntaje (con preferencia configurable por ``CarStyle``) y, si falla, pasa
+automáticamente al siguiente. Opcionalmente, el generador local actúa como
+respaldo degradado cuando todos los proveedores fallan.
+"""
+import abc
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from ..config import settings
+from ..models.car_model import CarStyle
+from .openai_service import OpenAIService
+from .stability_service import StabilityService
+from .sprite_generator import generate_sprite
+from .style_preferences import parse_style_preferences
+from .cpu_pool import run_cpu
+from ..tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Peso de la muestra más reciente en los promedios móviles
+EWMA_ALPHA = 0.3
+
+# Cuánto penaliza la tasa de error al puntaje: latencia * (1 + ERROR_PENALTY * errores)
+ERROR_PENALTY = 4.0
+
+# Multiplicador del puntaje del proveedor preferido para un estilo
+PREFERENCE_BONUS = 0.5
+
+# Fallos consecutivos tras los que un proveedor se deja de usar por un tiempo
+MAX_CONSECUTIVE_FAILURES = 3
+COOLDOWN_SECONDS = 30.0
+
+# Sin muestras recientes, la latencia medida vuelve a la esperada para que un
+# proveedor que estuvo lento pueda volver a recibir tráfico
+RECOVERY_SECONDS = 120.0
+
+
+class ImageProvider(abc.ABC):
+    """Interfaz de un proveedor de imágenes."""
+
+    name: str = ""
+    # Latencia esperada (segundos) antes de tener mediciones
+    expected_latency: float = 10.0
+    # Tiempo máximo por generación antes de pasar al siguiente proveedor
+    timeout: float = 120.0
+
+    @abc.abstractmethod
+    async def generate(
+        self,
+        reference_path: str,
+        reference_bytes: Optional[bytes],
+        prompt: str,
+        style: CarStyle
+    ) -> bytes:
+        """Genera la imagen de un carro a partir de la referencia y el prompt."""
+
+
+class StabilityProvider(ImageProvider):
+    """Structure control de Stability: conserva la composición de la referencia."""
+
+    name = "stability"
+    expected_latency = 15.0
+
+    def __init__(self, service: Optional[StabilityService] = None):
+        # El timeout de la petición es el del proveedor: si el router deja de
+        # esperarla, el hilo que la envía no queda bloqueado indefinidamente
+        self.service = service or StabilityService(timeout=self.timeout)
+
+    async def generate(self, reference_path, reference_bytes, prompt, style):
+        return await self.service.generate_car_variation(reference_path, prompt, style, reference_bytes)
+
+
+class OpenAIProvider(ImageProvider):
+    """DALL·E 3: no usa la imagen de referencia, solo el prompt."""
+
+    name = "openai"
+    expected_latency = 20.0
+
+    def __init__(self, service: Optional[OpenAIService] = None):
+        self.service = service or OpenAIService()
+
+    async def generate(self, reference_path, reference_bytes, prompt, style):
+        return await self.service.generate_car_image_bytes(prompt, style)
+
+
+class LocalSpriteProvider(ImageProvider):
+    """
+    Generador local de sprites (sprite_generator): recolorea la referencia en
+    CPU en milisegundos. Sirve como modo offline, respaldo degradado y
+    backend rápido para pruebas.
+    """
+
+    name = "local"
+    expected_latency = 0.05
+    timeout = 10.0
+
+    async def generate(self, reference_path, reference_bytes, prompt, style):
+        if reference_bytes is None:
+            with open(reference_path, "rb") as f:
+                reference_bytes = f.read()
+        return await run_cpu(generate_sprite, reference_bytes, prompt, style)
+
+
+PROVIDER_CLASSES = {
+    StabilityProvider.name: StabilityProvider,
+    OpenAIProvider.name: OpenAIProvider,
+    LocalSpriteProvider.name: LocalSpriteProvider,
+}
+
+
+class ProviderStats:
+    """Latencia y tasa de error medidas de un proveedor."""
+
+    def __init__(self, expected_latency: float):
+        self.expected_latency = expected_latency
+        self.latency = expected_latency
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_sample = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def record_success(self, latency: float):
+        self.latency = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency
+        self.error_rate *= 1 - EWMA_ALPHA
+        self.consecutive_failures = 0
+        self.last_sample = time.monotonic()
+        self.requests += 1
+
+    def record_failure(self, latency: float):
+        # Un fallo lento también cuenta como latencia observada
+        self.latency = EWMA_ALPHA * max(latency, self.latency) + (1 - EWMA_ALPHA) * self.latency
+        self.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * self.error_rate
+        self.consecutive_failures += 1
+        self.last_sample = time.monotonic()
+        self.requests += 1
+        self.failures += 1
+        if self.consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+            self.cooldown_until = time.monotonic() + COOLDOWN_SECONDS
+
+    def in_cooldown(self) -> bool:
+        return time.monotonic() < self.cooldown_until
+
+    def score(self) -> float:
+        latency = self.latency
+        if time.monotonic() - self.last_sample > RECOVERY_SECONDS:
+            latency = min(latency, self.expected_latency)
+        return latency * (1 + ERROR_PENALTY * self.error_rate)
+
+    def to_dict(self) -> Dict:
+        return {
+            "latency_ewma": round(self.latency, 3),
+            "error_rate": round(self.error_rate, 3),
+            "score": round(self.score(), 3),
+            "cooldown": self.in_cooldown(),
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+def provider_classes(value: str) -> List[type]:
+    """Clases de los proveedores de una lista separada por comas, como IMAGE_PROVIDERS."""
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in PROVIDER_CLASSES]
+    if unknown:
+        raise ValueError(
+            f"IMAGE_PROVIDERS contiene proveedores desconocidos: {', '.join(unknown)}. "
+            f"Proveedores válidos: {', '.join(PROVIDER_CLASSES)}"
+        )
+    return [PROVIDER_CLASSES[name] for name in names]
+
+
+class ImageProviderRouter:
+    """Elige el proveedor por latencia y errores medidos, con failover automático."""
+
+    def __init__(
+        self,
+        providers: Optional[List[ImageProvider]] = None,
+        style_preferences: Optional[Dict[str, str]] = None,
+        fallback: Optional[ImageProvider] = None
+    ):
+        if providers is None:
+            providers = [provider_class() for provider_class in provider_classes(settings.IMAGE_PROVIDERS)]
+        if not providers:
+            raise ValueError("Se requiere al menos un proveedor de imágenes")
+
+        self.providers = {provider.name: provider for provider in providers}
+        self.stats = {provider.name: ProviderStats(provider.expected_latency) for provider in providers}
+        if style_preferences is None:
+            style_preferences = parse_style_preferences(settings.IMAGE_PROVIDER_PREFERENCES)
+        self.style_preferences = style_preferences
+
+        # Respaldo degradado: fuera del ranking, solo se usa si los demás fallan
+        if fallback is None and settings.LOCAL_FALLBACK and LocalSpriteProvider.name not in self.providers:
+            fallback = LocalSpriteProvider()
+        self.fallback = fallback
+        if fallback is not None:
+            self.stats[fallback.name] = ProviderStats(fallback.expected_latency)
+
+        logger.info(f"Proveedores de imágenes: {', '.join(self.providers)}"
+                    + (f" (respaldo: {fallback.name})" if fallback else ""))
+
+    def _ranked(self, style: CarStyle) -> List[str]:
+        """Proveedores ordenados del mejor al peor para un estilo."""
+        style_key = style.value if hasattr(style, "value") else style
+        preferred = self.style_preferences.get(style_key)
+
+        def score(name: str) -> float:
+            value = self.stats[name].score()
+            return value * PREFERENCE_BONUS if name == preferred else value
+
+        available = [name for name in self.providers if not self.stats[name].in_cooldown()]
+        cooling = [name for name in self.providers if self.stats[name].in_cooldown()]
+        # Los proveedores en espera solo se intentan si todos los demás fallan
+        return sorted(available, key=score) + sorted(cooling, key=score)
+
+    async def generate(
+        self,
+        reference_path: str,
+        prompt: str,
+        style: CarStyle = CarStyle.REALISTIC,
+        reference_bytes: Optional[bytes] = None
+    ) -> bytes:
+        """Genera una imagen con el mejor proveedor disponible."""
+        ranked = [self.providers[name] for name in self._ranked(style)]
+        if self.fallback is not None:
+            if all(self.stats[provider.name].in_cooldown() for provider in ranked):
+                # Todos los proveedores están fallando: no esperar sus timeouts
+                ranked = []
+            ranked.append(self.fallback)
+
+        errors = []
+        for attempt, provider in enumerate(ranked):
+            name = provider.name
+            stats = self.stats[name]
+            start = time.monotonic()
+            try:
+                # attempt > 0: el proveedor anterior falló y esto es un reintento con otro
+                with span(
+                    "image_provider.generate",
+                    provider=name,
+                    attempt=attempt,
+                    fallback=provider is self.fallback,
+                    style=style
+                ):
+                    result = await asyncio.wait_for(
+                        provider.generate(reference_path, reference_bytes, prompt, style),
+                        timeout=provider.timeout
+                    )
+                stats.record_success(time.monotonic() - start)
+                if provider is self.fallback:
+                    logger.warning("Imagen generada con el respaldo local (modo degradado)")
+                return result
+            except Exception as e:
+                stats.record_failure(time.monotonic() - start)
+                message = str(e) or type(e).__name__
+                errors.append(f"{name}: {message}")
+                logger.warning(f"Proveedor {name} falló, probando el siguiente: {message}")
+
+        raise Exception(f"Todos los proveedores de imágenes fallaron: {'; '.join(errors)}")
+
+    def get_stats(self) -> Dict[str, Dict]:
+        return {name: stats.to_dict() for name, stats in self.stats.items()}
@@ -0,0 +1,110 @@
+"""
+CID de IPFS de un archivo, calculado localmente.
+
+Lighthouse agrega los archivos con los valores por defecto de ``ipfs add``:
+bloques de 256 KiB, nodos UnixFS sin raw leaves y CID v0 (``Qm...``). Con
+el mismo procedimiento el CID se conoce antes de terminar la subida, y la
+respuesta del nodo se puede comparar contra él para detectar una subida
+incompleta o corrupta.
+
+Un archivo de un solo bloque es un nodo DAG-PB con los datos; uno más grande
+es un nodo raíz con un enlace por bloque (hasta ``MAX_LINKS`` por nodo, en
+árbol balanceado).
+"""
+import hashlib
+from typing import List, Tuple
+
+from .multipart_stream import BytesLike
+
+CHUNK_SIZE = 256 * 1024
+MAX_LINKS = 174
+
+# Multihash: sha2-256 de 32 bytes
+_SHA256_PREFIX = b"\x12\x20"
+_UNIXFS_FILE = 2
+
+_BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    """Campo protobuf de longitud variable (wire type 2)."""
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _uint_field(number: int, value: int) -> bytes:
+    """Campo protobuf entero (wire type 0)."""
+    return _varint(number << 3) + _varint(value)
+
+
+def _base58(data: bytes) -> str:
+    number = int.from_bytes(data, "big")
+    encoded = ""
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded = _BASE58_ALPHABET[remainder] + encoded
+    leading_zeros = len(data) - len(data.lstrip(b"\0"))
+    return "1" * leading_zeros + encoded
+
+
+def _unixfs_file(data: bytes, filesize: int, blocksizes: List[int] = ()) -> bytes:
+    message = _uint_field(1, _UNIXFS_FILE)
+    if data:
+        message += _field(2, data)
+    message += _uint_field(3, filesize)
+    for size in blocksizes:
+        message += _uint_field(4, size)
+    return message
+
+
+def _dag_node(unixfs: bytes, links: List[Tuple[bytes, int]] = ()) -> bytes:
+    """Nodo DAG-PB en forma canónica: los enlaces van antes que los datos."""
+    node = b""
+    for multihash, tsize in links:
+        node += _field(2, _field(1, multihash) + _field(2, b"") + _uint_field(3, tsize))
+    return node + _field(1, unixfs)
+
+
+def _multihash(node: bytes) -> bytes:
+    return _SHA256_PREFIX + hashlib.sha256(node).digest()
+
+
+def _build(leaves: List[Tuple[bytes, int, int]]) -> Tuple[bytes, int, int]:
+    """
+    Construye un nivel del árbol. Cada hoja es (multihash, tamaño del
+    subárbol codificado, bytes del archivo que cubre).
+    """
+    while len(leaves) > 1:
+        parents = []
+        for start in range(0, len(leaves), MAX_LINKS):
+            children = leaves[start:start + MAX_LINKS]
+            filesize = sum(child[2] for child in children)
+            node = _dag_node(
+                _unixfs_file(b"", filesize, [child[2] for child in children]),
+                [(child[0], child[1]) for child in children]
+            )
+            parents.append((_multihash(node), len(node) + sum(child[1] for child in children), filesize))
+        leaves = parents
+    return leaves[0]
+
+
+def compute_cid(content: BytesLike) -> str:
+    """CID v0 con el que ``ipfs add`` (y Lighthouse) publicaría el contenido."""
+    view = memoryview(content).cast("B")
+    leaves = []
+    for start in range(0, max(len(view), 1), CHUNK_SIZE):
+        chunk = view[start:start + CHUNK_SIZE].tobytes()
+        node = _dag_node(_unixfs_file(chunk, len(chunk)))
+        leaves.append((_multihash(node), len(node), len(chunk)))
+    return _base58(_build(leaves)[0])
@@ -1,60 +1,176 @@
-import os
+import asyncio
 import requests
 import logging
-from io import BytesIO
+from typing import Dict, List, Tuple
+import orjson
+from requests.adapters import HTTPAdapter
 from ..config import settings
+from .cpu_pool import run_cpu
+from .ipfs_cid import compute_cid
+from .multipart_stream import MultipartStream, BytesLike
+from ..logging_config import HOT_PATH
+from ..tracing import span, KIND_CLIENT
 
 logger = logging.getLogger(__name__)
 
+# Archivo a subir: nombre y contenido
+UploadFile = Tuple[str, BytesLike]
+
+
+# Espera antes del primer reintento de una subida; se duplica en cada intento
+RETRY_BACKOFF = 1.0
+
+
+class RetryableUploadError(Exception):
+    """Fallo de una subida que puede resolverse reintentando (timeout, red, 429 o 5xx)."""
+
+
+def _chunks(items: List, size: int) -> List[List]:
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
 class LighthouseService:
+    """
+    Subidas a Lighthouse. Los archivos de una generación se envían juntos en
+    una petición multipart (o en unas pocas, según LIGHTHOUSE_BATCH_FILES)
+    sobre conexiones reutilizadas, con a lo sumo LIGHTHOUSE_UPLOAD_CONCURRENCY
+    peticiones a la vez por worker. El CID de cada archivo se calcula antes
+    de subirlo y se compara con el que devuelve el nodo.
+    """
+
     def __init__(self):
         self.api_key = settings.LIGHTHOUSE_API_KEY
-        self.upload_url = "https://node.lighthouse.storage/api/v0/add"
-        
-    async def upload_image(self, image_bytes: bytes, filename: str) -> str:
-        """
-        Sube una imagen a Lighthouse y retorna su URI.
-        """
+        self.upload_url = settings.LIGHTHOUSE_UPLOAD_URL
+        self.gateway_url = settings.LIGHTHOUSE_GATEWAY_URL.rstrip("/")
+        self.batch_files = max(1, settings.LIGHTHOUSE_BATCH_FILES)
+        self.timeout = (settings.LIGHTHOUSE_CONNECT_TIMEOUT, settings.LIGHTHOUSE_READ_TIMEOUT)
+        self.retries = max(0, settings.LIGHTHOUSE_UPLOAD_RETRIES)
+        self._semaphore = asyncio.Semaphore(max(1, settings.LIGHTHOUSE_UPLOAD_CONCURRENCY))
+        # Sesión compartida: evita un handshake TLS por archivo
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=max(1, settings.LIGHTHOUSE_UPLOAD_CONCURRENCY)))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=max(1, settings.LIGHTHOUSE_UPLOAD_CONCURRENCY)))
+
+    def uri_for(self, cid: str) -> str:
+        """URI del gateway para un CID."""
+        return f"{self.gateway_url}/{cid}"
+
+    async def _compute_cids(self, files: List[UploadFile]) -> List[str]:
+        return await run_cpu(lambda: [compute_cid(content) for _, content in files])
+
+    def _post(self, body: MultipartStream) -> List[Dict]:
+        """Envía una petición de subida (bloqueante) y retorna una entrada por archivo."""
         try:
-            # Crear archivo temporal en memoria
-            files = {
-                'file': (filename, image_bytes, 'image/png')
-            }
-            
-            headers = {
-                'Authorization': f'Bearer {self.api_key}'
-            }
-            
-            response = requests.post(
+            response = self.session.post(
                 self.upload_url,
-                files=files,
-                headers=headers
+                data=body,
+                headers={
+                    'Authorization': f'Bearer {self.api_key}',
+                    'Content-Type': body.content_type
+                },
+                timeout=self.timeout
             )
-            
-            if response.status_code != 200:
-                raise Exception(f"Error uploading to Lighthouse: {response.text}")
-                
-            result = response.json()
-            
-            # Construir URI de IPFS
-            ipfs_uri = f"https://gateway.lighthouse.storage/ipfs/{result['Hash']}"
-            logger.info(f"Image uploaded successfully: {ipfs_uri}")
-            
-            return ipfs_uri
-            
+        except (requests.Timeout, requests.ConnectionError) as e:
+            raise RetryableUploadError(f"{type(e).__name__}: {str(e)}")
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RetryableUploadError(f"HTTP {response.status_code}: {response.text}")
+        if response.status_code != 200:
+            raise Exception(f"Error uploading to Lighthouse: {response.text}")
+        # Con varios archivos la API de IPFS responde un objeto JSON por línea
+        return [orjson.loads(line) for line in response.content.splitlines() if line.strip()]
+
+    async def _upload_request(self, files: List[UploadFile], cids: List[str]) -> List[str]:
+        for attempt in range(self.retries + 1):
+            # El cuerpo se consume al enviarlo: cada intento arma uno nuevo (sin copiar los archivos)
+            body = MultipartStream()
+            for filename, content in files:
+                body.add_file('file', filename, content, 'image/png')
+
+            try:
+                async with self._semaphore:
+                    with span(
+                        "lighthouse.upload",
+                        KIND_CLIENT,
+                        files=len(files),
+                        filenames=",".join(filename for filename, _ in files),
+                        bytes=len(body),
+                        attempt=attempt
+                    ):
+                        entries = await asyncio.to_thread(self._post, body)
+                break
+            except RetryableUploadError as e:
+                if attempt == self.retries:
+                    raise Exception(f"Lighthouse no respondió tras {attempt + 1} intentos: {str(e)}")
+                delay = RETRY_BACKOFF * 2 ** attempt
+                logger.warning(f"Subida a Lighthouse fallida ({str(e)}), reintentando en {delay:.0f}s")
+                await asyncio.sleep(delay)
+
+        # El nodo no garantiza el orden de las líneas (y puede agregar la del
+        # directorio contenedor): cada archivo se busca por su CID y, si el nodo
+        # fragmentó distinto, por su nombre
+        by_hash = {entry.get('Hash'): entry for entry in entries}
+        by_name: Dict[str, List[Dict]] = {}
+        for entry in entries:
+            by_name.setdefault(entry.get('Name'), []).append(entry)
+
+        uploaded = []
+        for (filename, _), expected in zip(files, cids):
+            if expected in by_hash:
+                uploaded.append(expected)
+                continue
+            named = by_name.get(filename, [])
+            if len(named) != 1:
+                raise Exception(
+                    f"Lighthouse no devolvió una entrada para {filename} (CID esperado {expected}); "
+                    f"entradas recibidas: {[entry.get('Name') for entry in entries]}"
+                )
+            cid = named[0]['Hash']
+            # El nodo es la referencia; la diferencia indica otros parámetros de fragmentación
+            logger.warning(f"CID de {filename} distinto al calculado: {cid} (esperado {expected})")
+            uploaded.append(cid)
+        return uploaded
+
+    async def upload_batch(self, files: List[UploadFile]) -> List[str]:
+        """
+        Sube varios archivos y retorna sus URIs en el mismo orden. Los
+        archivos con contenido idéntico se suben una sola vez.
+        """
+        try:
+            cids = await self._compute_cids(files)
+
+            pending: Dict[str, UploadFile] = {}
+            for cid, file in zip(cids, files):
+                pending.setdefault(cid, file)
+            groups = _chunks(list(pending.items()), self.batch_files)
+
+            results = await asyncio.gather(*(
+                self._upload_request([file for _, file in group], [cid for cid, _ in group])
+                for group in groups
+            ))
+            uploaded = {}
+            for group, group_cids in zip(groups, results):
+                for (expected, _), cid in zip(group, group_cids):
+                    uploaded[expected] = cid
+
+            uris = [self.uri_for(uploaded[cid]) for cid in cids]
+            logger.info("Images uploaded successfully: %s", ", ".join(uris), extra=HOT_PATH)
+            return uris
+
         except Exception as e:
             logger.error(f"Error uploading to Lighthouse: {str(e)}")
             raise Exception(f"Failed to upload image: {str(e)}")
-            
+
+    async def upload_image(self, image_bytes: BytesLike, filename: str) -> str:
+        """
+        Sube una imagen a Lighthouse y retorna su URI.
+        Acepta bytes o un memoryview; el cuerpo multipart se envía por
+        bloques sin copiar la imagen completa.
+        """
+        return (await self.upload_batch([(filename, image_bytes)]))[0]
+
     async def upload_multiple_images(self, images_dict: dict) -> dict:
         """
-        Sube múltiples imágenes y retorna sus URIs.
+        Sube múltiples imágenes en una sola tanda y retorna sus URIs.
         """
-        result = {}
-        for key, image_data in images_dict.items():
-            uri = await self.upload_image(
-                image_data,
-                f"{key}.png"
-            )
-            result[f"{key}URI"] = uri
-        return result 
\ No newline at end of file
+        uris = await self.upload_batch([(f"{key}.png", image_data) for key, image_data in images_dict.items()])
+        return {f"{key}URI": uri for key, uri in zip(images_dict, uris)}
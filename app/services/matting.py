@@ -0,0 +1,306 @@
+"""
+Sesiones de remoción de fondo (rembg sobre onnxruntime).
+
+``new_session()`` sin argumentos usa u2net con las opciones por defecto de
+onnxruntime: tantos hilos intra-op como núcleos en cada sesión, lo que se
+multiplica con los hilos del pool de CPU y con los workers. Aquí cada
+sesión se crea con ``SessionOptions`` explícitas y el modelo se elige por
+``CarStyle``, para poder usar uno rápido (u2netp, silueta) donde la calidad
+del borde importa menos, por ejemplo en pixel art.
+
+Variables de entorno:
+- MATTING_MODEL: modelo por defecto (u2net, u2netp, silueta, isnet-general-use)
+- MATTING_MODEL_BY_STYLE: modelo por estilo, por ejemplo "pixel_art=u2netp"
+- ONNX_INTRA_OP_THREADS / ONNX_INTER_OP_THREADS: hilos por sesión (0 = automático)
+- ONNX_GRAPH_OPTIMIZATION: disable, basic, extended o all
+- ONNX_CPU_MEM_ARENA: conservar el arena de memoria de onnxruntime entre inferencias
+- MATTING_INT8: usar el modelo cuantizado a int8 si existe (ver ``quantize_model``)
+- MATTING_MODE: "full" (``rembg.remove`` sobre la imagen completa) o "fast"
+  (inferencia a la resolución del modelo y máscara reescalada con un filtro
+  guiado por la imagen original, ver ``downscale_matte``; el PNG se codifica
+  sin ``optimize``, que a 1024x1024 cuesta más que la propia remoción)
+
+Los modelos int8 se generan una sola vez, fuera del servidor, porque la
+cuantización necesita el paquete ``onnx``:
+
+    pip install onnx
+    python -m app.services.matting quantize u2netp
+"""
+import logging
+import os
+import sys
+import threading
+from typing import Dict, List, Optional, Type
+
+import numpy as np
+import onnxruntime as ort
+from PIL import Image
+from rembg import remove
+from rembg.sessions import sessions_class
+from rembg.sessions.base import BaseSession
+
+from ..config import settings
+from .style_preferences import parse_style_preferences
+
+logger = logging.getLogger(__name__)
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+INT8_SUFFIX = ".int8.onnx"
+
+# Resolución de entrada de cada modelo; rembg reescala a esta medida de todos modos
+INFERENCE_SIZES = {"isnet-general-use": 1024}
+DEFAULT_INFERENCE_SIZE = 320
+
+# Filtro guiado del modo rápido: radio (en píxeles de la resolución de inferencia)
+# y regularización; un eps menor sigue más de cerca los bordes de la imagen
+GUIDED_RADIUS = 1
+GUIDED_EPS = 1e-4
+
+
+MATTING_MODES = ("full", "fast")
+
+
+def supported_models() -> List[str]:
+    """Nombres de los modelos de rembg que se pueden usar en MATTING_MODEL y MATTING_MODEL_BY_STYLE."""
+    return [session_class.name() for session_class in sessions_class]
+
+
+def _session_class(model_name: str) -> Type[BaseSession]:
+    for session_class in sessions_class:
+        if session_class.name() == model_name:
+            return session_class
+    raise ValueError(f"Modelo de remoción de fondo no soportado: {model_name}")
+
+
+def int8_model_path(model_name: str) -> str:
+    return os.path.join(BaseSession.u2net_home(), f"{model_name}{INT8_SUFFIX}")
+
+
+def default_intra_op_threads() -> int:
+    """Núcleos que le tocan a cada sesión: los hilos del pool ya corren en paralelo."""
+    return max(1, (os.cpu_count() or 1) // max(1, settings.WEB_CONCURRENCY * settings.CPU_WORKERS))
+
+
+def build_session_options(
+    intra_op_threads: Optional[int] = None,
+    inter_op_threads: Optional[int] = None,
+    graph_optimization: Optional[str] = None,
+    cpu_mem_arena: Optional[bool] = None
+) -> ort.SessionOptions:
+    """Opciones de sesión a partir de los argumentos o de la configuración."""
+    intra = settings.ONNX_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+    inter = settings.ONNX_INTER_OP_THREADS if inter_op_threads is None else inter_op_threads
+    level = (graph_optimization or settings.ONNX_GRAPH_OPTIMIZATION).lower()
+    arena = settings.ONNX_CPU_MEM_ARENA if cpu_mem_arena is None else cpu_mem_arena
+
+    if level not in GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(f"Nivel de optimización de ONNX no válido: {level}")
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra or default_intra_op_threads()
+    options.inter_op_num_threads = inter or 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[level]
+    # Sin arena la memoria se devuelve después de cada inferencia: menos RSS, algo más lento
+    options.enable_cpu_mem_arena = arena
+    return options
+
+
+def new_matting_session(
+    model_name: Optional[str] = None,
+    options: Optional[ort.SessionOptions] = None,
+    int8: Optional[bool] = None
+) -> BaseSession:
+    """
+    Crea una sesión de rembg con opciones explícitas. Con ``int8`` usa el
+    modelo cuantizado si ya fue generado; si no, usa el original.
+    """
+    model_name = model_name or settings.MATTING_MODEL
+    session_class = _session_class(model_name)
+    options = options or build_session_options()
+    use_int8 = settings.MATTING_INT8 if int8 is None else int8
+
+    if use_int8:
+        quantized = int8_model_path(model_name)
+        if os.path.exists(quantized):
+            # Misma clase (normalización y postproceso), otro archivo de modelo
+            session_class = type(
+                f"{session_class.__name__}Int8",
+                (session_class,),
+                {"download_models": classmethod(lambda cls, *args, **kwargs: quantized)}
+            )
+        else:
+            logger.warning(f"No existe el modelo int8 {quantized}, se usará {model_name} sin cuantizar")
+
+    return session_class(model_name, options, ["CPUExecutionProvider"])
+
+
+def _box_filter(values: np.ndarray, radius: int) -> np.ndarray:
+    """Promedio en ventanas de (2r+1)x(2r+1), recortadas en los bordes, con imagen integral."""
+    height, width = values.shape
+    integral = np.zeros((height + 1, width + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(values, axis=0), axis=1, out=integral[1:, 1:])
+
+    rows = np.arange(height)
+    cols = np.arange(width)
+    top, bottom = np.clip(rows - radius, 0, height), np.clip(rows + radius + 1, 0, height)
+    left, right = np.clip(cols - radius, 0, width), np.clip(cols + radius + 1, 0, width)
+
+    total = (
+        integral[bottom][:, right] - integral[top][:, right]
+        - integral[bottom][:, left] + integral[top][:, left]
+    )
+    area = np.outer(bottom - top, right - left)
+    return (total / area).astype(np.float32)
+
+
+def _resize_float(values: np.ndarray, size) -> np.ndarray:
+    return np.asarray(Image.fromarray(values, mode="F").resize(size, Image.Resampling.BILINEAR))
+
+
+def guided_upsample(
+    mask: np.ndarray,
+    guide_small: np.ndarray,
+    guide: np.ndarray,
+    radius: int = GUIDED_RADIUS,
+    eps: float = GUIDED_EPS
+) -> np.ndarray:
+    """
+    Reescala una máscara siguiendo los bordes de la imagen guía (filtro
+    guiado rápido): los coeficientes lineales máscara ~ a * guía + b se
+    ajustan a baja resolución, se interpolan y se aplican a la guía completa.
+    Todas las entradas son float32 en [0, 1].
+    """
+    mean_guide = _box_filter(guide_small, radius)
+    mean_mask = _box_filter(mask, radius)
+    covariance = _box_filter(guide_small * mask, radius) - mean_guide * mean_mask
+    variance = _box_filter(guide_small * guide_small, radius) - mean_guide * mean_guide
+
+    a = covariance / (variance + eps)
+    b = mean_mask - a * mean_guide
+
+    size = (guide.shape[1], guide.shape[0])
+    a = _resize_float(_box_filter(a, radius), size)
+    b = _resize_float(_box_filter(b, radius), size)
+    return np.clip(a * guide + b, 0.0, 1.0)
+
+
+def downscale_matte(image: Image.Image, session: BaseSession, inference_size: int) -> Image.Image:
+    """
+    Remueve el fondo infiriendo a la resolución del modelo: la imagen se
+    reduce una sola vez, la máscara se reescala con ``guided_upsample`` y
+    se aplica como alfa a la imagen original, sin recortes intermedios a
+    resolución completa.
+    """
+    rgb = image.convert("RGB")
+    small = rgb.resize((inference_size, inference_size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    mask = np.asarray(session.predict(small)[0], dtype=np.float32) / 255.0
+
+    guide = np.asarray(rgb.convert("L"), dtype=np.float32) / 255.0
+    guide_small = np.asarray(small.convert("L"), dtype=np.float32) / 255.0
+    alpha = guided_upsample(mask, guide_small, guide)
+
+    # Como rembg, los píxeles transparentes quedan en negro para que el PNG comprima mejor
+    pixels = np.empty((rgb.height, rgb.width, 4), dtype=np.uint8)
+    pixels[..., :3] = np.asarray(rgb)
+    pixels[..., 3] = (alpha * 255.0 + 0.5).astype(np.uint8)
+    pixels[pixels[..., 3] == 0, :3] = 0
+    return Image.fromarray(pixels, mode="RGBA")
+
+
+def quantize_model(model_name: str) -> str:
+    """Genera la versión int8 (cuantización dinámica de pesos) de un modelo."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    source = str(_session_class(model_name).download_models())
+    target = int8_model_path(model_name)
+    quantize_dynamic(source, target, weight_type=QuantType.QUInt8)
+    return target
+
+
+class MattingSessions:
+    """
+    Sesiones de remoción de fondo por modelo, creadas una vez por worker y
+    compartidas por los hilos del pool de CPU. El modelo depende del estilo
+    según MATTING_MODEL_BY_STYLE.
+    """
+
+    def __init__(
+        self,
+        default_model: Optional[str] = None,
+        style_models: Optional[Dict[str, str]] = None,
+        mode: Optional[str] = None
+    ):
+        self.default_model = default_model or settings.MATTING_MODEL
+        self.mode = (mode or settings.MATTING_MODE).lower()
+        if style_models is None:
+            style_models = parse_style_preferences(settings.MATTING_MODEL_BY_STYLE)
+        self.style_models = style_models
+        self._validate()
+        self._sessions: Dict[str, BaseSession] = {}
+        self._lock = threading.Lock()
+
+    def _validate(self):
+        """
+        Falla al iniciar si algún modelo no existe en rembg: de lo contrario el
+        error aparecería recién al remover el fondo, después de pagar la
+        generación de las imágenes.
+        """
+        valid = supported_models()
+        invalid = [
+            f"MATTING_MODEL={self.default_model}" if setting == "default" else f"MATTING_MODEL_BY_STYLE {setting}={model}"
+            for setting, model in [("default", self.default_model), *self.style_models.items()]
+            if model not in valid
+        ]
+        if invalid:
+            raise ValueError(
+                f"Modelos de remoción de fondo desconocidos: {', '.join(invalid)}. "
+                f"Modelos válidos: {', '.join(valid)}"
+            )
+        if self.mode not in MATTING_MODES:
+            raise ValueError(f"MATTING_MODE desconocido: {self.mode}. Modos válidos: {', '.join(MATTING_MODES)}")
+
+    def model_for(self, style=None) -> str:
+        style_key = style.value if hasattr(style, "value") else style
+        return self.style_models.get(style_key, self.default_model)
+
+    def get(self, style=None) -> BaseSession:
+        model_name = self.model_for(style)
+        session = self._sessions.get(model_name)
+        if session is None:
+            # Varios hilos del pool de CPU pueden llegar aquí a la vez
+            with self._lock:
+                session = self._sessions.get(model_name)
+                if session is None:
+                    logger.info(f"Cargando modelo de remoción de fondo {model_name}...")
+                    session = new_matting_session(model_name)
+                    self._sessions[model_name] = session
+        return session
+
+    @property
+    def fast(self) -> bool:
+        return self.mode == "fast"
+
+    def remove(self, image: Image.Image, style=None) -> Image.Image:
+        """Remueve el fondo con el modelo del estilo, según el modo."""
+        model_name = self.model_for(style)
+        session = self.get(style)
+        if self.fast:
+            return downscale_matte(image, session, INFERENCE_SIZES.get(model_name, DEFAULT_INFERENCE_SIZE))
+        return remove(image, session=session)
+
+    def loaded(self):
+        return list(self._sessions)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "quantize":
+        print(f"Modelo int8 guardado en {quantize_model(sys.argv[2])}")
+    else:
+        print("Uso: python -m app.services.matting quantize <modelo>")
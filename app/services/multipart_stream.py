@@ -0,0 +1,95 @@
+import uuid
+from io import BytesIO
+from typing import List, Tuple, Union
+
+# Tamaño de cada bloque enviado al socket
+CHUNK_SIZE = 64 * 1024
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class MultipartStream:
+    """
+    Cuerpo multipart/form-data que se lee por bloques sin copiar el contenido
+    de los archivos.
+
+    ``requests`` construye el cuerpo completo en memoria cuando recibe
+    ``files=``. Este objeto expone ``read()`` y ``__len__``, así que se puede
+    pasar como ``data=`` y ``requests`` lo envía por bloques con un
+    ``Content-Length`` conocido. Los archivos se guardan como ``memoryview``
+    y solo se copia un bloque a la vez.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self._parts: List[memoryview] = []
+        self._closed = False
+        self._position = 0
+        self._part_index = 0
+        self._part_offset = 0
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def add_file(self, field: str, filename: str, content: BytesLike, content_type: str = "image/png"):
+        """Agrega un archivo al cuerpo sin copiar su contenido."""
+        if self._closed:
+            raise ValueError("No se pueden agregar archivos después de leer el cuerpo")
+        header = (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+        self._parts.append(memoryview(header))
+        self._parts.append(memoryview(content).cast("B"))
+        self._parts.append(memoryview(b"\r\n"))
+
+    def _close(self):
+        if not self._closed:
+            self._parts.append(memoryview(f"--{self.boundary}--\r\n".encode("utf-8")))
+            self._closed = True
+
+    def __len__(self) -> int:
+        self._close()
+        return sum(part.nbytes for part in self._parts)
+
+    def read(self, size: int = -1) -> bytes:
+        """Lee hasta ``size`` bytes del cuerpo; nunca más de un bloque por llamada."""
+        self._close()
+        if size is None or size < 0 or size > self.chunk_size:
+            size = self.chunk_size
+
+        while self._part_index < len(self._parts):
+            part = self._parts[self._part_index]
+            if self._part_offset < part.nbytes:
+                end = min(self._part_offset + size, part.nbytes)
+                chunk = part[self._part_offset:end].tobytes()
+                self._part_offset = end
+                self._position += len(chunk)
+                return chunk
+            self._part_index += 1
+            self._part_offset = 0
+        return b""
+
+    def __iter__(self):
+        while True:
+            chunk = self.read()
+            if not chunk:
+                break
+            yield chunk
+
+    def tell(self) -> int:
+        return self._position
+
+
+def encode_png(image, **save_kwargs) -> Tuple[BytesIO, memoryview]:
+    """
+    Codifica una imagen PIL como PNG y retorna el buffer junto con una vista
+    sin copia de su contenido. El buffer debe mantenerse vivo mientras se use
+    la vista.
+    """
+    buffer = BytesIO()
+    image.save(buffer, format="PNG", **save_kwargs)
+    return buffer, buffer.getbuffer()
@@ -0,0 +1,45 @@
+import logging
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Límites del pool de conexiones compartido por todos los servicios
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+REQUEST_TIMEOUT = 120.0
+
+_client: Optional[AsyncOpenAI] = None
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """
+    Retorna el cliente asíncrono de OpenAI compartido por el proceso.
+    Todos los servicios usan el mismo pool de conexiones HTTP.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS
+                ),
+                timeout=REQUEST_TIMEOUT
+            )
+        )
+        logger.info("Cliente asíncrono de OpenAI inicializado")
+    return _client
+
+
+async def close_openai_client():
+    """Cierra las conexiones del cliente compartido."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -1,10 +1,14 @@
-from openai import OpenAI
-from ..config import settings
+import base64
+import logging
+from ..tracing import span, KIND_CLIENT
 from ..models.car_model import CarStyle
+from .openai_client import get_openai_client
+
+logger = logging.getLogger(__name__)
 
 class OpenAIService:
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = get_openai_client()
         self.style_prompts = {
             CarStyle.PIXEL_ART: "Un sprite de carro en vista superior 2D, estilo pixel art, fondo blanco.",
             CarStyle.REALISTIC: "Un carro en vista superior 2D, estilo fotorrealista, fondo blanco, alta calidad.",
@@ -16,9 +20,9 @@ class OpenAIService:
         try:
             style_prompt = self.style_prompts[style]
             full_prompt = f"{style_prompt} {prompt}"
-            print(f"Generando imagen con prompt: {full_prompt}")
+            logger.debug("Generando imagen con prompt: %s", full_prompt)
             
-            response = self.client.images.generate(
+            response = await self.client.images.generate(
                 model="dall-e-3",
                 prompt=full_prompt,
                 n=1,
@@ -31,10 +35,36 @@ class OpenAIService:
                 raise Exception("No se recibió URL de imagen en la respuesta")
                 
             url = response.data[0].url
-            print(f"Imagen generada exitosamente: {url[:50]}...")
+            logger.debug("Imagen generada exitosamente: %s...", url[:50])
             return url
             
         except Exception as e:
             error_message = f"Error generando imagen: {str(e)}"
-            print(f"Error detallado: {repr(e)}")
+            logger.debug("Error detallado: %r", e)
             raise Exception(error_message)
+
+    async def generate_car_image_bytes(self, prompt: str, style: CarStyle = CarStyle.REALISTIC) -> bytes:
+        """Genera una imagen con DALL·E y retorna sus bytes PNG en lugar de una URL."""
+        try:
+            style_prompt = self.style_prompts[style]
+            full_prompt = f"{style_prompt} {prompt}"
+            
+            with span("openai.generate_car_image", KIND_CLIENT, style=style) as current:
+                response = await self.client.images.generate(
+                    model="dall-e-3",
+                    prompt=full_prompt,
+                    n=1,
+                    size="1024x1024",
+                    quality="standard",
+                    response_format="b64_json"
+                )
+                
+                if not response.data or not response.data[0].b64_json:
+                    raise Exception("No se recibió imagen en la respuesta")
+                    
+                content = base64.b64decode(response.data[0].b64_json)
+                current.set_attribute("bytes_out", len(content))
+                return content
+            
+        except Exception as e:
+            raise Exception(f"Error generando imagen: {str(e)}")
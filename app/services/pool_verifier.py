@@ -0,0 +1,299 @@
+"""
+Verificación en segundo plano del pool de respuestas pre-generadas.
+
+Las entradas de ``cache/`` se sirven tal cual, así que una subida
+incompleta o un archivo que dejó de estar fijado en IPFS llegaría al
+cliente como una imagen rota. Cada ``POOL_VERIFY_INTERVAL`` segundos el
+verificador:
+
+1. Elimina las entradas más antiguas que ``POOL_ENTRY_TTL`` (el pool
+   también las descarta al servirlas).
+2. Revisa, por tandas de ``POOL_VERIFY_BATCH`` entradas, las que no se
+   verificaron en los últimos ``POOL_VERIFY_MAX_AGE`` segundos: un HEAD por
+   URI distinta de la tanda, con a lo sumo ``POOL_VERIFY_CONCURRENCY`` a la
+   vez.
+3. Elimina las entradas con alguna URI que responde 4xx. Los timeouts y los
+   5xx pueden ser del gateway y no del archivo: la entrada se descarta
+   recién tras ``MAX_TRANSIENT_FAILURES`` revisiones fallidas seguidas, y
+   una tanda en la que ninguna URI respondió no cuenta (gateway caído).
+
+Con varios workers solo verifica el que obtiene el lock de
+``cache/.pool_verifier.lock``; publica su estado en
+``cache/.pool_verifier.state`` y cualquier worker lo puede reportar.
+"""
+import asyncio
+import fcntl
+import logging
+import os
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import orjson
+
+from ..config import settings
+from .cache_service import CacheService, PartitionKey, entry_created
+
+logger = logging.getLogger(__name__)
+
+# Revisiones seguidas con timeout o 5xx tras las cuales se descarta una entrada
+MAX_TRANSIENT_FAILURES = 3
+
+LOCK_FILE = ".pool_verifier.lock"
+STATE_FILE = ".pool_verifier.state"
+
+# Resultado del HEAD de una URI
+OK = "ok"
+BROKEN = "broken"
+TRANSIENT = "transient"
+
+
+def entry_uris(content: bytes) -> List[str]:
+    """URIs distintas de una respuesta guardada en el pool."""
+    data = orjson.loads(content)
+    uris = [data["carImageURI"], *(part["imageURI"] for part in data["parts"])]
+    if data.get("atlas"):
+        uris.append(data["atlas"]["imageURI"])
+    return list(dict.fromkeys(uris))
+
+
+def _status(status_code: int) -> str:
+    if status_code < 400:
+        return OK
+    if status_code < 500 and status_code != 429:
+        return BROKEN
+    return TRANSIENT
+
+
+class PoolVerifier:
+    """Vencimiento y verificación de disponibilidad de las entradas del pool."""
+
+    def __init__(
+        self,
+        cache_service: CacheService,
+        max_age: Optional[float] = None,
+        concurrency: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        timeout: Optional[float] = None
+    ):
+        self.cache = cache_service
+        self.max_age = settings.POOL_VERIFY_MAX_AGE if max_age is None else max_age
+        self.concurrency = max(1, concurrency or settings.POOL_VERIFY_CONCURRENCY)
+        self.batch_size = max(1, batch_size or settings.POOL_VERIFY_BATCH)
+        self.timeout = timeout or settings.POOL_VERIFY_TIMEOUT
+        self.lock_path = os.path.join(cache_service.cache_dir, LOCK_FILE)
+        self.state_path = os.path.join(cache_service.cache_dir, STATE_FILE)
+        self._lock_file = None
+        self._sweep_lock = asyncio.Lock()
+        # Por entrada: última verificación correcta y revisiones fallidas seguidas
+        self.verified: Dict[str, float] = {}
+        self.failures: Dict[str, int] = {}
+        self.totals = {
+            "sweeps": 0,
+            "checks": 0,
+            "evicted_expired": 0,
+            "evicted_broken": 0,
+            "transient_failures": 0,
+        }
+        self.last_sweep: Optional[Dict] = None
+
+    @property
+    def leader(self) -> bool:
+        return self._lock_file is not None
+
+    def try_lead(self) -> bool:
+        """Toma el lock de verificación si ningún otro worker lo tiene."""
+        if self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        # Retomar las verificaciones del worker que tenía el lock antes
+        state = self._read_state()
+        self.verified = state.get("verified", {})
+        self.failures = state.get("failures", {})
+        self.totals.update(state.get("totals", {}))
+        self.last_sweep = state.get("last_sweep")
+        logger.info("Este worker verifica el pool de respuestas pre-generadas")
+        return True
+
+    def _read_state(self) -> Dict:
+        try:
+            with open(self.state_path, "rb") as f:
+                return orjson.loads(f.read())
+        except FileNotFoundError:
+            return {}
+        except orjson.JSONDecodeError as e:
+            logger.warning(f"Estado del verificador ilegible, se ignora: {str(e)}")
+            return {}
+
+    def _save_state(self):
+        temp_file = f"{self.state_path}.tmp"
+        with open(temp_file, "wb") as f:
+            f.write(orjson.dumps({
+                "verified": self.verified,
+                "failures": self.failures,
+                "totals": self.totals,
+                "last_sweep": self.last_sweep,
+            }))
+        os.replace(temp_file, self.state_path)
+
+    async def _check(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, uri: str) -> str:
+        async with semaphore:
+            try:
+                response = await client.head(uri)
+            except httpx.HTTPError as e:
+                logger.debug("No se pudo verificar %s: %s", uri, type(e).__name__)
+                return TRANSIENT
+        status = _status(response.status_code)
+        if status == BROKEN:
+            logger.warning(f"URI del pool no disponible ({response.status_code}): {uri}")
+        return status
+
+    def _evict(self, key: PartitionKey, cache_file: str, reason: str, counter: str):
+        if self.cache.evict(key, cache_file, reason):
+            self.totals[counter] += 1
+        self.verified.pop(cache_file, None)
+        self.failures.pop(cache_file, None)
+
+    async def _verify_batch(
+        self,
+        client: httpx.AsyncClient,
+        semaphore: asyncio.Semaphore,
+        batch: List[Tuple[PartitionKey, str]]
+    ) -> int:
+        """Verifica una tanda de entradas y retorna cuántas URIs revisó."""
+        uris_by_entry = {}
+        for key, cache_file in batch:
+            try:
+                with open(cache_file, "rb") as f:
+                    uris_by_entry[(key, cache_file)] = entry_uris(f.read())
+            except FileNotFoundError:
+                # Se sirvió mientras tanto
+                continue
+            except (orjson.JSONDecodeError, KeyError, TypeError):
+                self._evict(key, cache_file, "corrupta", "evicted_broken")
+
+        # Varias entradas pueden compartir URIs (por ejemplo, el mismo atlas)
+        unique = list(dict.fromkeys(uri for uris in uris_by_entry.values() for uri in uris))
+        results = dict(zip(unique, await asyncio.gather(*(
+            self._check(client, semaphore, uri) for uri in unique
+        ))))
+
+        if unique and all(status == TRANSIENT for status in results.values()):
+            # Ninguna URI respondió: es el gateway, no los archivos; no cuenta como fallo de las entradas
+            logger.warning(f"El gateway no respondió a ninguna de {len(unique)} URIs, se reintentará")
+            return len(unique)
+
+        now = time.time()
+        for (key, cache_file), uris in uris_by_entry.items():
+            statuses = {results[uri] for uri in uris}
+            if BROKEN in statuses:
+                self._evict(key, cache_file, "URI rota", "evicted_broken")
+            elif TRANSIENT in statuses:
+                self.totals["transient_failures"] += 1
+                self.failures[cache_file] = self.failures.get(cache_file, 0) + 1
+                if self.failures[cache_file] >= MAX_TRANSIENT_FAILURES:
+                    self._evict(key, cache_file, "URI sin respuesta", "evicted_broken")
+            else:
+                self.verified[cache_file] = now
+                self.failures.pop(cache_file, None)
+        return len(unique)
+
+    async def sweep(self) -> Dict:
+        """Vence y verifica las entradas pendientes del pool; retorna el resumen."""
+        async with self._sweep_lock:
+            start = time.monotonic()
+            evicted_before = self.totals["evicted_expired"] + self.totals["evicted_broken"]
+
+            # Ver también las entradas guardadas por otros workers
+            await asyncio.to_thread(self.cache.rebuild_index)
+            now = time.time()
+            due = []
+            for key, cache_file in self.cache.list_entries():
+                if self.cache.is_expired(cache_file, now):
+                    self._evict(key, cache_file, "vencida", "evicted_expired")
+                elif now - self.verified.get(cache_file, 0) > self.max_age:
+                    due.append((key, cache_file))
+
+            checks = 0
+            semaphore = asyncio.Semaphore(self.concurrency)
+            async with httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.concurrency)
+            ) as client:
+                for offset in range(0, len(due), self.batch_size):
+                    checks += await self._verify_batch(client, semaphore, due[offset:offset + self.batch_size])
+
+            # Olvidar las entradas que ya se sirvieron
+            present = {cache_file for _, cache_file in self.cache.list_entries()}
+            self.verified = {path: at for path, at in self.verified.items() if path in present}
+            self.failures = {path: count for path, count in self.failures.items() if path in present}
+
+            self.totals["sweeps"] += 1
+            self.totals["checks"] += checks
+            self.last_sweep = {
+                "at": now,
+                "duration": round(time.monotonic() - start, 3),
+                "entries_checked": len(due),
+                "uris_checked": checks,
+                "evicted": self.totals["evicted_expired"] + self.totals["evicted_broken"] - evicted_before,
+            }
+            if self.leader:
+                self._save_state()
+            logger.info(
+                f"Pool verificado: {len(due)} entradas, {checks} URIs, "
+                f"{self.last_sweep['evicted']} eliminadas en {self.last_sweep['duration']}s"
+            )
+            return self.last_sweep
+
+    async def run(self, interval: float):
+        """Verifica el pool cada ``interval`` segundos si este worker tiene el lock."""
+        logger.info(f"Verificación del pool cada {interval}s")
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self.try_lead():
+                    await self.sweep()
+            except Exception as e:
+                logger.error(f"Error verificando el pool: {str(e)}")
+
+    def get_metrics(self) -> Dict:
+        """Frescura del pool: antigüedad de las entradas y proporción verificada recientemente."""
+        if self.leader:
+            state = {"verified": self.verified, "totals": self.totals, "last_sweep": self.last_sweep}
+        else:
+            state = self._read_state()
+        verified = state.get("verified") or {}
+        now = time.time()
+
+        ages = []
+        recent = 0
+        for _, cache_file in self.cache.list_entries():
+            try:
+                ages.append(now - entry_created(cache_file))
+            except FileNotFoundError:
+                continue
+            if now - verified.get(cache_file, 0) <= self.max_age:
+                recent += 1
+
+        ttl = self.cache.entry_ttl
+        return {
+            "entries": len(ages),
+            "verified": recent,
+            "unverified": len(ages) - recent,
+            "verified_ratio": round(recent / len(ages), 3) if ages else None,
+            "age_p50": round(statistics.median(ages)) if ages else None,
+            "age_max": round(max(ages)) if ages else None,
+            "expiring_within_day": sum(1 for age in ages if ttl and ttl - age <= 24 * 3600),
+            "ttl": ttl,
+            "verify_max_age": self.max_age,
+            "last_sweep": state.get("last_sweep"),
+            "totals": state.get("totals") or self.totals,
+        }
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from ..config import settings
+from .openai_client import get_openai_client
+
+logger = logging.getLogger(__name__)
+
+# Listas de elementos para generar descripciones
+COLORS = ["rojo", "azul", "verde", "negro", "blanco", "amarillo", "plateado", "dorado", "naranja", "púrpura"]
+STYLES = ["futurista", "clásico", "moderno", "retro", "elegante", "agresivo", "deportivo", "luxury"]
+DETAILS = ["con detalles cromados", "con líneas aerodinámicas", "con alerones deportivos", "con diseño minimalista"]
+FEATURES = [
+    "con faros LED integrados",
+    "con tomas de aire laterales",
+    "con parrilla frontal distintiva",
+    "con perfil bajo y estilizado",
+    "con curvas suaves y elegantes",
+    "con diseño angular y agresivo",
+    "con acabados metálicos premium",
+    "con líneas deportivas fluidas"
+]
+
+# Mapear colores a inglés para las partes
+COLOR_MAPPING = {
+    "rojo": "red colored, crimson accents",
+    "azul": "blue colored, metallic blue accents",
+    "verde": "green colored, emerald accents",
+    "negro": "black colored, dark chrome accents",
+    "blanco": "white colored, pearl accents",
+    "amarillo": "yellow colored, gold accents",
+    "plateado": "silver colored, chrome accents",
+    "dorado": "gold colored, bronze accents",
+    "naranja": "orange colored, copper accents",
+    "púrpura": "purple colored, metallic accents"
+}
+
+DEFAULT_COLOR_BASE = "metallic colored, chrome accents"
+
+# Valor RGB de cada color, usado por el generador local de sprites
+COLOR_RGB = {
+    "rojo": (200, 30, 40),
+    "azul": (30, 80, 200),
+    "verde": (30, 150, 70),
+    "negro": (40, 40, 45),
+    "blanco": (235, 235, 240),
+    "amarillo": (240, 200, 30),
+    "plateado": (170, 175, 185),
+    "dorado": (200, 160, 50),
+    "naranja": (240, 120, 30),
+    "púrpura": (130, 50, 170)
+}
+
+# Prompts pedidos al LLM en cada lote y nivel a partir del cual se pide otro
+PROMPT_BATCH_SIZE = 20
+PROMPT_LOW_WATERMARK = 5
+
+# Segundos de espera antes de reintentar después de un lote fallido
+PROMPT_RETRY_DELAY = 60.0
+
+PROMPT_INSTRUCTIONS = (
+    "Genera descripciones creativas y variadas de carros deportivos vistos desde arriba "
+    "para un juego 2D. Responde solo con JSON con la forma "
+    '{"prompts": [{"prompt": "...", "color": "..."}]}. '
+    "Cada prompt es una frase corta en español que empieza con \"carro\" y describe estilo, "
+    "color, detalles y rasgos de diseño. El campo color debe ser exactamente uno de: "
+    f"{', '.join(COLORS)}, y coincidir con el color del prompt."
+)
+
+CreativePrompt = Tuple[str, str]
+
+
+def generate_local_prompt() -> CreativePrompt:
+    """Genera un prompt creativo y su color base combinando listas locales."""
+    selected_color = random.choice(COLORS)
+    creative_prompt = (
+        f"carro {random.choice(STYLES)} {selected_color} "
+        f"{random.choice(DETAILS)} {random.choice(FEATURES)}"
+    )
+    return creative_prompt, COLOR_MAPPING.get(selected_color, DEFAULT_COLOR_BASE)
+
+
+class PromptService:
+    """
+    Fuente de prompts creativos.
+
+    En modo ``local`` combina listas predefinidas. En modo ``llm`` sirve
+    prompts generados por OpenAI desde una caché en memoria que se rellena
+    por lotes en segundo plano; si la caché está vacía usa la generación
+    local, así que pedir un prompt nunca espera a OpenAI.
+    """
+
+    def __init__(self, mode: Optional[str] = None):
+        self.mode = (mode or settings.CREATIVE_PROMPT_MODE).lower()
+        self._prompts: Deque[CreativePrompt] = deque(maxlen=PROMPT_BATCH_SIZE * 3)
+        self._refill_task: Optional[asyncio.Task] = None
+        self._retry_after = 0.0
+
+    def get_prompt(self) -> CreativePrompt:
+        """Retorna un prompt creativo y su color base sin bloquear."""
+        if self.mode == "llm":
+            if len(self._prompts) <= PROMPT_LOW_WATERMARK:
+                self.prefetch()
+            if self._prompts:
+                return self._prompts.popleft()
+        return generate_local_prompt()
+
+    def prefetch(self):
+        """Pide un lote nuevo en segundo plano si no hay uno en curso."""
+        if self.mode != "llm" or time.monotonic() < self._retry_after:
+            return
+        if self._refill_task is not None and not self._refill_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._refill_task = loop.create_task(self._refill())
+
+    async def _refill(self):
+        try:
+            prompts = await self._fetch_batch(PROMPT_BATCH_SIZE)
+            self._prompts.extend(prompts)
+            logger.info(f"Lote de prompts creativos recibido: {len(prompts)} (en caché: {len(self._prompts)})")
+        except Exception as e:
+            self._retry_after = time.monotonic() + PROMPT_RETRY_DELAY
+            logger.error(f"Error generando prompts creativos con OpenAI: {str(e)}")
+
+    async def _fetch_batch(self, count: int) -> List[CreativePrompt]:
+        response = await get_openai_client().chat.completions.create(
+            model=settings.CREATIVE_PROMPT_MODEL,
+            messages=[
+                {"role": "system", "content": PROMPT_INSTRUCTIONS},
+                {"role": "user", "content": f"Genera {count} prompts distintos."}
+            ],
+            response_format={"type": "json_object"},
+            temperature=1.0
+        )
+        data = json.loads(response.choices[0].message.content)
+
+        prompts = []
+        for item in data.get("prompts", []):
+            prompt = str(item.get("prompt", "")).strip()
+            color = str(item.get("color", "")).strip().lower()
+            if not prompt:
+                continue
+            prompts.append((prompt, COLOR_MAPPING.get(color, DEFAULT_COLOR_BASE)))
+        return prompts
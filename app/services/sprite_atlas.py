@@ -0,0 +1,117 @@
+"""
+Atlas de sprites de una generación.
+
+Cada carro produce cuatro imágenes (carro, motor, transmisión y ruedas) y
+un cliente del juego hace cuatro descargas y cuatro subidas de textura por
+carro. El atlas recorta el borde transparente de cada sprite, los empaqueta
+en una sola textura y describe dónde quedó cada uno con un mapa de cuadros:
+
+    {
+        "width": 1030, "height": 772,
+        "frames": {
+            "car": {"x": 2, "y": 2, "w": 512, "h": 380,
+                    "sourceW": 1024, "sourceH": 1024, "offsetX": 256, "offsetY": 322},
+            ...
+        }
+    }
+
+``x``/``y``/``w``/``h`` es el rectángulo dentro del atlas y ``offsetX``/
+``offsetY`` la posición del recorte dentro del sprite original de
+``sourceW`` x ``sourceH``, para poder dibujarlo en el mismo lugar que la
+imagen sin recortar.
+"""
+from typing import Dict, List, Tuple
+
+from PIL import Image
+
+# Píxeles transparentes entre sprites y en el borde, para que el filtrado
+# bilineal del cliente no mezcle sprites vecinos
+ATLAS_PADDING = 2
+
+Size = Tuple[int, int]
+
+
+def trim(image: Image.Image) -> Tuple[Image.Image, Tuple[int, int, int, int]]:
+    """
+    Recorta el borde totalmente transparente. Retorna el recorte y su caja
+    (izquierda, arriba, derecha, abajo) en la imagen original.
+    """
+    image = image if image.mode == "RGBA" else image.convert("RGBA")
+    box = image.getchannel("A").getbbox()
+    if box is None:
+        # Sprite vacío: se conserva un píxel para que tenga un cuadro válido
+        box = (0, 0, 1, 1)
+    if box == (0, 0, image.width, image.height):
+        return image, box
+    return image.crop(box), box
+
+
+def _shelf_pack(sizes: List[Size], order: List[int], width: int, padding: int) -> Tuple[List[Tuple[int, int]], int, int]:
+    """Coloca los rectángulos en filas (estantes) de a lo sumo ``width`` de ancho."""
+    positions: List[Tuple[int, int]] = [(0, 0)] * len(sizes)
+    x, y, shelf_height, used_width = padding, padding, 0, 0
+    for index in order:
+        w, h = sizes[index]
+        if x > padding and x + w + padding > width:
+            y += shelf_height + padding
+            x, shelf_height = padding, 0
+        positions[index] = (x, y)
+        x += w + padding
+        shelf_height = max(shelf_height, h)
+        used_width = max(used_width, x)
+    return positions, used_width, y + shelf_height + padding
+
+
+def pack(sizes: List[Size], padding: int = ATLAS_PADDING) -> Tuple[List[Tuple[int, int]], int, int]:
+    """
+    Empaqueta rectángulos por estantes, del más alto al más bajo, y prueba
+    como ancho máximo cada prefijo de la fila; se queda con el atlas de
+    lado mayor más corto (los clientes tienen un tamaño máximo de textura)
+    y, a igual lado, el de menor área. Para los pocos sprites de una
+    generación probar todos los anchos cuesta microsegundos.
+    """
+    if not sizes:
+        return [], 0, 0
+
+    order = sorted(range(len(sizes)), key=lambda index: (-sizes[index][1], -sizes[index][0]))
+    candidates = set()
+    width = padding
+    for index in order:
+        width += sizes[index][0] + padding
+        candidates.add(width)
+    candidates.add(max(w for w, _ in sizes) + 2 * padding)
+
+    best = None
+    for candidate in sorted(candidates):
+        positions, atlas_width, atlas_height = _shelf_pack(sizes, order, candidate, padding)
+        score = (max(atlas_width, atlas_height), atlas_width * atlas_height)
+        if best is None or score < best[0]:
+            best = (score, positions, atlas_width, atlas_height)
+    return best[1], best[2], best[3]
+
+
+def build_atlas(sprites: Dict[str, Image.Image], padding: int = ATLAS_PADDING) -> Tuple[Image.Image, Dict]:
+    """
+    Recorta y empaqueta los sprites en una textura RGBA. Retorna el atlas y
+    su mapa de cuadros por nombre.
+    """
+    names = list(sprites)
+    trimmed = [trim(sprites[name]) for name in names]
+    positions, width, height = pack([crop.size for crop, _ in trimmed], padding)
+
+    atlas = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    frames = {}
+    for name, (crop, box), (x, y) in zip(names, trimmed, positions):
+        atlas.paste(crop, (x, y))
+        source = sprites[name]
+        frames[name] = {
+            "x": x,
+            "y": y,
+            "w": crop.width,
+            "h": crop.height,
+            "sourceW": source.width,
+            "sourceH": source.height,
+            "offsetX": box[0],
+            "offsetY": box[1],
+        }
+    return atlas, {"width": width, "height": height, "frames": frames}
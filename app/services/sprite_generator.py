@@ -0,0 +1,143 @@
+"""
+Generador local de sprites de marcador de posición.
+
+Construye sprites vistos desde arriba a partir de las referencias de
+``assets/`` usando solo operaciones de imagen en CPU: recolorea la
+referencia con el color elegido en el prompt creativo, aplica un filtro
+según el ``CarStyle`` y recorta el fondo a transparencia. Para las mismas
+entradas el resultado siempre es el mismo y tarda milisegundos, así que
+sirve como modo offline, como respaldo cuando los proveedores fallan y
+como backend rápido para pruebas de carga y CI.
+"""
+import hashlib
+from io import BytesIO
+from typing import Optional, Tuple
+
+from PIL import Image, ImageChops, ImageFilter, ImageOps
+
+from ..models.car_model import CarStyle
+from .prompt_service import COLOR_MAPPING, COLOR_RGB
+
+# Lado del sprite generado
+SPRITE_SIZE = 512
+
+# Diferencia con el color del borde por debajo de la cual un píxel es fondo
+BACKGROUND_DISTANCE = 24
+
+# Ancho en píxeles del borde usado para estimar el color de fondo
+BORDER_WIDTH = 8
+
+# Resolución intermedia del estilo pixel art
+PIXEL_ART_GRID = 64
+PIXEL_ART_COLORS = 16
+
+RGB = Tuple[int, int, int]
+
+
+def color_from_prompt(prompt: str) -> RGB:
+    """
+    Obtiene el color de un prompt: busca un color en español o su
+    traducción en inglés de COLOR_MAPPING. Si no encuentra ninguno, deriva
+    un color estable del texto para que el resultado siga siendo determinista.
+    """
+    text = prompt.lower()
+    for name, description in COLOR_MAPPING.items():
+        english = description.split(" ", 1)[0]
+        if name in text or f"{english} colored" in text:
+            return COLOR_RGB[name]
+    digest = hashlib.sha1(text.encode("utf-8")).digest()
+    return digest[0], digest[1], digest[2]
+
+
+def _shade(color: RGB, factor: float) -> RGB:
+    """Aclara (factor > 0) u oscurece (factor < 0) un color."""
+    if factor >= 0:
+        return tuple(int(c + (255 - c) * factor) for c in color)
+    return tuple(int(c * (1 + factor)) for c in color)
+
+
+def _border_color(image: Image.Image) -> RGB:
+    """Color promedio del borde de la imagen, que se toma como color de fondo."""
+    width, height = image.size
+    border = BORDER_WIDTH
+    strips = [
+        image.crop((0, 0, width, border)),
+        image.crop((0, height - border, width, height)),
+        image.crop((0, 0, border, height)),
+        image.crop((width - border, 0, width, height)),
+    ]
+    colors = [strip.resize((1, 1), Image.Resampling.BOX).getpixel((0, 0)) for strip in strips]
+    return tuple(sum(channel) // len(colors) for channel in zip(*colors))
+
+
+def _background_mask(image: Image.Image) -> Image.Image:
+    """
+    Máscara alfa: la transparencia original si existe; si no, se recortan los
+    píxeles cercanos al color del borde (fondo blanco o papel de las referencias).
+    """
+    if image.mode == "RGBA" and image.getextrema()[3][0] < 255:
+        return image.getchannel("A")
+    rgb = image.convert("RGB")
+    background = Image.new("RGB", rgb.size, _border_color(rgb))
+    distance = ImageOps.grayscale(ImageChops.difference(rgb, background))
+    mask = distance.point(lambda value: 255 if value > BACKGROUND_DISTANCE else 0)
+    # Suavizar el borde del recorte
+    return mask.filter(ImageFilter.GaussianBlur(1))
+
+
+def _apply_style(colored: Image.Image, gray: Image.Image, color: RGB, style: str) -> Image.Image:
+    if style == CarStyle.PIXEL_ART.value:
+        small = colored.resize((PIXEL_ART_GRID, PIXEL_ART_GRID), Image.Resampling.BILINEAR)
+        small = small.quantize(PIXEL_ART_COLORS, dither=Image.Dither.NONE).convert("RGB")
+        return small.resize(colored.size, Image.Resampling.NEAREST)
+
+    if style == CarStyle.CARTOON.value:
+        flat = ImageOps.posterize(colored, 3)
+        # Contorno oscuro donde la referencia tiene bordes marcados
+        edges = gray.filter(ImageFilter.FIND_EDGES).point(lambda value: 255 if value > 40 else 0)
+        outline = Image.new("RGB", colored.size, _shade(color, -0.8))
+        return Image.composite(outline, flat, edges)
+
+    if style == CarStyle.MINIMALIST.value:
+        return ImageOps.posterize(colored.filter(ImageFilter.SMOOTH_MORE), 2)
+
+    return colored.filter(ImageFilter.DETAIL)
+
+
+def generate_sprite(
+    reference: bytes,
+    prompt: str,
+    style: str = CarStyle.CARTOON.value,
+    color: Optional[RGB] = None,
+    size: int = SPRITE_SIZE
+) -> bytes:
+    """
+    Genera un sprite PNG con fondo transparente a partir de una referencia.
+    ``color`` tiene prioridad sobre el color detectado en el prompt.
+    """
+    style = style.value if hasattr(style, "value") else style
+    color = color or color_from_prompt(prompt)
+
+    with Image.open(BytesIO(reference)) as source:
+        image = source.convert("RGBA") if source.mode in ("RGBA", "LA", "P") else source.convert("RGB")
+    image = image.resize((size, size), Image.Resampling.BILINEAR)
+
+    gray = ImageOps.grayscale(image.convert("RGB"))
+    alpha = _background_mask(image)
+
+    # Recolorear conservando el sombreado de la referencia
+    colored = ImageOps.colorize(
+        ImageOps.autocontrast(gray, cutoff=1),
+        black=_shade(color, -0.75),
+        white=_shade(color, 0.7),
+        mid=color
+    )
+    sprite = _apply_style(colored, gray, color, style).convert("RGBA")
+    if style == CarStyle.PIXEL_ART.value:
+        alpha = alpha.resize((PIXEL_ART_GRID, PIXEL_ART_GRID), Image.Resampling.BILINEAR)
+        alpha = alpha.point(lambda value: 255 if value >= 128 else 0).resize(sprite.size, Image.Resampling.NEAREST)
+    sprite.putalpha(alpha)
+
+    buffer = BytesIO()
+    sprite.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
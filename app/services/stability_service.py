@@ -7,10 +7,21 @@ from io import BytesIO
 import os
 from PIL import Image
 import tempfile
+import asyncio
+from typing import Optional
+import logging
+from ..tracing import span, KIND_CLIENT
+
+logger = logging.getLogger(__name__)
+
+# Segundos para establecer la conexión con la API de Stability
+CONNECT_TIMEOUT = 10.0
 
 class StabilityService:
-    def __init__(self):
+    def __init__(self, timeout: float = 120.0):
         self.api_key = settings.STABILITY_API_KEY
+        # Tiempo máximo de lectura de la respuesta; al vencer, el hilo de la petición se libera
+        self.timeout = timeout
         self.api_host = "https://api.stability.ai/v2beta/stable-image/control/structure"
         self.style_prompts = {
             CarStyle.PIXEL_ART: "A detailed sports car in perfect top-down 2D view, pixel art style, vibrant colors, clean design, high contrast, sharp edges, colorful details, on pure white background, game asset style",
@@ -53,12 +64,13 @@ class StabilityService:
             if len(files) == 0:
                 files["none"] = ''
 
-            print(f"Sending request to Stability AI...")
+            logger.debug("Sending request to Stability AI...")
             response = requests.post(
                 self.api_host,
                 headers=headers,
                 files=files,
-                data=params
+                data=params,
+                timeout=(CONNECT_TIMEOUT, self.timeout)
             )
             
             if not response.ok:
@@ -71,14 +83,29 @@ class StabilityService:
             if file_handle is not None:
                 file_handle.close()
 
-    async def generate_car_variation(self, image_path: str, prompt: str, style: CarStyle = CarStyle.REALISTIC) -> bytes:
+    async def generate_car_variation(
+        self,
+        image_path: str,
+        prompt: str,
+        style: CarStyle = CarStyle.REALISTIC,
+        image_bytes: Optional[bytes] = None
+    ) -> bytes:
+        """
+        Genera una variación de la imagen de referencia.
+        Si se recibe image_bytes (la referencia ya redimensionada), se envía
+        directamente sin redimensionar ni escribir un archivo temporal.
+        """
         temp_image_path = None
         try:
-            if not os.path.exists(image_path):
-                raise Exception(f"Image not found at: {image_path}")
+            files = None
+            if image_bytes is not None:
+                files = {"image": (os.path.basename(image_path), image_bytes, "image/png")}
+            else:
+                if not os.path.exists(image_path):
+                    raise Exception(f"Image not found at: {image_path}")
 
-            # Redimensionar la imagen y obtener la ruta temporal
-            temp_image_path = self._resize_image(image_path)
+                # Redimensionar la imagen y obtener la ruta temporal
+                temp_image_path = self._resize_image(image_path)
 
             style_prompt = self.style_prompts[style]
             # Asumimos que el prompt del usuario está en español, lo dejamos como está
@@ -96,12 +123,21 @@ class StabilityService:
                 "output_format": "png"
             }
             
-            # No usar await aquí ya que send_generation_request no es una función asíncrona
-            return self.send_generation_request(params)
+            # send_generation_request es bloqueante: ejecutarlo en un hilo para no detener el event loop
+            with span(
+                "stability.generate_car_variation",
+                KIND_CLIENT,
+                style=style,
+                reference=os.path.basename(image_path),
+                bytes_in=len(image_bytes) if image_bytes is not None else 0
+            ) as current:
+                content = await asyncio.to_thread(self.send_generation_request, params, files)
+                current.set_attribute("bytes_out", len(content))
+                return content
 
         except Exception as e:
             error_message = f"Error generating car variation: {str(e)}"
-            print(f"Detailed error: {repr(e)}")
+            logger.debug("Detailed error: %r", e)
             raise Exception(error_message)
             
         finally:
@@ -110,4 +146,4 @@ class StabilityService:
                 try:
                     os.remove(temp_image_path)
                 except Exception as e:
-                    print(f"Error deleting temporary file: {e}")
\ No newline at end of file
+                    logger.warning(f"Error deleting temporary file: {e}")
\ No newline at end of file
@@ -0,0 +1,135 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..models.car_model import CarConfig, PartType
+
+# Valores posibles de cada estadística
+STAT_VALUES = np.arange(1, 11)
+
+# Los números 1-8 tienen peso 1.0, mientras que 9 y 10 tienen peso 0.7
+BASE_WEIGHTS = np.array([1.0] * 8 + [0.7] * 2)
+
+# Orden de las partes en la respuesta
+PART_ORDER = (PartType.ENGINE, PartType.TRANSMISSION, PartType.WHEELS)
+
+# Inclinación de cada estadística (stat1, stat2, stat3) según el tipo de parte.
+# Un valor positivo favorece los valores altos y uno negativo los bajos; 0
+# mantiene la distribución base. Los tipos por defecto de CarConfig son neutros.
+STAT_PROFILES: Dict[PartType, Dict[str, Tuple[float, float, float]]] = {
+    # Potencia, Eficiencia, Durabilidad
+    PartType.ENGINE: {
+        "standard": (0.0, 0.0, 0.0),
+        "performance": (0.8, -0.6, -0.2),
+        "eco": (-0.6, 0.8, 0.2),
+    },
+    # Velocidad de cambio, Eficiencia, Control
+    PartType.TRANSMISSION: {
+        "manual": (0.0, 0.0, 0.0),
+        "automatic": (-0.3, 0.4, 0.3),
+        "sequential": (0.8, -0.2, -0.3),
+    },
+    # Tracción, Manejo, Agarre
+    PartType.WHEELS: {
+        "sport": (0.0, 0.0, 0.0),
+        "racing": (-0.2, 0.6, 0.6),
+        "offroad": (0.8, -0.4, 0.2),
+    },
+}
+
+# Stats de una parte: (stat1, stat2, stat3)
+PartStats = Tuple[int, int, int]
+
+
+def _part_types(config: CarConfig) -> Tuple[str, str, str]:
+    return (
+        config.engineType.lower(),
+        config.transmissionType.lower(),
+        config.wheelsType.lower()
+    )
+
+
+class StatsEngine:
+    """
+    Generador de estadísticas de partes.
+
+    Las estadísticas de muchos carros se obtienen con una sola operación
+    vectorizada: se sortea un número uniforme por estadística y se busca en la
+    distribución acumulada de su tipo de parte. Un carro con ``seed`` usa su
+    propio generador, así que sus estadísticas son reproducibles.
+    """
+
+    def __init__(
+        self,
+        profiles: Dict[PartType, Dict[str, Tuple[float, float, float]]] = STAT_PROFILES,
+        seed: Optional[int] = None
+    ):
+        self.profiles = profiles
+        self._rng = np.random.default_rng(seed)
+        self._cdf_cache: Dict[Tuple[str, str, str], np.ndarray] = {}
+
+    def _build_cdf(self, part_types: Tuple[str, str, str]) -> np.ndarray:
+        """Distribución acumulada de forma (partes, stats, valores) para una combinación de tipos."""
+        # Posición de cada valor normalizada a [-1, 1]
+        position = (STAT_VALUES - 5.5) / 4.5
+        tilts = np.array([
+            self.profiles.get(part, {}).get(part_type, (0.0, 0.0, 0.0))
+            for part, part_type in zip(PART_ORDER, part_types)
+        ])
+        weights = BASE_WEIGHTS * np.exp(tilts[..., None] * position)
+        cdf = np.cumsum(weights, axis=-1)
+        cdf /= cdf[..., -1:]
+        # Evitar que un error de redondeo deje el último valor fuera de alcance
+        cdf[..., -1] = 1.0
+        return cdf
+
+    def _cdf_for(self, config: CarConfig) -> np.ndarray:
+        part_types = _part_types(config)
+        cdf = self._cdf_cache.get(part_types)
+        if cdf is None:
+            cdf = self._build_cdf(part_types)
+            self._cdf_cache[part_types] = cdf
+        return cdf
+
+    def generate_batch(self, configs: Sequence[CarConfig]) -> np.ndarray:
+        """
+        Genera las estadísticas de varios carros en una sola llamada.
+        Retorna un arreglo de forma (carros, partes, stats) con valores de 1 a 10.
+        """
+        count = len(configs)
+        if count == 0:
+            return np.empty((0, len(PART_ORDER), 3), dtype=np.int64)
+
+        cdfs = np.stack([self._cdf_for(config) for config in configs])
+        draws = np.empty((count, len(PART_ORDER), 3))
+
+        seeded = [idx for idx, config in enumerate(configs) if config.seed is not None]
+        unseeded = [idx for idx, config in enumerate(configs) if config.seed is None]
+        if unseeded:
+            draws[unseeded] = self._rng.random((len(unseeded), len(PART_ORDER), 3))
+        for idx in seeded:
+            draws[idx] = np.random.default_rng(configs[idx].seed).random((len(PART_ORDER), 3))
+
+        # Índice del primer valor cuya probabilidad acumulada supera el sorteo
+        return (draws[..., None] >= cdfs).sum(axis=-1) + 1
+
+    def generate(self, config: CarConfig) -> Dict[PartType, PartStats]:
+        """Genera las estadísticas de un carro, por tipo de parte."""
+        return self.to_part_stats(self.generate_batch([config]))[0]
+
+    def to_part_stats(self, batch: np.ndarray) -> List[Dict[PartType, PartStats]]:
+        """Convierte el resultado de generate_batch al formato de generate."""
+        return [
+            {
+                part: tuple(part_stats)
+                for part, part_stats in zip(PART_ORDER, car_stats)
+            }
+            for car_stats in batch.tolist()
+        ]
+
+
+def apply_stats(response_data: Dict, stats: Dict[PartType, PartStats]) -> Dict:
+    """Reemplaza las estadísticas de una respuesta serializada (por ejemplo, del caché)."""
+    for part, part_stats in zip(response_data["parts"], (stats[part] for part in PART_ORDER)):
+        part["stat1"], part["stat2"], part["stat3"] = part_stats
+    return response_data
@@ -0,0 +1,15 @@
+"""
+Lectura de las opciones configurables por estilo, como
+``IMAGE_PROVIDER_PREFERENCES`` o ``MATTING_MODEL_BY_STYLE``.
+"""
+from typing import Dict
+
+
+def parse_style_preferences(value: str) -> Dict[str, str]:
+    """Convierte "pixel_art=stability,realistic=openai" en un diccionario."""
+    preferences = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        style, _, choice = item.partition("=")
+        if choice:
+            preferences[style.strip()] = choice.strip()
+    return preferences
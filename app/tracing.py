@@ -0,0 +1,330 @@
+"""
+Trazas de las etapas de una generación.
+
+Cada etapa (``generate_car_assets``, la llamada al proveedor de imágenes,
+la remoción de fondo, la subida a Lighthouse...) se envuelve en un span
+con ``with span("nombre", atributo=valor)``. Los spans anidados forman una
+traza por petición, así que una respuesta lenta de /generate se puede
+seguir hasta la llamada concreta que la causó.
+
+Los spans terminados se encolan y un hilo aparte los exporta en el formato
+JSON de OTLP (``ExportTraceServiceRequest``): a un archivo, una línea por
+lote, y/o a un colector OTLP/HTTP. Sin exportador configurado los spans no
+se crean y el costo es una lectura de ContextVar.
+
+Variables de entorno:
+- TRACE_EXPORT: destinos separados por coma, "file" y/o "otlp" (por defecto ninguno)
+- TRACE_FILE: archivo de spans (por defecto traces/spans.jsonl)
+- OTEL_EXPORTER_OTLP_ENDPOINT: colector OTLP/HTTP, por ejemplo http://localhost:4318
+
+Reporte de las etapas más lentas a partir del archivo:
+
+    python -m app.tracing report [archivo] [cantidad]
+"""
+import atexit
+import logging
+import os
+import queue
+import secrets
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, List, Optional, TypeVar
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+SERVICE_NAME = "speed-rush-2d-backend"
+DEFAULT_TRACE_FILE = os.path.join("traces", "spans.jsonl")
+
+# Spans por lote exportado y segundos máximos entre exportaciones
+EXPORT_BATCH_SIZE = 256
+EXPORT_INTERVAL = 2.0
+
+# Códigos de estado de OTLP
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# Tipos de span de OTLP
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+
+class Span:
+    """Una etapa medida. Se crea con ``span()``, no directamente."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "status", "message")
+
+    def __init__(self, name: str, parent: Optional["Span"], kind: int, attributes: Dict[str, Any]):
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else ""
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.status = STATUS_OK
+        self.message = ""
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_error(self, error: BaseException):
+        self.status = STATUS_ERROR
+        self.message = str(error) or type(error).__name__
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": self.status, "message": self.message} if self.message else {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    """Span que no registra nada, para cuando no hay exportador."""
+
+    trace_id = ""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_error(self, error: BaseException):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+_exporter: Optional["SpanExporter"] = None
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value.value if hasattr(value, "value") else value)}
+    return {"key": key, "value": typed}
+
+
+def _attribute_value(value: Dict) -> Any:
+    """Inverso de _otlp_attribute, para el reporte."""
+    if "intValue" in value:
+        return int(value["intValue"])
+    for key in ("doubleValue", "boolValue", "stringValue"):
+        if key in value:
+            return value[key]
+    return None
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """
+    Mide una etapa como hijo del span activo. Las excepciones marcan el span
+    como error y se propagan.
+    """
+    if _exporter is None:
+        yield _NOOP_SPAN
+        return
+
+    current = Span(name, current_span.get(), kind, attributes)
+    token = current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_error(e)
+        raise
+    finally:
+        current_span.reset(token)
+        current.end_ns = time.time_ns()
+        _exporter.export(current)
+
+
+async def traced(name: str, awaitable: Awaitable[T], **attributes) -> T:
+    """Mide una corrutina como span; útil para las tareas de asyncio.gather."""
+    with span(name, **attributes):
+        return await awaitable
+
+
+def current_trace_id() -> str:
+    active = current_span.get()
+    return active.trace_id if active else ""
+
+
+class SpanExporter:
+    """Exporta spans por lotes desde un hilo propio, a archivo y/o OTLP/HTTP."""
+
+    def __init__(self, trace_file: Optional[str] = None, otlp_endpoint: Optional[str] = None):
+        self.trace_file = trace_file
+        self.otlp_url = f"{otlp_endpoint.rstrip('/')}/v1/traces" if otlp_endpoint else None
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        if trace_file:
+            os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+
+    def start(self):
+        self._thread.start()
+
+    def export(self, finished: Span):
+        self._queue.put(finished)
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        batch: List[Span] = []
+        deadline = time.monotonic() + EXPORT_INTERVAL
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = False
+            if item:
+                batch.append(item)
+            expired = time.monotonic() >= deadline
+            if batch and (item is None or expired or len(batch) >= EXPORT_BATCH_SIZE):
+                self._flush(batch)
+                batch = []
+            if item is None:
+                return
+            if expired:
+                deadline = time.monotonic() + EXPORT_INTERVAL
+
+    def _flush(self, batch: List[Span]):
+        payload = orjson.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [finished.to_otlp() for finished in batch]
+                }]
+            }]
+        })
+        if self.trace_file:
+            try:
+                with open(self.trace_file, "ab") as f:
+                    f.write(payload + b"\n")
+            except Exception as e:
+                logger.error(f"Error escribiendo spans en {self.trace_file}: {str(e)}")
+        if self.otlp_url:
+            try:
+                import requests
+                response = requests.post(
+                    self.otlp_url,
+                    data=payload,
+                    headers={"Content-Type": "application/json"},
+                    timeout=5
+                )
+                if not response.ok:
+                    logger.warning(f"El colector OTLP respondió {response.status_code}")
+            except Exception as e:
+                logger.warning(f"Error enviando spans al colector OTLP: {str(e)}")
+
+
+def setup_tracing():
+    """Inicia el exportador según TRACE_EXPORT. Es idempotente."""
+    global _exporter
+    if _exporter is not None:
+        return
+
+    targets = {target.strip() for target in os.getenv("TRACE_EXPORT", "").lower().split(",") if target.strip()}
+    if not targets:
+        return
+
+    trace_file = os.getenv("TRACE_FILE", DEFAULT_TRACE_FILE) if "file" in targets else None
+    otlp_endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318") if "otlp" in targets else None
+
+    _exporter = SpanExporter(trace_file, otlp_endpoint)
+    _exporter.start()
+    atexit.register(_exporter.shutdown)
+    logger.info(f"Trazas habilitadas: {', '.join(sorted(targets))}")
+
+
+def load_spans(trace_file: str) -> List[Dict]:
+    """Lee los spans de un archivo exportado, con duración en segundos y atributos planos."""
+    spans = []
+    with open(trace_file, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for resource_spans in orjson.loads(line).get("resourceSpans", []):
+                for scope_spans in resource_spans.get("scopeSpans", []):
+                    for item in scope_spans.get("spans", []):
+                        spans.append({
+                            "trace_id": item["traceId"],
+                            "name": item["name"],
+                            "duration": (int(item["endTimeUnixNano"]) - int(item["startTimeUnixNano"])) / 1e9,
+                            "error": item.get("status", {}).get("code") == STATUS_ERROR,
+                            "attributes": {
+                                attribute["key"]: _attribute_value(attribute["value"])
+                                for attribute in item.get("attributes", [])
+                            },
+                        })
+    return spans
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(trace_file: str, top: int = 10) -> str:
+    """Resumen por etapa (p50, p95, máximo, tiempo total) y los spans más lentos."""
+    spans = load_spans(trace_file)
+    if not spans:
+        return f"No hay spans en {trace_file}"
+
+    by_name: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    for item in spans:
+        by_name[item["name"]].append(item["duration"])
+        errors[item["name"]] += item["error"]
+
+    lines = [
+        f"{len(spans)} spans en {len({item['trace_id'] for item in spans})} trazas",
+        "",
+        f"{'etapa':<36} {'n':>5} {'p50(s)':>8} {'p95(s)':>8} {'máx(s)':>8} {'total(s)':>9} {'errores':>8}",
+    ]
+    stages = sorted(by_name.items(), key=lambda entry: _percentile(entry[1], 0.95), reverse=True)
+    for name, durations in stages:
+        lines.append(
+            f"{name:<36} {len(durations):>5} {_percentile(durations, 0.5):>8.3f} "
+            f"{_percentile(durations, 0.95):>8.3f} {max(durations):>8.3f} {sum(durations):>9.2f} {errors[name]:>8}"
+        )
+
+    lines += ["", f"{top} spans más lentos:"]
+    for item in sorted(spans, key=lambda entry: entry["duration"], reverse=True)[:top]:
+        attributes = ", ".join(f"{key}={value}" for key, value in item["attributes"].items())
+        status = " ERROR" if item["error"] else ""
+        lines.append(f"{item['duration']:>8.3f}s {item['name']}{status} [{item['trace_id'][:12]}] {attributes}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "report":
+        path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_TRACE_FILE
+        print(report(path, int(sys.argv[3]) if len(sys.argv) > 3 else 10))
+    else:
+        print("Uso: python -m app.tracing report [archivo] [cantidad]")
@@ -0,0 +1,163 @@
+"""
+Benchmark del modelo de concurrencia de un worker.
+
+Simula generaciones con la forma real de la carga: espera de E/S (cuatro
+imágenes al proveedor en paralelo, luego cuatro subidas) y una ráfaga de
+CPU por imagen (remoción de fondo + PNG). Si el modelo rembg está
+descargado se usa de verdad; si no, la ráfaga de CPU es un filtro y la
+codificación PNG de una referencia de 1024x1024, que también liberan el GIL.
+
+Modos (cada uno en un subproceso separado para medir su pico de RSS):
+- inline: el trabajo de CPU corre en el event loop (comportamiento anterior)
+- pool: el trabajo de CPU va al pool de hilos (CPU_WORKERS)
+- pool+admission: pool + control de admisión; el exceso se rechaza con 503
+
+También estima la memoria total de los modelos de despliegue multiplicando
+el RSS de un worker por la cantidad de workers de cada configuración.
+Uso:
+
+    python benchmarks/concurrency.py [peticiones] [latencia_io]
+"""
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("ASSETS_WATCH_INTERVAL", "0")
+
+IMAGES_PER_CAR = 4
+IMAGE_SIZE = (1024, 1024)
+MODES = ("inline", "pool", "pool+admission")
+
+# Intervalo de la sonda que mide el retraso del event loop
+PROBE_INTERVAL = 0.05
+
+
+def _model_available() -> bool:
+    home = os.getenv("U2NET_HOME", os.path.expanduser("~/.u2net"))
+    return os.path.exists(os.path.join(home, "u2net.onnx"))
+
+
+def _build_cpu_burst():
+    """Función que procesa una imagen como lo hace una generación real."""
+    from PIL import Image, ImageFilter
+    from app.services.asset_index import AssetIndex
+    from app.services.multipart_stream import encode_png
+
+    assets = AssetIndex.load(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets"))
+    with Image.open(assets.choose("car")) as reference:
+        image = reference.convert("RGB").resize(IMAGE_SIZE)
+
+    if _model_available():
+        from rembg import new_session, remove
+        session = new_session()
+
+        def burst():
+            return encode_png(remove(image, session=session), optimize=True)
+    else:
+        def burst():
+            return encode_png(image.filter(ImageFilter.GaussianBlur(4)).convert("RGBA"), optimize=True)
+    return burst
+
+
+async def _run(mode: str, requests: int, io_latency: float):
+    from app.services.admission import AdmissionController, Overloaded
+    from app.services.cpu_pool import run_cpu
+
+    burst = _build_cpu_burst()
+    admission = AdmissionController() if mode == "pool+admission" else None
+    latencies = []
+    rejected = 0
+
+    async def generation():
+        await asyncio.gather(*(asyncio.sleep(io_latency) for _ in range(IMAGES_PER_CAR)))
+        if mode == "inline":
+            results = [burst() for _ in range(IMAGES_PER_CAR)]
+        else:
+            results = await asyncio.gather(*(run_cpu(burst) for _ in range(IMAGES_PER_CAR)))
+        await asyncio.gather(*(asyncio.sleep(io_latency / 4) for _ in results))
+
+    async def request():
+        nonlocal rejected
+        start = time.perf_counter()
+        try:
+            if admission is None:
+                await generation()
+            else:
+                async with admission.slot():
+                    await generation()
+        except Overloaded:
+            rejected += 1
+            return
+        latencies.append(time.perf_counter() - start)
+
+    # Una petición al caché durante la carga mide cuánto bloquea el event loop
+    async def cache_probe():
+        samples = []
+        while len(latencies) + rejected < requests:
+            start = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            samples.append(time.perf_counter() - start - PROBE_INTERVAL)
+        return max(samples) if samples else 0.0
+
+    start = time.perf_counter()
+    probe = asyncio.create_task(cache_probe())
+    await asyncio.gather(*(request() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    worst_loop_stall = await probe
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+    return len(latencies), rejected, elapsed, p95, worst_loop_stall
+
+
+def _child(mode: str, requests: int, io_latency: float):
+    completed, rejected, elapsed, p95, stall = asyncio.run(_run(mode, requests, io_latency))
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode},{completed},{rejected},{completed / elapsed:.2f},{p95:.2f},{stall * 1000:.0f},{peak_rss:.0f}")
+
+
+def _worker_rss():
+    import app.main  # noqa: F401
+    print(f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}")
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    io_latency = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    from app.config import settings
+
+    print(f"{requests} generaciones concurrentes, E/S simulada {io_latency}s, "
+          f"CPU_WORKERS={settings.CPU_WORKERS}, rembg {'real' if _model_available() else 'simulado'}")
+    print(f"{'modo':<16} {'ok':>4} {'503':>4} {'carros/s':>9} {'p95(s)':>7} {'bloqueo loop(ms)':>17} {'pico RSS(MB)':>13}")
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", mode, str(requests), str(io_latency)],
+            check=True, capture_output=True, text=True
+        ).stdout.strip().splitlines()[-1]
+        name, completed, rejected, throughput, p95, stall, rss = output.split(",")
+        print(f"{name:<16} {completed:>4} {rejected:>4} {throughput:>9} {p95:>7} {stall:>17} {rss:>13}")
+
+    # Importar app.main valida la configuración; el worker no llama a ningún servicio
+    worker_env = {"IMAGE_PROVIDERS": "local", "LIGHTHOUSE_API_KEY": "benchmark", **os.environ}
+    rss = float(subprocess.run(
+        [sys.executable, __file__, "--worker-rss"],
+        check=True, capture_output=True, text=True, env=worker_env
+    ).stdout.strip().splitlines()[-1])
+    legacy_workers = (os.cpu_count() or 1) * 2 + 1
+    print(f"\nRSS de un worker tras importar la app: {rss:.0f} MB")
+    print(f"gunicorn anterior (cpu*2+1 = {legacy_workers} workers): ~{rss * legacy_workers:.0f} MB")
+    print(f"WEB_CONCURRENCY={settings.WEB_CONCURRENCY}: ~{rss * settings.WEB_CONCURRENCY:.0f} MB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        _child(sys.argv[2], int(sys.argv[3]), float(sys.argv[4]))
+    elif len(sys.argv) == 2 and sys.argv[1] == "--worker-rss":
+        _worker_rss()
+    else:
+        main()
@@ -0,0 +1,95 @@
+"""
+Nodo local compatible con Lighthouse, para pruebas y benchmarks sin red.
+
+Implementa lo que usa ``LighthouseService``:
+
+- ``POST /api/v0/add``: uno o varios archivos multipart; responde un objeto
+  JSON por archivo y por línea (``Name``, ``Hash``, ``Size``), como la API
+  de IPFS. El CID se calcula igual que ``ipfs add``.
+- ``GET``/``HEAD /ipfs/<cid>``: el gateway, sirve los archivos subidos.
+- ``DELETE /ipfs/<cid>``: deja de servir un archivo, para simular que dejó
+  de estar fijado.
+- ``GET /stats``: peticiones, archivos y bytes recibidos.
+
+Los archivos se guardan en memoria. ``LIGHTHOUSE_STUB_LATENCY`` agrega una
+latencia fija por petición (segundos) para simular la red. Uso:
+
+    python benchmarks/lighthouse_stub.py [puerto]
+
+y en el servidor:
+
+    LIGHTHOUSE_UPLOAD_URL=http://localhost:8081/api/v0/add
+    LIGHTHOUSE_GATEWAY_URL=http://localhost:8081/ipfs
+"""
+import asyncio
+import os
+import sys
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orjson  # noqa: E402
+from fastapi import FastAPI, HTTPException, Request, Response  # noqa: E402
+from starlette.datastructures import UploadFile  # noqa: E402
+
+from app.services.ipfs_cid import compute_cid  # noqa: E402
+
+DEFAULT_PORT = 8081
+
+app = FastAPI(title="Lighthouse stub")
+
+files: Dict[str, bytes] = {}
+stats = {"requests": 0, "files": 0, "bytes": 0}
+
+
+def _latency() -> float:
+    return float(os.getenv("LIGHTHOUSE_STUB_LATENCY", "0"))
+
+
+@app.post("/api/v0/add")
+async def add(request: Request):
+    if not request.headers.get("authorization", "").startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Falta el token")
+    await asyncio.sleep(_latency())
+
+    form = await request.form()
+    lines = []
+    for _, value in form.multi_items():
+        if not isinstance(value, UploadFile):
+            continue
+        content = await value.read()
+        cid = compute_cid(content)
+        files[cid] = content
+        stats["files"] += 1
+        stats["bytes"] += len(content)
+        lines.append(orjson.dumps({"Name": value.filename, "Hash": cid, "Size": str(len(content))}))
+    stats["requests"] += 1
+    if not lines:
+        raise HTTPException(status_code=400, detail="No se recibieron archivos")
+    return Response(content=b"\n".join(lines) + b"\n", media_type="application/json")
+
+
+@app.api_route("/ipfs/{cid}", methods=["GET", "HEAD"])
+async def gateway(cid: str):
+    await asyncio.sleep(_latency())
+    content = files.get(cid)
+    if content is None:
+        raise HTTPException(status_code=404, detail="CID no encontrado")
+    return Response(content=content, media_type="image/png")
+
+
+@app.delete("/ipfs/{cid}")
+async def unpin(cid: str):
+    if files.pop(cid, None) is None:
+        raise HTTPException(status_code=404, detail="CID no encontrado")
+    return {"unpinned": cid}
+
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "stored": len(files)}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, port=int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT, log_level="warning")
@@ -0,0 +1,120 @@
+"""
+Benchmark de la subida de los archivos de un carro a Lighthouse.
+
+Levanta el stub local (``benchmarks/lighthouse_stub.py``) con una latencia
+por petición y sube las cuatro imágenes de varios carros de tres formas:
+
+- legacy: una petición por archivo con ``requests.post`` sin sesión, una
+  tras otra (la versión anterior bloqueaba el event loop, así que las
+  subidas "paralelas" en realidad eran secuenciales)
+- paralelo: ``LighthouseService`` con un archivo por petición, conexiones
+  reutilizadas y peticiones simultáneas
+- lote: ``LighthouseService`` con los cuatro archivos en una petición
+
+Reporta la latencia por carro y las peticiones recibidas por el nodo. Uso:
+
+    python benchmarks/lighthouse_upload.py [carros] [latencia]
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PORT = 8097
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+os.environ.setdefault("LIGHTHOUSE_UPLOAD_URL", f"{BASE_URL}/api/v0/add")
+os.environ.setdefault("LIGHTHOUSE_GATEWAY_URL", f"{BASE_URL}/ipfs")
+# El stub acepta cualquier token
+os.environ.setdefault("LIGHTHOUSE_API_KEY", "stub")
+
+import requests  # noqa: E402
+
+from app.services.asset_index import AssetIndex  # noqa: E402
+from app.services.lighthouse_service import LighthouseService  # noqa: E402
+from app.services.multipart_stream import MultipartStream  # noqa: E402
+
+PART_NAMES = ["car", "engine", "transmission", "wheels"]
+
+
+def _car_files(paths, index):
+    files = []
+    for offset, name in enumerate(PART_NAMES):
+        with open(paths[(index * len(PART_NAMES) + offset) % len(paths)], "rb") as f:
+            # Un byte distinto por carro para que ningún archivo se repita entre carros
+            files.append((f"{name}.png", f.read() + index.to_bytes(4, "big")))
+    return files
+
+
+def _legacy_upload(files):
+    uris = []
+    for filename, content in files:
+        body = MultipartStream()
+        body.add_file("file", filename, content)
+        response = requests.post(
+            f"{BASE_URL}/api/v0/add",
+            data=body,
+            headers={"Authorization": "Bearer benchmark", "Content-Type": body.content_type}
+        )
+        uris.append(response.json()["Hash"])
+    return uris
+
+
+def _stub_requests() -> int:
+    return requests.get(f"{BASE_URL}/stats").json()["requests"]
+
+
+async def _run(label, cars, upload):
+    before = _stub_requests()
+    times = []
+    for files in cars:
+        start = time.perf_counter()
+        await upload(files)
+        times.append(time.perf_counter() - start)
+    per_car = (_stub_requests() - before) / len(cars)
+    print(f"{label:<12} {statistics.mean(times) * 1000:>10.0f} {max(times) * 1000:>10.0f} {per_car:>14.1f}")
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    latency = sys.argv[2] if len(sys.argv) > 2 else "0.1"
+
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lighthouse_stub.py"), str(PORT)],
+        env={**os.environ, "LIGHTHOUSE_STUB_LATENCY": latency}
+    )
+    try:
+        for _ in range(100):
+            try:
+                requests.get(f"{BASE_URL}/stats", timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+
+        assets_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+        paths = AssetIndex.load(assets_dir).paths()
+        cars = [_car_files(paths, index) for index in range(count)]
+        size = statistics.mean(sum(len(content) for _, content in files) for files in cars)
+        print(f"{count} carros de {size / 1024:.0f} KB, latencia del nodo {float(latency) * 1000:.0f} ms por petición")
+        print(f"{'modo':<12} {'ms/carro':>10} {'máx(ms)':>10} {'peticiones/carro':>14}")
+
+        await _run("legacy", cars, lambda files: asyncio.to_thread(_legacy_upload, files))
+
+        parallel = LighthouseService()
+        parallel.batch_files = 1
+        await _run("paralelo", cars, parallel.upload_batch)
+
+        batch = LighthouseService()
+        batch.batch_files = len(PART_NAMES)
+        await _run("lote", cars, batch.upload_batch)
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
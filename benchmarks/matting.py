@@ -0,0 +1,134 @@
+"""
+Benchmark de las sesiones de remoción de fondo.
+
+Para cada configuración (modelo, hilos, optimización del grafo, arena,
+int8) mide, sobre las referencias de assets/ a 1024x1024:
+- tiempo por imagen (mediana, después de una inferencia de calentamiento)
+- pico de RSS del proceso
+- calidad de la máscara: IoU y error medio del alfa frente a la máscara de
+  la configuración de referencia (u2net sin cuantizar)
+
+Cada configuración corre en un subproceso separado. Los modelos que no
+están descargados se descargan la primera vez (requiere red); los int8 se
+generan antes con ``python -m app.services.matting quantize <modelo>``.
+Uso:
+
+    python benchmarks/matting.py [imágenes]
+"""
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+IMAGE_SIZE = (1024, 1024)
+BASELINE = "u2net"
+
+# (etiqueta, modelo, hilos intra-op, optimización, arena, int8)
+SETTINGS = [
+    ("u2net", "u2net", 0, "all", True, False),
+    ("u2net-1hilo", "u2net", 1, "all", True, False),
+    ("u2net-basic", "u2net", 0, "basic", True, False),
+    ("u2net-sin-arena", "u2net", 0, "all", False, False),
+    ("u2net-int8", "u2net", 0, "all", True, True),
+    ("u2netp", "u2netp", 0, "all", True, False),
+    ("u2netp-int8", "u2netp", 0, "all", True, True),
+    ("silueta", "silueta", 0, "all", True, False),
+    ("isnet-general-use", "isnet-general-use", 0, "all", True, False),
+]
+
+
+def _load_images(count: int):
+    from PIL import Image
+    from app.services.asset_index import AssetIndex
+
+    assets_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+    paths = AssetIndex.load(assets_dir).paths()[:count]
+    images = []
+    for path in paths:
+        with Image.open(path) as image:
+            images.append(image.convert("RGB").resize(IMAGE_SIZE))
+    return images
+
+
+def _child(label: str, count: int, output_dir: str):
+    from rembg import remove
+    from app.services.matting import build_session_options, int8_model_path, new_matting_session
+
+    _, model, threads, optimization, arena, int8 = next(s for s in SETTINGS if s[0] == label)
+    if int8 and not os.path.exists(int8_model_path(model)):
+        print(f"{label},no disponible (falta {os.path.basename(int8_model_path(model))})")
+        return
+
+    images = _load_images(count)
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        session = new_matting_session(model, build_session_options(threads, 1, optimization, arena), int8)
+    except Exception as e:
+        print(f"{label},no disponible ({type(e).__name__})")
+        return
+
+    remove(images[0], session=session, only_mask=True)
+    times = []
+    for idx, image in enumerate(images):
+        start = time.perf_counter()
+        mask = remove(image, session=session, only_mask=True)
+        times.append(time.perf_counter() - start)
+        mask.save(os.path.join(output_dir, f"{label}_{idx}.png"))
+
+    peak_rss = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss) / 1024
+    print(f"{label},{statistics.median(times) * 1000:.0f},{peak_rss:.0f}")
+
+
+def _mask_quality(label: str, count: int, output_dir: str):
+    """IoU medio y error medio del alfa (0-255) frente a la configuración de referencia."""
+    import numpy as np
+    from PIL import Image
+
+    ious, errors = [], []
+    for idx in range(count):
+        reference_path = os.path.join(output_dir, f"{BASELINE}_{idx}.png")
+        mask_path = os.path.join(output_dir, f"{label}_{idx}.png")
+        if not (os.path.exists(reference_path) and os.path.exists(mask_path)):
+            return None
+        reference = np.asarray(Image.open(reference_path), dtype=np.int16)
+        mask = np.asarray(Image.open(mask_path), dtype=np.int16)
+        union = np.logical_or(reference > 127, mask > 127).sum()
+        ious.append(np.logical_and(reference > 127, mask > 127).sum() / union if union else 1.0)
+        errors.append(np.abs(reference - mask).mean())
+    return statistics.mean(ious), statistics.mean(errors)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    print(f"Remoción de fondo sobre {count} referencias {IMAGE_SIZE[0]}x{IMAGE_SIZE[1]}, referencia de calidad: {BASELINE}")
+    print(f"{'configuración':<20} {'ms/imagen':>10} {'pico RSS(MB)':>13} {'IoU':>6} {'error alfa':>11}")
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        results = []
+        for label, *_ in SETTINGS:
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", label, str(count), output_dir],
+                check=True, capture_output=True, text=True
+            ).stdout.strip().splitlines()[-1]
+            results.append(output.split(","))
+
+        for result in results:
+            if len(result) == 2:
+                print(f"{result[0]:<20} {result[1]}")
+                continue
+            label, elapsed, rss = result
+            quality = _mask_quality(label, count, output_dir)
+            iou, error = (f"{quality[0]:.3f}", f"{quality[1]:.1f}") if quality else ("-", "-")
+            print(f"{label:<20} {elapsed:>10} {rss:>13} {iou:>6} {error:>11}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        _child(sys.argv[2], int(sys.argv[3]), sys.argv[4])
+    else:
+        main()
@@ -0,0 +1,165 @@
+"""
+Benchmark de los modos de remoción de fondo (MATTING_MODE full vs fast).
+
+Sobre las referencias de assets/ a 1024x1024 mide:
+
+1. Reescalado de la máscara: una máscara suave de 320x320, como la que
+   produce u2net, generada a partir de una máscara de referencia a
+   resolución completa (recorte por color de fondo). Compara el LANCZOS de
+   rembg con ``guided_upsample``: IoU y error medio del alfa (0-255)
+   frente a la referencia.
+2. CPU por imagen sin la inferencia: la sesión devuelve la máscara anterior
+   en lugar de correr el modelo, así que solo se mide lo que cambia entre
+   modos (reescalados, recorte y PNG).
+3. Si el modelo está descargado, tiempo por imagen con la inferencia real y
+   calidad del modo rápido frente a la salida actual de ``rembg.remove``.
+
+Uso:
+
+    python benchmarks/matting_modes.py [imágenes] [modelo]
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from PIL import Image, ImageFilter  # noqa: E402
+from rembg import remove  # noqa: E402
+from rembg.sessions.u2net import U2netSession  # noqa: E402
+
+from app.services.asset_index import AssetIndex  # noqa: E402
+from app.services.matting import DEFAULT_INFERENCE_SIZE, downscale_matte, guided_upsample  # noqa: E402
+from app.services.multipart_stream import encode_png  # noqa: E402
+from app.services.sprite_generator import _background_mask  # noqa: E402
+
+IMAGE_SIZE = (1024, 1024)
+SMALL_SIZE = (DEFAULT_INFERENCE_SIZE, DEFAULT_INFERENCE_SIZE)
+
+# Suavizado que imita los bordes de la predicción de u2net a 320x320
+PREDICTION_BLUR = 1.5
+
+
+class _RecordedInference:
+    """Reemplaza la sesión de onnxruntime: devuelve una máscara ya calculada."""
+
+    class _Input:
+        name = "input.1"
+
+    def __init__(self):
+        self.mask = None
+
+    def get_inputs(self):
+        return [self._Input()]
+
+    def run(self, _outputs, _inputs):
+        return [self.mask[None, None]]
+
+
+def _quality(alpha: np.ndarray, reference: np.ndarray):
+    """IoU de las máscaras binarizadas y error medio del alfa, ambos en [0, 1]."""
+    mask, expected = alpha > 0.5, reference > 0.5
+    union = np.logical_or(mask, expected).sum()
+    iou = np.logical_and(mask, expected).sum() / union if union else 1.0
+    return iou, float(np.abs(alpha - reference).mean() * 255)
+
+
+def _alpha(image: Image.Image) -> np.ndarray:
+    return np.asarray(image.getchannel("A"), dtype=np.float32) / 255.0
+
+
+def _report(label: str, times, qualities, sizes=None):
+    line = f"{label:<22} {statistics.mean(times) * 1000:>10.0f}"
+    line += f" {statistics.mean(q[0] for q in qualities):>7.4f} {statistics.mean(q[1] for q in qualities):>11.2f}"
+    if sizes:
+        line += f" {statistics.mean(sizes) / 1024:>9.0f}"
+    print(line)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    model_name = sys.argv[2] if len(sys.argv) > 2 else "u2net"
+
+    assets_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+    images, references, predictions = [], [], []
+    for path in AssetIndex.load(assets_dir).paths()[:count]:
+        with Image.open(path) as source:
+            image = source.convert("RGB").resize(IMAGE_SIZE)
+        reference = _background_mask(image)
+        prediction = reference.resize(SMALL_SIZE, Image.Resampling.BILINEAR).filter(ImageFilter.GaussianBlur(PREDICTION_BLUR))
+        images.append(image)
+        references.append(np.asarray(reference, dtype=np.float32) / 255.0)
+        predictions.append(np.asarray(prediction, dtype=np.float32) / 255.0)
+
+    print(f"{len(images)} referencias {IMAGE_SIZE[0]}x{IMAGE_SIZE[1]}, inferencia a {SMALL_SIZE[0]}x{SMALL_SIZE[1]}")
+
+    print("\n1. Reescalado de la máscara (frente a la máscara de referencia)")
+    print(f"{'método':<22} {'ms/imagen':>10} {'IoU':>7} {'error alfa':>11}")
+    for label in ("lanczos (rembg)", "guided_upsample"):
+        times, qualities = [], []
+        for image, reference, prediction in zip(images, references, predictions):
+            start = time.perf_counter()
+            if label == "guided_upsample":
+                guide_small = np.asarray(image.resize(SMALL_SIZE, Image.Resampling.BILINEAR).convert("L"), dtype=np.float32) / 255.0
+                guide = np.asarray(image.convert("L"), dtype=np.float32) / 255.0
+                alpha = guided_upsample(prediction, guide_small, guide)
+            else:
+                small = Image.fromarray((prediction * 255).astype(np.uint8), mode="L")
+                alpha = np.asarray(small.resize(IMAGE_SIZE, Image.Resampling.LANCZOS), dtype=np.float32) / 255.0
+            times.append(time.perf_counter() - start)
+            qualities.append(_quality(alpha, reference))
+        _report(label, times, qualities)
+
+    print("\n2. CPU por imagen sin la inferencia (remoción + PNG)")
+    print(f"{'modo':<22} {'ms/imagen':>10} {'IoU':>7} {'error alfa':>11} {'PNG(KB)':>9}")
+    inference = _RecordedInference()
+    session = U2netSession.__new__(U2netSession)
+    session.inner_session = inference
+    for label in ("full", "fast"):
+        times, qualities, sizes = [], [], []
+        for image, reference, prediction in zip(images, references, predictions):
+            inference.mask = prediction
+            start = time.perf_counter()
+            if label == "full":
+                output = remove(image, session=session)
+                _, png = encode_png(output, optimize=True)
+            else:
+                output = downscale_matte(image, session, DEFAULT_INFERENCE_SIZE)
+                _, png = encode_png(output)
+            times.append(time.perf_counter() - start)
+            qualities.append(_quality(_alpha(output), reference))
+            sizes.append(len(png))
+        _report(label, times, qualities, sizes)
+
+    print(f"\n3. Con el modelo {model_name} (calidad del modo rápido frente a rembg.remove)")
+    try:
+        from app.services.matting import INFERENCE_SIZES, new_matting_session
+        real_session = new_matting_session(model_name)
+    except Exception as e:
+        print(f"Modelo no disponible ({type(e).__name__}), se omite")
+        return
+
+    inference_size = INFERENCE_SIZES.get(model_name, DEFAULT_INFERENCE_SIZE)
+    print(f"{'modo':<22} {'ms/imagen':>10} {'IoU':>7} {'error alfa':>11} {'PNG(KB)':>9}")
+    current = []
+    for label in ("full", "fast"):
+        times, qualities, sizes = [], [], []
+        for idx, image in enumerate(images):
+            start = time.perf_counter()
+            if label == "full":
+                output = remove(image, session=real_session)
+                _, png = encode_png(output, optimize=True)
+                current.append(_alpha(output))
+            else:
+                output = downscale_matte(image, real_session, inference_size)
+                _, png = encode_png(output)
+            times.append(time.perf_counter() - start)
+            qualities.append(_quality(_alpha(output), current[idx]))
+            sizes.append(len(png))
+        _report(label, times, qualities, sizes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark de memoria del camino codificación -> cuerpo de subida.
+
+Compara, para una generación (cuatro imágenes RGBA de 1024x1024):
+- legacy: BytesIO.getvalue() + multipart construido por requests (files=)
+- stream: BytesIO.getbuffer() + MultipartStream leído por bloques
+
+Cada modo corre en un subproceso separado para que el pico de RSS sea
+independiente. Uso:
+
+    python benchmarks/memory_upload.py
+"""
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+IMAGES_PER_CAR = 4
+IMAGE_SIZE = (1024, 1024)
+
+
+def _build_images():
+    """Imágenes RGBA con ruido para que el PNG no se comprima trivialmente."""
+    from PIL import Image
+    return [
+        Image.frombytes("RGBA", IMAGE_SIZE, os.urandom(IMAGE_SIZE[0] * IMAGE_SIZE[1] * 4))
+        for _ in range(IMAGES_PER_CAR)
+    ]
+
+
+def _run_legacy(images):
+    from io import BytesIO
+    from requests.models import RequestEncodingMixin
+
+    bodies = []
+    for idx, image in enumerate(images):
+        img_byte_arr = BytesIO()
+        image.save(img_byte_arr, format="PNG")
+        processed_bytes = img_byte_arr.getvalue()
+        body, _ = RequestEncodingMixin._encode_files(
+            {"file": (f"{idx}.png", processed_bytes, "image/png")}, {}
+        )
+        bodies.append(body)
+    return sum(len(body) for body in bodies)
+
+
+def _run_stream(images):
+    from app.services.multipart_stream import MultipartStream, encode_png
+
+    bodies = []
+    for idx, image in enumerate(images):
+        _, view = encode_png(image)
+        body = MultipartStream()
+        body.add_file("file", f"{idx}.png", view)
+        bodies.append(body)
+
+    # Simular el envío: consumir cada cuerpo por bloques
+    sent = 0
+    for body in bodies:
+        for chunk in body:
+            sent += len(chunk)
+    return sent
+
+
+def _child(mode: str):
+    images = _build_images()
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    total = _run_legacy(images) if mode == "legacy" else _run_stream(images)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{mode},{total},{elapsed:.3f},{peak / 1024 / 1024:.1f},{(peak_rss - baseline_rss) / 1024:.1f}")
+
+
+def main():
+    print(f"Generación simulada: {IMAGES_PER_CAR} imágenes RGBA {IMAGE_SIZE[0]}x{IMAGE_SIZE[1]}")
+    print(f"{'modo':<8} {'bytes':>12} {'tiempo(s)':>10} {'pico py(MB)':>12} {'pico RSS(MB)':>13}")
+    for mode in ("legacy", "stream"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", mode],
+            check=True, capture_output=True, text=True
+        ).stdout.strip().splitlines()[-1]
+        name, total, elapsed, peak_py, peak_rss = output.split(",")
+        print(f"{name:<8} {total:>12} {elapsed:>10} {peak_py:>12} {peak_rss:>13}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        _child(sys.argv[2])
+    else:
+        main()
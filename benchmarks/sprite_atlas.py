@@ -0,0 +1,73 @@
+"""
+Benchmark del atlas de sprites (SPRITE_ATLAS).
+
+Genera carros con el generador local de sprites a partir de las referencias
+de assets/ (cuatro imágenes por carro, como una generación real) y compara
+la salida actual, cuatro PNG, con un atlas de los sprites recortados:
+archivos subidos por carro, bytes totales, tiempo de CPU de empaquetado y
+codificación, y qué fracción del atlas ocupan los sprites. Uso:
+
+    python benchmarks/sprite_atlas.py [carros] [lado]
+"""
+import os
+import statistics
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from app.services.asset_index import AssetIndex  # noqa: E402
+from app.services.multipart_stream import encode_png  # noqa: E402
+from app.services.sprite_atlas import build_atlas  # noqa: E402
+from app.services.sprite_generator import generate_sprite  # noqa: E402
+
+PART_NAMES = ["car", "engine", "transmission", "wheels"]
+CATEGORIES = ["car", "motor", "transmission", "wheels"]
+
+
+def _generation(assets: AssetIndex, size: int):
+    sprites = {}
+    for name, category in zip(PART_NAMES, CATEGORIES):
+        reference = assets.preprocessed(assets.choose(category))
+        sprites[name] = Image.open(BytesIO(generate_sprite(reference, "rojo", size=size))).convert("RGBA")
+    return sprites
+
+
+def main():
+    cars = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+
+    assets_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+    assets = AssetIndex.load(assets_dir)
+    generations = [_generation(assets, size) for _ in range(cars)]
+
+    separate_times, separate_bytes = [], []
+    atlas_times, atlas_bytes, fill, dimensions = [], [], [], []
+    for sprites in generations:
+        start = time.perf_counter()
+        total = sum(len(encode_png(sprite, optimize=True)[1]) for sprite in sprites.values())
+        separate_times.append(time.perf_counter() - start)
+        separate_bytes.append(total)
+
+        start = time.perf_counter()
+        atlas, frame_map = build_atlas(sprites)
+        _, view = encode_png(atlas, optimize=True)
+        atlas_times.append(time.perf_counter() - start)
+        atlas_bytes.append(len(view))
+        used = sum(frame["w"] * frame["h"] for frame in frame_map["frames"].values())
+        fill.append(used / (frame_map["width"] * frame_map["height"]))
+        dimensions.append(f"{frame_map['width']}x{frame_map['height']}")
+
+    print(f"{cars} carros, sprites de {size}x{size}")
+    print(f"{'salida':<14} {'archivos':>9} {'KB/carro':>9} {'ms CPU':>8}")
+    print(f"{'4 PNG':<14} {4:>9} {statistics.mean(separate_bytes) / 1024:>9.0f} {statistics.mean(separate_times) * 1000:>8.0f}")
+    print(f"{'atlas':<14} {1:>9} {statistics.mean(atlas_bytes) / 1024:>9.0f} {statistics.mean(atlas_times) * 1000:>8.0f}")
+    print(f"\nOcupación del atlas: {statistics.mean(fill):.0%} (tamaños: {', '.join(sorted(set(dimensions)))})")
+    print(f"Píxeles por carro: 4 PNG {4 * size * size:,} vs atlas {statistics.mean(int(d.split('x')[0]) * int(d.split('x')[1]) for d in dimensions):,.0f}")
+
+
+if __name__ == "__main__":
+    main()
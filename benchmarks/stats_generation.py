@@ -0,0 +1,66 @@
+"""
+Benchmark de generación masiva de estadísticas.
+
+Compara el método anterior (random.choices por cada estadística) con
+StatsEngine.generate_batch para el mismo número de carros. Uso:
+
+    python benchmarks/stats_generation.py [carros]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.car_model import CarConfig  # noqa: E402
+from app.services.stats_engine import StatsEngine  # noqa: E402
+
+
+def _legacy_weighted_stat() -> int:
+    numbers = list(range(1, 11))
+    weights = [1.0] * 8 + [0.7] * 2
+    return random.choices(numbers, weights=weights)[0]
+
+
+def _legacy_batch(count: int):
+    return [
+        [[_legacy_weighted_stat() for _ in range(3)] for _ in range(3)]
+        for _ in range(count)
+    ]
+
+
+def _timed(label: str, func, count: int):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {elapsed * 1000:>10.1f} ms {count / elapsed:>14,.0f} carros/s")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    engine = StatsEngine()
+    types = [
+        ("standard", "manual", "sport"),
+        ("performance", "sequential", "racing"),
+        ("eco", "automatic", "offroad"),
+    ]
+    configs = [
+        CarConfig(engineType=e, transmissionType=t, wheelsType=w)
+        for e, t, w in (types[i % len(types)] for i in range(count))
+    ]
+    seeded = [CarConfig(seed=i) for i in range(count)]
+
+    print(f"Generando estadísticas para {count:,} carros")
+    _timed("legacy random.choices", lambda: _legacy_batch(count), count)
+    _timed("engine (sin semilla)", lambda: engine.generate_batch(configs), count)
+    _timed("engine (con semilla)", lambda: engine.generate_batch(seeded), count)
+
+    # Verificar reproducibilidad
+    first = engine.generate(CarConfig(seed=42))
+    second = engine.generate(CarConfig(seed=42))
+    print(f"Reproducible con seed=42: {first == second}")
+
+
+if __name__ == "__main__":
+    main()
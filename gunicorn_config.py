@@ -1,13 +1,19 @@
-import multiprocessing
+import os
 
 # Configuración del servidor
-bind = "0.0.0.0:8000"
-workers = multiprocessing.cpu_count() * 2 + 1
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Pocos workers async: casi todo el tiempo de una generación es espera de
+# APIs externas, que cada worker atiende concurrentemente en su event loop.
+# Cada worker carga su propio modelo rembg, así que más workers solo suman
+# memoria; el trabajo de CPU va al pool de hilos de cada worker (CPU_WORKERS).
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
 worker_class = "uvicorn.workers.UvicornWorker"
-timeout = 120
-keepalive = 5
+timeout = 300
+graceful_timeout = 30
+keepalive = 75
 
 # Configuración de logging
 accesslog = "-"
 errorlog = "-"
-loglevel = "info" 
\ No newline at end of file
+loglevel = "info"
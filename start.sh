@@ -48,4 +48,5 @@ fi
 
 # Iniciar la aplicación
 echo "Iniciando aplicación en puerto ${PORT}..."
-exec uvicorn app.main:app --host 0.0.0.0 --port ${PORT} --log-level debug --timeout-keep-alive 75 
\ No newline at end of file
+export PORT
+exec gunicorn app.main:app -c gunicorn_config.py
\ No newline at end of file
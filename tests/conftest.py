@@ -0,0 +1,7 @@
+import os
+
+# Las pruebas que importan app.main corren sin servicios externos: proveedor local y
+# un token cualquiera para Lighthouse, que nunca se llama
+os.environ.setdefault("IMAGE_PROVIDERS", "local")
+os.environ.setdefault("LIGHTHOUSE_API_KEY", "test")
+os.environ.setdefault("ASSETS_WATCH_INTERVAL", "0")
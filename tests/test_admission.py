@@ -0,0 +1,200 @@
+import asyncio
+
+import pytest
+
+from app.services.admission import (
+    BACKGROUND,
+    INTERACTIVE,
+    AdmissionController,
+    Overloaded,
+    PriorityClass,
+)
+
+
+def _controller(max_active=1, max_queued=4, queue_budget=60.0, background_active=1):
+    return AdmissionController(max_active, [
+        PriorityClass(INTERACTIVE, max_active, max_queued, queue_budget),
+        PriorityClass(BACKGROUND, background_active, max_queued, queue_budget),
+    ])
+
+
+async def _hold(controller, priority, started, release, order=None):
+    async with controller.slot(priority):
+        if order is not None:
+            order.append(priority)
+        started.set()
+        await release.wait()
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_freed_slot_goes_to_interactive_first():
+    async def scenario():
+        controller = _controller()
+        release = asyncio.Event()
+        order = []
+        holder = asyncio.create_task(_hold(controller, BACKGROUND, asyncio.Event(), release))
+        await _settle()
+
+        # La pregeneración llegó primero, pero /generate debe pasar antes
+        waiting = [
+            asyncio.create_task(_hold(controller, BACKGROUND, asyncio.Event(), release, order)),
+            asyncio.create_task(_hold(controller, INTERACTIVE, asyncio.Event(), release, order)),
+        ]
+        await _settle()
+        assert controller.get_stats()["classes"][BACKGROUND]["waiting"] == 1
+        assert controller.get_stats()["classes"][INTERACTIVE]["waiting"] == 1
+
+        release.set()
+        await asyncio.gather(holder, *waiting)
+        return order, controller
+
+    order, controller = asyncio.run(scenario())
+    assert order == [INTERACTIVE, BACKGROUND]
+    assert controller.active == 0
+
+
+def test_background_never_takes_every_slot():
+    async def scenario():
+        controller = _controller(max_active=2, background_active=1)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(_hold(controller, BACKGROUND, asyncio.Event(), release)) for _ in range(2)]
+        await _settle()
+        interactive_started = asyncio.Event()
+        tasks.append(asyncio.create_task(_hold(controller, INTERACTIVE, interactive_started, release)))
+        await _settle()
+        started = interactive_started.is_set()
+        release.set()
+        await asyncio.gather(*tasks)
+        return started
+
+    assert asyncio.run(scenario())
+
+
+def test_full_queue_is_rejected_immediately():
+    async def scenario():
+        controller = _controller(max_queued=1)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(_hold(controller, INTERACTIVE, asyncio.Event(), release)) for _ in range(2)]
+        await _settle()
+
+        with pytest.raises(Overloaded) as excinfo:
+            async with controller.slot(INTERACTIVE):
+                pass
+        release.set()
+        await asyncio.gather(*tasks)
+        return excinfo.value, controller
+
+    error, controller = asyncio.run(scenario())
+    assert error.retry_after >= 1
+    assert controller.classes[INTERACTIVE].rejected == 1
+    assert controller.classes[INTERACTIVE].admitted == 2
+
+
+def test_estimated_wait_over_budget_is_rejected_without_queueing():
+    async def scenario():
+        controller = _controller(queue_budget=5.0)
+        # Cada generación tarda en promedio más que el presupuesto de la cola
+        controller.duration = 30.0
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, INTERACTIVE, asyncio.Event(), release))
+        await _settle()
+
+        with pytest.raises(Overloaded, match="presupuesto"):
+            async with controller.slot(INTERACTIVE):
+                pass
+        waiting = len(controller.classes[INTERACTIVE].waiters)
+        release.set()
+        await holder
+        return waiting
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_wait_longer_than_budget_expires():
+    async def scenario():
+        controller = _controller(queue_budget=0.05)
+        controller.duration = 0.01
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, INTERACTIVE, asyncio.Event(), release))
+        await _settle()
+
+        with pytest.raises(Overloaded, match="agotado"):
+            async with controller.slot(INTERACTIVE):
+                pass
+        release.set()
+        await holder
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert controller.classes[INTERACTIVE].expired == 1
+    assert not controller.classes[INTERACTIVE].waiters
+    assert controller.active == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        controller = _controller()
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, INTERACTIVE, asyncio.Event(), release))
+        await _settle()
+        waiter = asyncio.create_task(_hold(controller, INTERACTIVE, asyncio.Event(), release))
+        await _settle()
+
+        waiter.cancel()
+        await _settle()
+        waiting = len(controller.classes[INTERACTIVE].waiters)
+        release.set()
+        await holder
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return waiting, controller
+
+    waiting, controller = asyncio.run(scenario())
+    assert waiting == 0
+    assert controller.active == 0
+    assert controller.classes[INTERACTIVE].admitted == 1
+
+
+def test_slot_granted_to_cancelled_waiter_is_returned():
+    async def scenario():
+        controller = _controller()
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, INTERACTIVE, asyncio.Event(), release))
+        await _settle()
+        cancelled = asyncio.create_task(_hold(controller, INTERACTIVE, asyncio.Event(), asyncio.Event()))
+        await _settle()
+
+        # El lugar se entrega y el cliente se va antes de que la tarea vuelva a correr
+        wake = controller._wake
+
+        def wake_and_cancel():
+            wake()
+            cancelled.cancel()
+        controller._wake = wake_and_cancel
+        release.set()
+        await holder
+        controller._wake = wake
+        with pytest.raises(asyncio.CancelledError):
+            # Sin devolver el lugar, la tarea seguiría generando: el timeout hace fallar la prueba
+            await asyncio.wait_for(cancelled, timeout=1)
+        assert controller.classes[INTERACTIVE].admitted == 2
+
+        next_started = asyncio.Event()
+        await asyncio.wait_for(_hold(controller, INTERACTIVE, next_started, release), timeout=1)
+        return next_started.is_set(), controller
+
+    started, controller = asyncio.run(scenario())
+    assert started
+    assert controller.active == 0
+
+
+@pytest.mark.parametrize("max_active", [0, -1])
+def test_zero_capacity_is_rejected(max_active):
+    with pytest.raises(ValueError):
+        PriorityClass(INTERACTIVE, max_active, 1, 1.0)
+    with pytest.raises(ValueError):
+        AdmissionController(max_active, [PriorityClass(INTERACTIVE, 1, 1, 1.0)])
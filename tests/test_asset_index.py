@@ -0,0 +1,47 @@
+import json
+import os
+import random
+
+from PIL import Image
+
+from app.services.asset_index import MANIFEST_NAME, AssetIndex
+
+
+def _reference(path, seed):
+    # Ruido distinto por semilla para que el hash perceptual no las marque como duplicadas
+    Image.frombytes("RGB", (512, 512), random.Random(seed).randbytes(512 * 512 * 3)).save(path)
+
+
+def _manifest(base_dir):
+    with open(os.path.join(base_dir, MANIFEST_NAME), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_rebuild_keeps_edited_weights(tmp_path):
+    _reference(tmp_path / "first.png", 1)
+    _reference(tmp_path / "second.png", 2)
+    AssetIndex.rebuild(str(tmp_path))
+
+    manifest = _manifest(tmp_path)
+    for entry in manifest["assets"]:
+        if entry["path"] == "first.png":
+            entry["weight"] = 3.5
+    with open(tmp_path / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+    os.makedirs(tmp_path / "wheels")
+    _reference(tmp_path / "wheels" / "new.png", 3)
+    index = AssetIndex.rebuild(str(tmp_path))
+
+    weights = {entry["path"]: entry["weight"] for entry in _manifest(tmp_path)["assets"]}
+    assert weights == {"first.png": 3.5, "second.png": 1.0, "wheels/new.png": 1.0}
+    assert {entry["path"]: entry["weight"] for entry in index.entries["car"]} == {"first.png": 3.5, "second.png": 1.0}
+
+
+def test_rebuild_with_unreadable_manifest_uses_default_weight(tmp_path):
+    _reference(tmp_path / "first.png", 1)
+    (tmp_path / MANIFEST_NAME).write_text("{no es json", encoding="utf-8")
+
+    AssetIndex.rebuild(str(tmp_path))
+
+    assert [entry["weight"] for entry in _manifest(tmp_path)["assets"]] == [1.0]
@@ -0,0 +1,45 @@
+import orjson
+import pytest
+
+from app.models.car_model import CarConfig
+from app.services.cache_service import CacheService
+
+
+@pytest.fixture
+def make_worker(tmp_path):
+    """Un CacheService por worker, todos sobre el mismo directorio temporal."""
+    def make():
+        service = CacheService()
+        service.cache_dir = str(tmp_path)
+        service.rebuild_index()
+        return service
+    return make
+
+
+def _save(service, config):
+    response = {"carImageURI": "ipfs://car", "parts": [], "metadata": {}}
+    service.save_response(response, config)
+
+
+def test_depths_include_entries_saved_by_other_workers(make_worker):
+    config = CarConfig(style="cartoon")
+    first, second = make_worker(), make_worker()
+    assert first.get_partition_depths() == {}
+
+    _save(second, config)
+    _save(second, config)
+
+    assert sum(first.get_partition_depths().values()) == 2
+    assert first.get_low_partitions([config], 3) == [(config, 1)]
+
+
+def test_depths_drop_entries_served_by_other_workers(make_worker):
+    config = CarConfig(style="cartoon")
+    first, second = make_worker(), make_worker()
+    _save(first, config)
+    second.rebuild_index()
+
+    assert orjson.loads(second.get_cached_response_bytes(config))["carImageURI"] == "ipfs://car"
+
+    assert first.get_partition_depths() == {}
+    assert first.get_low_partitions([config], 1) == [(config, 1)]
@@ -0,0 +1,28 @@
+import hashlib
+
+from app.services.ipfs_cid import CHUNK_SIZE, compute_cid
+
+from .go_random import pseudo_random_bytes
+
+
+def test_empty_file():
+    assert compute_cid(b"") == "QmbFMke1KXqnYyBBWxB74N4c5SBnJMVAiMNRcGu6x1AwQH"
+
+
+def test_single_chunk():
+    assert compute_cid(b"hello world\n") == "QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o"
+
+
+def test_multi_chunk_matches_ipfs_add():
+    # test/sharness/t0040-add-and-cat.sh de kubo: `random 5242880 41 > bigfile`
+    # y `ipfs add bigfile` (CIDv0, bloques de 256 KiB) debe dar este CID
+    content = pseudo_random_bytes(5242880, 41)
+    assert hashlib.sha1(content).hexdigest() == "5620fb92eb5a49c9986b5c6844efda37e471660e"
+    assert len(content) // CHUNK_SIZE == 20
+
+    assert compute_cid(content) == "QmSr7FqYkxYWGoSfy8ZiaMWQ5vosb18DQGCzjwEQnVHkTb"
+
+
+def test_memoryview_matches_bytes():
+    content = pseudo_random_bytes(CHUNK_SIZE + 1, 7)
+    assert compute_cid(memoryview(content)) == compute_cid(content)
@@ -0,0 +1,94 @@
+import asyncio
+
+import orjson
+import pytest
+import requests
+
+from app.services import lighthouse_service
+from app.services.ipfs_cid import compute_cid
+from app.services.lighthouse_service import LighthouseService
+
+FILES = [("car.png", b"car"), ("engine.png", b"engine"), ("wheels.png", b"wheels")]
+
+
+def _upload(service, files):
+    cids = [compute_cid(content) for _, content in files]
+    return asyncio.run(service._upload_request(files, cids)), cids
+
+
+def _entry(filename, content=None, cid=None):
+    return {"Name": filename, "Hash": cid or compute_cid(content), "Size": str(len(content or b""))}
+
+
+def test_entries_are_matched_by_hash_not_position(monkeypatch):
+    service = LighthouseService()
+    # Orden distinto al enviado y una línea extra para el directorio contenedor
+    entries = [_entry(name, content) for name, content in reversed(FILES)] + [_entry("", cid="QmDir")]
+    monkeypatch.setattr(service, "_post", lambda body: entries)
+
+    uploaded, cids = _upload(service, FILES)
+
+    assert uploaded == cids
+
+
+def test_entry_with_other_cid_is_matched_by_name(monkeypatch):
+    service = LighthouseService()
+    entries = [_entry("engine.png", b"engine"), _entry("car.png", cid="QmOtherChunking"), _entry("wheels.png", b"wheels")]
+    monkeypatch.setattr(service, "_post", lambda body: entries)
+
+    uploaded, cids = _upload(service, FILES)
+
+    assert uploaded == ["QmOtherChunking", cids[1], cids[2]]
+
+
+def test_missing_entry_raises(monkeypatch):
+    service = LighthouseService()
+    entries = [_entry("car.png", b"car"), _entry("wheels.png", b"wheels")]
+    monkeypatch.setattr(service, "_post", lambda body: entries)
+
+    with pytest.raises(Exception, match="engine.png"):
+        _upload(service, FILES)
+
+
+class _Response:
+    status_code = 200
+    text = ""
+
+    def __init__(self, entries):
+        self.content = b"\n".join(orjson.dumps(entry) for entry in entries)
+
+
+def test_post_has_timeout_and_is_retried(monkeypatch):
+    monkeypatch.setattr(lighthouse_service, "RETRY_BACKOFF", 0)
+    service = LighthouseService()
+    calls = []
+
+    def post(url, data, headers, timeout):
+        calls.append(timeout)
+        b"".join(data)
+        if len(calls) == 1:
+            raise requests.ReadTimeout("lectura agotada")
+        return _Response([_entry(name, content) for name, content in FILES])
+    monkeypatch.setattr(service.session, "post", post)
+
+    uploaded, cids = _upload(service, FILES)
+
+    assert uploaded == cids
+    assert calls == [service.timeout, service.timeout]
+    assert all(value > 0 for value in service.timeout)
+
+
+def test_upload_fails_after_retries(monkeypatch):
+    monkeypatch.setattr(lighthouse_service, "RETRY_BACKOFF", 0)
+    service = LighthouseService()
+    service.retries = 1
+    calls = []
+
+    def post(url, data, headers, timeout):
+        calls.append(timeout)
+        raise requests.ConnectTimeout("sin conexión")
+    monkeypatch.setattr(service.session, "post", post)
+
+    with pytest.raises(Exception, match="2 intentos"):
+        _upload(service, FILES)
+    assert len(calls) == 2
@@ -0,0 +1,26 @@
+import pytest
+
+from app.services.matting import MattingSessions, supported_models
+
+
+def test_known_models_are_accepted():
+    sessions = MattingSessions("u2net", {"pixel_art": "u2netp"}, "fast")
+
+    assert sessions.model_for("pixel_art") == "u2netp"
+    assert sessions.model_for("cartoon") == "u2net"
+    assert {"u2net", "u2netp", "silueta", "isnet-general-use"} <= set(supported_models())
+
+
+def test_unknown_default_model_is_rejected():
+    with pytest.raises(ValueError, match="MATTING_MODEL=u2nett.*Modelos válidos: .*u2net"):
+        MattingSessions("u2nett", {})
+
+
+def test_unknown_style_model_is_rejected():
+    with pytest.raises(ValueError, match="MATTING_MODEL_BY_STYLE pixel_art=u2nep"):
+        MattingSessions("u2net", {"pixel_art": "u2nep", "cartoon": "silueta"})
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError, match="MATTING_MODE"):
+        MattingSessions("u2net", {}, "quick")
@@ -0,0 +1,55 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routes import car_generation
+from app.routes.car_generation import MAX_PREGENERATE_BATCH
+
+
+@pytest.fixture
+def client(monkeypatch):
+    generated = []
+
+    async def fake_generate(config, stats=None, priority=None):
+        generated.append(config)
+        return {"carImageURI": "ipfs://car", "parts": []}
+
+    monkeypatch.setattr(car_generation, "_generate", fake_generate)
+    monkeypatch.setattr(car_generation.cache_service, "save_response", lambda response, config: str(len(generated)))
+    monkeypatch.setattr(car_generation.cache_service, "get_partition_depths", lambda: {})
+    monkeypatch.setattr(
+        car_generation.cache_service,
+        "get_low_partitions",
+        lambda configs, min_depth: [(config, min_depth) for config in configs]
+    )
+    # Sin contexto: no corren los eventos de inicio (verificador, precálculo de referencias)
+    client = TestClient(app)
+    client.generated = generated
+    return client
+
+
+def test_refill_is_capped_per_call(client):
+    configs = [{"style": style} for style in ("cartoon", "realistic", "pixel_art")]
+
+    response = client.post(f"/api/cars/pool/refill?min_depth={MAX_PREGENERATE_BATCH}", json=configs)
+
+    assert response.status_code == 200
+    assert len(client.generated) == MAX_PREGENERATE_BATCH
+    assert len(response.json()["cache_ids"]) == MAX_PREGENERATE_BATCH
+    assert response.json()["remaining"] == 3 * MAX_PREGENERATE_BATCH - MAX_PREGENERATE_BATCH
+
+
+def test_refill_under_the_cap_has_nothing_remaining(client):
+    response = client.post("/api/cars/pool/refill?min_depth=2", json=[{"style": "cartoon"}])
+
+    assert response.status_code == 200
+    assert len(client.generated) == 2
+    assert response.json()["remaining"] == 0
+
+
+@pytest.mark.parametrize("min_depth", [0, -1, MAX_PREGENERATE_BATCH + 1])
+def test_refill_rejects_min_depth_out_of_range(client, min_depth):
+    response = client.post(f"/api/cars/pool/refill?min_depth={min_depth}", json=[{"style": "cartoon"}])
+
+    assert response.status_code == 422
+    assert client.generated == []
@@ -0,0 +1,120 @@
+import asyncio
+import os
+import time
+
+import httpx
+import pytest
+
+from app.models.car_model import CarConfig
+from app.services import pool_verifier
+from app.services.cache_service import CacheService
+from app.services.pool_verifier import PoolVerifier
+
+GATEWAY = "http://gateway.test/ipfs"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    service = CacheService()
+    service.cache_dir = str(tmp_path)
+    service.entry_ttl = 3600
+    service.rebuild_index()
+    return service
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    """Responde los HEAD con el estado configurado por URI (200 si no está)."""
+    responses = {}
+    requests = []
+
+    def handler(request):
+        uri = str(request.url)
+        requests.append(uri)
+        response = responses.get(uri, 200)
+        if isinstance(response, Exception):
+            raise response
+        return httpx.Response(response)
+
+    client_class = httpx.AsyncClient
+    monkeypatch.setattr(
+        pool_verifier.httpx, "AsyncClient",
+        lambda **kwargs: client_class(transport=httpx.MockTransport(handler), **kwargs)
+    )
+    return responses, requests
+
+
+def _save(cache, cid):
+    response = {"carImageURI": f"{GATEWAY}/{cid}", "parts": []}
+    return cache.save_response(response, CarConfig())
+
+
+def _entries(cache):
+    cache.rebuild_index()
+    return [os.path.basename(cache_file) for _, cache_file in cache.list_entries()]
+
+
+def test_expired_entry_is_evicted_without_checking(cache, gateway):
+    _, requests = gateway
+    fresh = _save(cache, "fresh")
+    stale = _save(cache, "stale")
+    stale_file = next(cache_file for _, cache_file in cache.list_entries() if stale in cache_file)
+    # El ID de la entrada es el momento en que se guardó
+    expired_id = str(int((time.time() - 2 * 3600) * 1000))
+    os.replace(stale_file, os.path.join(os.path.dirname(stale_file), f"{expired_id}.json"))
+
+    summary = asyncio.run(PoolVerifier(cache).sweep())
+
+    assert _entries(cache) == [f"{fresh}.json"]
+    assert summary["entries_checked"] == 1
+    assert requests == [f"{GATEWAY}/fresh"]
+
+
+def test_missing_uri_evicts_entry(cache, gateway):
+    responses, _ = gateway
+    kept = _save(cache, "pinned")
+    _save(cache, "unpinned")
+    responses[f"{GATEWAY}/unpinned"] = 404
+
+    verifier = PoolVerifier(cache)
+    asyncio.run(verifier.sweep())
+
+    assert _entries(cache) == [f"{kept}.json"]
+    assert verifier.totals["evicted_broken"] == 1
+
+
+def test_network_error_keeps_entry(cache, gateway):
+    responses, _ = gateway
+    kept = _save(cache, "pinned")
+    unreachable = _save(cache, "unreachable")
+    responses[f"{GATEWAY}/unreachable"] = httpx.ConnectError("sin conexión")
+
+    verifier = PoolVerifier(cache)
+    asyncio.run(verifier.sweep())
+
+    assert _entries(cache) == [f"{kept}.json", f"{unreachable}.json"]
+    assert verifier.totals["evicted_broken"] == 0
+    assert list(verifier.failures.values()) == [1]
+
+
+def test_only_lock_holder_sweeps(cache, monkeypatch):
+    leader, follower = PoolVerifier(cache), PoolVerifier(cache)
+    sweeps = []
+
+    async def sweep(verifier):
+        sweeps.append(verifier)
+
+    monkeypatch.setattr(PoolVerifier, "sweep", sweep)
+
+    async def run_both():
+        tasks = [asyncio.create_task(verifier.run(0.01)) for verifier in (leader, follower)]
+        await asyncio.sleep(0.1)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert leader.try_lead()
+    asyncio.run(run_both())
+
+    assert sweeps and set(sweeps) == {leader}
+    assert not follower.leader
@@ -0,0 +1,42 @@
+import numpy as np
+
+from app.models.car_model import CarConfig
+from app.services.stats_engine import PART_ORDER, StatsEngine
+
+
+def test_same_seed_returns_same_stats():
+    config = CarConfig(engineType="performance", wheelsType="offroad", seed=42)
+
+    first = StatsEngine().generate(config)
+    second = StatsEngine().generate(config)
+
+    assert first == second
+    assert set(first) == set(PART_ORDER)
+
+
+def test_seed_does_not_depend_on_batch_position():
+    seeded = CarConfig(seed=7)
+
+    alone = StatsEngine().generate_batch([seeded])
+    mixed = StatsEngine().generate_batch([CarConfig(), seeded, CarConfig(engineType="eco")])
+
+    assert np.array_equal(alone[0], mixed[1])
+
+
+def test_generate_batch_returns_one_result_per_config_in_range():
+    configs = [
+        CarConfig(engineType=engine, transmissionType=transmission, wheelsType=wheels)
+        for engine in ("standard", "performance", "eco")
+        for transmission in ("manual", "automatic", "sequential")
+        for wheels in ("sport", "racing", "offroad")
+    ] * 20
+
+    batch = StatsEngine(seed=1).generate_batch(configs)
+
+    assert batch.shape == (len(configs), len(PART_ORDER), 3)
+    assert batch.min() >= 1 and batch.max() <= 10
+    assert len(StatsEngine().to_part_stats(batch)) == len(configs)
+
+
+def test_generate_batch_empty():
+    assert StatsEngine().generate_batch([]).shape == (0, len(PART_ORDER), 3)